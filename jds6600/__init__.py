@@ -1,2 +1,129 @@
+import importlib as _importlib
+
+from .errors import *
+from .transport import *
+from .capture import *
+from .discovery import *
 from .iface import *
+from .metrics import *
+from .cache import *
+from .pipeline import *
+from .verify import *
+from .state import *
+from .arb import *
+from .arblib import *
+from .freqplan import *
+from .calibration import *
+from .sweep import *
+from .measure import *
+from .sequence import *
+from .profiles import *
 from .types import *
+
+
+# These modules pull in asyncio, concurrent.futures and socketserver which
+# take longer to import than the rest of the package, so they are only
+# imported when one of their names is first used.
+_LAZY = {
+    'AsyncJDS6600': 'aio',
+    'Priority': 'threaded',
+    'ThreadedJDS6600': 'threaded',
+    'Fleet': 'fleet',
+    'FleetResult': 'fleet',
+    'JDS6600Client': 'daemon',
+    'JDS6600Server': 'daemon',
+}
+
+
+def __getattr__(name):
+    # The lazy modules themselves (jds6600.aio, ...) load the same way
+    if name in _LAZY.values():
+        return _importlib.import_module(f'.{name}', __name__)
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(_importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+# The lazy names are left out so that "from jds6600 import *" doesn't import
+# their modules, they have to be imported by name
+__all__ = [
+    'ARB_MAX_SLOTS',
+    'ARB_MAX_VALUE',
+    'ARB_POINTS',
+    'BurstMode',
+    'CALIBRATION_FREQUENCIES',
+    'CaptureTransport',
+    'CaptureWriter',
+    'Channel',
+    'Command',
+    'CommandEvent',
+    'CommandMetrics',
+    'CommandMismatchError',
+    'DeviceState',
+    'DiscoveryCache',
+    'FdTransport',
+    'Frequency',
+    'FrequencyCalibration',
+    'FrequencyPlanner',
+    'InstrumentationHook',
+    'JDS6600',
+    'JDS6600Error',
+    'LATENCY_BUCKETS',
+    'MEASURE_REGISTERS',
+    'MEASURE_SCALE',
+    'MeasureCoupling',
+    'MeasureMode',
+    'MeasurementRing',
+    'MeasurementStream',
+    'Output',
+    'PROFILE_REGISTERS',
+    'PROFILE_SLOTS',
+    'PendingCommand',
+    'Pipeline',
+    'ProfileLibrary',
+    'ProtocolError',
+    'RegisterCache',
+    'ReplayResult',
+    'ResponseFormatError',
+    'ResponseLostError',
+    'ResponseTimeoutError',
+    'Sequence',
+    'SequencePlayer',
+    'SequenceStats',
+    'SerialTransport',
+    'SweepConfig',
+    'SweepDirection',
+    'SweepMode',
+    'TcpTransport',
+    'Transport',
+    'TransportError',
+    'UIMode',
+    'VerboseHook',
+    'VerificationError',
+    'Waveform',
+    'WaveformLibrary',
+    'WriteVerifier',
+    'arb_slot',
+    'arbitrary_hash',
+    'calibrate',
+    'calibration_path',
+    'default_calibration_dir',
+    'default_discovery_cache',
+    'find_device',
+    'find_devices',
+    'load_calibration',
+    'open_transport',
+    'plan_frequency',
+    'prepare_arbitrary',
+    'prometheus_text',
+    'read_capture',
+    'replay_capture',
+    'scan_devices',
+]
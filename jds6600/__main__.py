@@ -0,0 +1,7 @@
+import sys
+
+from .cli import main
+
+
+# python -m jds6600 works the same as the jds6600 command
+sys.exit(main())
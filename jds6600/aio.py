@@ -0,0 +1,478 @@
+import asyncio
+import collections
+import os
+import time
+
+import serial
+
+from .types import *
+from .cache import RegisterCache
+from .codec import encode_command, parse_read, parse_write, resync, is_response, answers, _errmsg
+from .metrics import CommandEvent, VerboseHook
+from .errors import ProtocolError, ResponseTimeoutError, ResponseLostError
+from .iface import JDS6600, _check_arg_type, _MAX_RETRY_BACKOFF
+from .discovery import find_device
+
+
+class AsyncJDS6600:
+    # asyncio version of the JDS6600 class.  The serial port is opened in
+    # non-blocking mode and serviced by the event loop (loop.add_reader() and
+    # loop.add_writer()) so no threads are used and many devices can be driven
+    # from one event loop.
+    #
+    # Any number of coroutines can share one instance.  Commands are written
+    # to the device as soon as they are issued (up to "window" of them can be
+    # waiting for a response at the same time) and the responses are matched
+    # to the commands in the order they were sent.
+    #
+    # Use AsyncJDS6600.connect() (or "async with AsyncJDS6600(...) as dev") so
+    # that the port is opened from within the event loop.
+
+    # Reuse the frequency conversions from the synchronous class
+    _tgt_freq_conv = JDS6600._tgt_freq_conv
+    _freq_convert_from_tgt = JDS6600._freq_convert_from_tgt
+    _freq_convert_to_tgt = JDS6600._freq_convert_to_tgt
+
+    # and the hook handling
+    verbose = JDS6600.verbose
+    add_hook = JDS6600.add_hook
+    remove_hook = JDS6600.remove_hook
+
+    def __init__(self, port=None, baudrate=115200, verbose=False, fix_read_bug=True, timeout=0.5, window=8, bytesize=serial.EIGHTBITS, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE, cache=False, cache_ttl=None, hooks=None, retries=2, retry_backoff=0.01):
+        # See JDS6600.hooks
+        self.hooks = list(hooks or [])
+        if verbose:
+            self.hooks.append(VerboseHook())
+
+        # See JDS6600.retries
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.fix_read_bug = fix_read_bug
+        self.timeout = timeout
+        self.cache = RegisterCache(cache_ttl) if cache else None
+
+        if port is None:
+            port = find_device()
+            if port is None:
+                raise Exception('JDS6600 USB device not found')
+
+        self._args = {
+            'port': port,
+            'baudrate': baudrate,
+
+            # Reads and writes are driven by the event loop so the port must
+            # never block.
+            'timeout': 0,
+            'write_timeout': 0,
+            'bytesize': bytesize,
+            'parity': parity,
+            'stopbits': stopbits,
+        }
+
+        self._serial = None
+        self._loop = None
+        self._window = asyncio.Semaphore(window)
+
+        # (future, command) for commands that have been sent, in the order
+        # they were sent, and the bytes received or waiting to be sent.
+        self._waiters = collections.deque()
+        self._rx_buf = bytearray()
+        self._tx_buf = bytearray()
+
+        # Waiters of commands that timed out.  They stay in _waiters so the
+        # response, if it still arrives, goes to them and not to a later
+        # command, until they expire one timeout later.  New commands aren't
+        # sent while there are any (_quiet is set once they are gone).
+        self._late = set()
+        self._quiet = None
+
+    @classmethod
+    async def connect(cls, *args, **kwargs):
+        dev = cls(*args, **kwargs)
+        await dev.open()
+        return dev
+
+    async def __aenter__(self):
+        if self._serial is None:
+            await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self.cache is not None:
+            self.cache.invalidate()
+
+        self._loop = asyncio.get_running_loop()
+        self._serial = serial.Serial(**self._args)
+        self._loop.add_reader(self._serial.fileno(), self._on_readable)
+
+    async def close(self):
+        if self._serial is None:
+            return
+
+        fd = self._serial.fileno()
+        self._loop.remove_reader(fd)
+        self._loop.remove_writer(fd)
+        self._serial.close()
+        self._serial = None
+
+        # Nothing is going to answer the outstanding commands now
+        while self._waiters:
+            fut, _ = self._waiters.popleft()
+            if not fut.done():
+                fut.set_exception(Exception('Port closed'))
+        self._late.clear()
+        self._set_quiet()
+        self._rx_buf.clear()
+        self._tx_buf.clear()
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._serial.fileno(), 4096)
+        except BlockingIOError:
+            return
+        self._rx_buf += data
+
+        while True:
+            idx = self._rx_buf.find(b'\n')
+            if idx < 0:
+                break
+
+            line = resync(bytes(self._rx_buf[:idx]).rstrip(b'\r'))
+            del self._rx_buf[:idx + 1]
+
+            # Each response goes to the oldest command it answers (by register
+            # number), so a lost response only affects its own command.
+            #
+            # Lines that aren't a response at all, or that answer none of the
+            # commands, are the same stale input that JDS6600._flush_input()
+            # throws away.
+            idx = None
+            if is_response(line):
+                idx = next((i for i, (_, cmd_bytes) in enumerate(self._waiters) if answers(cmd_bytes, line)), None)
+            if idx is None:
+                for hook in self.hooks:
+                    hook.on_flush(line)
+                continue
+
+            # The commands in front of it are never going to get a response
+            for _ in range(idx):
+                waiter = self._waiters.popleft()
+                fut, cmd_bytes = waiter
+                self._retire(waiter)
+                if not fut.done():
+                    fut.set_exception(ResponseLostError(_errmsg('Response lost', cmd_bytes, line)))
+
+            # A timed out command just swallows its late response
+            waiter = self._waiters.popleft()
+            fut, _ = waiter
+            self._retire(waiter)
+            if not fut.done():
+                fut.set_result(line)
+
+    def _retire(self, waiter):
+        # The waiter of a timed out command is gone (answered or expired)
+        if waiter in self._late:
+            self._late.discard(waiter)
+            if not self._late:
+                self._set_quiet()
+
+    def _expire(self, waiter):
+        if waiter in self._late:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._retire(waiter)
+
+    def _set_quiet(self):
+        if self._quiet is not None and not self._quiet.done():
+            self._quiet.set_result(None)
+        self._quiet = None
+
+    def _on_writable(self):
+        self._write_pending()
+
+    def _write_pending(self):
+        try:
+            written = os.write(self._serial.fileno(), self._tx_buf)
+        except BlockingIOError:
+            written = 0
+        del self._tx_buf[:written]
+
+        fd = self._serial.fileno()
+        if self._tx_buf:
+            self._loop.add_writer(fd, self._on_writable)
+        else:
+            self._loop.remove_writer(fd)
+
+    def _send(self, cmd_bytes):
+        # If data is already waiting for the port to become writable just add
+        # to it, otherwise try to write it right away.
+        pending = bool(self._tx_buf)
+        self._tx_buf += cmd_bytes
+        if not pending:
+            self._write_pending()
+
+    async def _command(self, cmd_bytes):
+        # Returns the response line, or None if the command timed out
+        if self._serial is None:
+            raise Exception('Port not open')
+
+        # Wait for the responses of commands that timed out to arrive (or
+        # expire) so they can't be taken for the response to this one
+        while self._late:
+            if self._quiet is None:
+                self._quiet = self._loop.create_future()
+            await self._quiet
+
+        async with self._window:
+            # Queueing the response future and sending the command happen
+            # without yielding to the event loop so the order of the futures
+            # always matches the order of the commands on the wire.
+            fut = self._loop.create_future()
+            waiter = (fut, bytes(cmd_bytes))
+            self._waiters.append(waiter)
+            self._send(cmd_bytes)
+
+            try:
+                return await asyncio.wait_for(fut, self.timeout)
+            except asyncio.TimeoutError:
+                # The response may still arrive, the waiter stays queued to
+                # take it for one more timeout
+                if waiter in self._waiters:
+                    self._late.add(waiter)
+                    self._loop.call_later(self.timeout, self._expire, waiter)
+                return None
+
+    async def _exchange(self, op, cmd, cmd_bytes, parse, retries=0):
+        # Same as JDS6600._exchange().  Responses are matched to commands in
+        # the order they were sent so stale responses can't be skipped here,
+        # but the retries take care of them.
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            error = None
+            try:
+                line = await self._command(cmd_bytes)
+            except ResponseLostError as e:
+                line = b''
+                error = e
+            elapsed = time.perf_counter() - start
+
+            # Same as a serial readline() timing out
+            timeout = line is None
+            if timeout:
+                line = b''
+                error = ResponseTimeoutError(f'Timeout: [cmd] {cmd_bytes.strip().decode()}')
+            elif error is None:
+                try:
+                    value = parse(cmd, cmd_bytes, line)
+                except ProtocolError as e:
+                    error = e
+
+            if self.hooks:
+                event = CommandEvent(op, cmd, cmd_bytes, line, elapsed, error, timeout)
+                for hook in self.hooks:
+                    hook.on_command(event)
+
+            if error is None:
+                return value
+            elif attempt >= retries:
+                raise error
+
+            attempt += 1
+            for hook in self.hooks:
+                hook.on_retry(event, attempt)
+            await asyncio.sleep(min(self.retry_backoff * 2 ** (attempt - 1), _MAX_RETRY_BACKOFF))
+
+    async def _get(self, cmd, *args):
+        cached = self.cache is not None and len(args) == 0
+        if cached:
+            found, value = self.cache.lookup(cmd)
+            if found:
+                return value
+
+        cmd_bytes = encode_command('r', cmd, args)
+        value = await self._exchange('r', cmd, cmd_bytes, parse_read, self.retries)
+
+        if cached:
+            self.cache.store(cmd, value)
+        return value
+
+    async def _set(self, cmd, *args):
+        assert len(args) > 0
+
+        if self.cache is not None and self.cache.unchanged(cmd, args):
+            return
+
+        cmd_bytes = encode_command('w', cmd, args)
+        await self._exchange('w', cmd, cmd_bytes, parse_write)
+
+        if self.cache is not None:
+            self.cache.update(cmd, args)
+
+    async def _get_per_channel(self, cmds, which, convert, *args):
+        # Both channels are read concurrently
+        if which == Channel.BOTH:
+            values = await asyncio.gather(*(self._get(cmd, *args) for cmd in cmds))
+            return tuple(convert(v) for v in values)
+        elif which != Channel.NONE:
+            return convert(await self._get(cmds[which], *args))
+        else:
+            return ()
+
+    async def _set_per_channel(self, cmds, which, *args):
+        if which == Channel.BOTH:
+            await asyncio.gather(*(self._set(cmd, *args) for cmd in cmds))
+        elif which != Channel.NONE:
+            await self._set(cmds[which], *args)
+
+    async def get_model(self):
+        return await self._get(Command.MODEL)
+
+    async def get_serial_number(self):
+        return await self._get(Command.SERIAL_NUMBER)
+
+    async def get_output(self, which=Channel.BOTH):
+        resp = await self._get(Command.CHANNEL_ENABLE)
+        if which == Channel.BOTH:
+            ch1, ch2 = resp
+            return (Output(ch1), Output(ch2))
+        else:
+            return Output(resp[which])
+
+    async def set_output(self, value, which=Channel.BOTH):
+        _check_arg_type(value, Output)
+        if which == Channel.BOTH:
+            await self._set(Command.CHANNEL_ENABLE, value, value)
+        elif which != Channel.NONE:
+            channel_states = list(await self.get_output())
+            channel_states[which] = value
+            await self._set(Command.CHANNEL_ENABLE, *channel_states)
+
+    async def get_config(self, which=Channel.BOTH):
+        keys = ['waveform', 'frequency', 'amplitude', 'offset', 'dutycycle', 'output']
+        out = await asyncio.gather(
+            self.get_waveform(which),
+            self.get_frequency(which),
+            self.get_amplitude(which),
+            self.get_offset(which),
+            self.get_dutycycle(which),
+            self.get_output(which),
+        )
+
+        if which == Channel.BOTH:
+            ch1_config = dict((k, v[0]) for k, v in zip(keys, out))
+            ch2_config = dict((k, v[1]) for k, v in zip(keys, out))
+            return (ch1_config, ch2_config)
+        elif which != Channel.NONE:
+            return dict((k, v) for k, v in zip(keys, out))
+        else:
+            return None
+
+    async def set_config(self, waveform=None, frequency=None, amplitude=None, offset=None, dutycycle=None, output=None, which=Channel.BOTH):
+        # Same ordering as JDS6600.set_config(): outputs are turned off before
+        # anything else is changed and turned on after everything else has
+        # been set.  The other settings are written back to back.
+        if output is not None and output == Output.OFF:
+            await self.set_output(output, which)
+
+        pending = []
+        if waveform is not None:
+            pending.append(self.set_waveform(waveform, which))
+        if frequency is not None:
+            pending.append(self.set_frequency(frequency, which))
+        if amplitude is not None:
+            pending.append(self.set_amplitude(amplitude, which))
+        if offset is not None:
+            pending.append(self.set_offset(offset, which))
+        if dutycycle is not None:
+            pending.append(self.set_dutycycle(dutycycle, which))
+        await asyncio.gather(*pending)
+
+        if output is not None and output == Output.ON:
+            await self.set_output(output, which)
+
+    async def profile_save(self, profile=0):
+        assert profile >= 0 and profile <= 99
+        await self._set(Command.PROFILE_SAVE, profile)
+
+    async def profile_load(self, profile=0):
+        assert profile >= 0 and profile <= 99
+        await self._set(Command.PROFILE_LOAD, profile)
+
+    async def profile_clear(self, profile=0):
+        assert profile >= 0 and profile <= 99
+        await self._set(Command.PROFILE_CLEAR, profile)
+
+    async def get_waveform(self, which=Channel.BOTH):
+        cmds = (Command.WAVEFORM_CH1, Command.WAVEFORM_CH2)
+        return await self._get_per_channel(cmds, which, Waveform)
+
+    async def set_waveform(self, value, which=Channel.BOTH):
+        _check_arg_type(value, Waveform)
+        cmds = (Command.WAVEFORM_CH1, Command.WAVEFORM_CH2)
+        await self._set_per_channel(cmds, which, value)
+
+    async def get_frequency(self, which=Channel.BOTH):
+        cmds = (Command.FREQUENCY_CH1, Command.FREQUENCY_CH2)
+        return await self._get_per_channel(cmds, which, self._freq_convert_from_tgt)
+
+    async def set_frequency(self, value, which=Channel.BOTH):
+        cmds = (Command.FREQUENCY_CH1, Command.FREQUENCY_CH2)
+        args = self._freq_convert_to_tgt(value)
+        await self._set_per_channel(cmds, which, *args)
+
+    async def get_amplitude(self, which=Channel.BOTH):
+        # Converting from mV to V
+        amplitude_convert = lambda val: val / 1000
+        cmds = (Command.AMPLITUDE_CH1, Command.AMPLITUDE_CH2)
+        return await self._get_per_channel(cmds, which, amplitude_convert)
+
+    async def set_amplitude(self, value, which=Channel.BOTH):
+        converted_value = JDS6600._amplitude_to_tgt(value)
+        cmds = (Command.AMPLITUDE_CH1, Command.AMPLITUDE_CH2)
+        await self._set_per_channel(cmds, which, converted_value)
+
+    async def get_offset(self, which=Channel.BOTH):
+        # See JDS6600.get_offset() for the offset units
+        offset_convert = lambda val: (val - 1000) / 100
+        cmds = (Command.OFFSET_CH1, Command.OFFSET_CH2)
+        return await self._get_per_channel(cmds, which, offset_convert)
+
+    async def set_offset(self, value, which=Channel.BOTH):
+        converted_value = JDS6600._offset_to_tgt(value)
+        cmds = (Command.OFFSET_CH1, Command.OFFSET_CH2)
+        await self._set_per_channel(cmds, which, converted_value)
+
+    async def get_dutycycle(self, which=Channel.BOTH):
+        # Dutycycle values from the function generator are in units of 0.1%.
+        offset_convert = lambda val: val / 10
+        cmds = (Command.DUTYCYCLE_CH1, Command.DUTYCYCLE_CH2)
+        return await self._get_per_channel(cmds, which, offset_convert)
+
+    async def set_dutycycle(self, value, which=Channel.BOTH):
+        converted_value = JDS6600._dutycycle_to_tgt(value)
+        cmds = (Command.DUTYCYCLE_CH1, Command.DUTYCYCLE_CH2)
+        await self._set_per_channel(cmds, which, converted_value)
+
+    async def get_phase(self):
+        # Degrees, the device uses units of 0.1 degrees
+        return await self._get(Command.PHASE) / 10
+
+    async def set_phase(self, value):
+        converted_value = round(value * 10)
+        await self._set(Command.PHASE, converted_value)
+
+    async def get_ui_mode(self):
+        return UIMode(await self._get(Command.UI_MODE))
+
+    async def set_ui_mode(self, value):
+        _check_arg_type(value, UIMode)
+        await self._set(Command.UI_MODE, value)
+
+
+__all__ = [
+    'AsyncJDS6600',
+]
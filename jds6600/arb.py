@@ -0,0 +1,121 @@
+
+from .types import *
+
+
+# Each arbitrary waveform slot holds 2048 points of 12-bit DAC values
+ARB_POINTS = 2048
+ARB_MAX_VALUE = 4095
+
+# The number of slots that can be used depends on the SYSTEM_ARB_MAX_NUM
+# setting, 60 is the largest value it can be set to.
+ARB_MAX_SLOTS = 60
+
+# Lookup table used to format DAC values without any per-point Python work,
+# row N holds the ASCII digits of N followed by a ',' (padded with zeros) and
+# _ENCODE_LENS[N] is the number of valid characters in row N.
+_ENCODE_TABLE = None
+_ENCODE_LENS = None
+
+
+def _numpy():
+    # numpy is only needed for the arbitrary waveform support so it is an
+    # optional dependency (pip install jds6600[numpy])
+    try:
+        import numpy
+    except ImportError:
+        raise Exception('numpy is required for arbitrary waveform support')
+    return numpy
+
+
+def arb_slot(slot):
+    # Arbitrary waveform slots can be identified either by the slot number
+    # (1-60) or by the matching Waveform.ARBITRARY_* value (101-160).
+    slot = int(slot)
+    if slot > Waveform.ARBITRARY_1 - 1:
+        slot -= Waveform.ARBITRARY_1 - 1
+    if not 1 <= slot <= ARB_MAX_SLOTS:
+        raise ValueError(f'Invalid arbitrary waveform slot: {slot}')
+    return slot
+
+
+def prepare_arbitrary(samples):
+    # Converts a 1-D array of float samples in the range -1.0 to 1.0 into
+    # the 2048 DAC values that are stored on the device.  The samples are
+    # linearly resampled to 2048 points and values outside the range are
+    # clipped.  Arrays that already are 2048 unsigned integers are assumed to
+    # be raw DAC values and are only range checked.
+    np = _numpy()
+    samples = np.asarray(samples)
+    if samples.ndim != 1 or samples.size < 2:
+        raise ValueError('Waveform samples must be a 1-D array of at least 2 values')
+
+    if samples.dtype.kind in 'ui' and samples.size == ARB_POINTS:
+        if samples.min() < 0 or samples.max() > ARB_MAX_VALUE:
+            raise ValueError(f'Raw waveform values must be between 0 and {ARB_MAX_VALUE}')
+        return samples.astype(np.uint16)
+
+    samples = samples.astype(np.float64)
+    if samples.size != ARB_POINTS:
+        # Resample the whole period, the last output point lands on the last
+        # input sample.
+        src = np.linspace(0.0, 1.0, samples.size)
+        dst = np.linspace(0.0, 1.0, ARB_POINTS)
+        samples = np.interp(dst, src, samples)
+
+    scaled = (np.clip(samples, -1.0, 1.0) + 1.0) * (ARB_MAX_VALUE / 2)
+    return np.rint(scaled).astype(np.uint16)
+
+
+def arbitrary_hash(data):
+    # Content hash of prepared DAC values (see prepare_arbitrary())
+    import hashlib
+    np = _numpy()
+    return hashlib.sha1(np.ascontiguousarray(data, dtype='<u2').tobytes()).hexdigest()
+
+
+def encode_arbitrary(slot, data):
+    # Returns the complete ":aNN=v1,v2,...,v2048.\r\n" command for prepared
+    # DAC values
+    global _ENCODE_TABLE, _ENCODE_LENS
+    np = _numpy()
+
+    if _ENCODE_TABLE is None:
+        table = np.zeros((ARB_MAX_VALUE + 1, 5), dtype=np.uint8)
+        lens = np.zeros(ARB_MAX_VALUE + 1, dtype=np.uint8)
+        for value in range(ARB_MAX_VALUE + 1):
+            chars = f'{value},'.encode()
+            table[value, :len(chars)] = np.frombuffer(chars, dtype=np.uint8)
+            lens[value] = len(chars)
+        _ENCODE_TABLE, _ENCODE_LENS = table, lens
+
+    # Gather the characters of every value and keep only the valid ones,
+    # boolean indexing keeps the row-major order so this is the joined text.
+    chars = _ENCODE_TABLE[data]
+    mask = np.arange(chars.shape[1]) < _ENCODE_LENS[data][:, None]
+    body = chars[mask].tobytes()
+
+    # Replace the trailing ',' with the end of command marker
+    return b':a%02d=' % slot + body[:-1] + b'.\r\n'
+
+
+def parse_arbitrary(text):
+    # Converts the comma separated values of a ":bNN=" response into a uint16
+    # array, returns None if the response doesn't hold 2048 valid values.
+    np = _numpy()
+    try:
+        values = np.array(text.split(','), dtype=np.int64)
+    except ValueError:
+        return None
+    if values.size != ARB_POINTS or values.min() < 0 or values.max() > ARB_MAX_VALUE:
+        return None
+    return values.astype(np.uint16)
+
+
+__all__ = [
+    'ARB_POINTS',
+    'ARB_MAX_VALUE',
+    'ARB_MAX_SLOTS',
+    'arb_slot',
+    'prepare_arbitrary',
+    'arbitrary_hash',
+]
@@ -0,0 +1,137 @@
+import json
+import os
+
+from .arb import ARB_POINTS, ARB_MAX_SLOTS, _numpy, arb_slot, arbitrary_hash
+
+
+class WaveformLibrary:
+    # Local store of arbitrary waveform data.  Waveforms are stored once per
+    # unique content as rows of a memory-mapped uint16 array
+    # (<path>/waveforms.npy) and the index (<path>/index.json) maps content
+    # hashes to rows and records which waveform each slot of each device
+    # (identified by serial number) holds.
+    #
+    # Once a device has been synced (see sync()) later sessions can tell which
+    # slots hold which waveforms without reading anything back over serial:
+    #
+    #   lib = WaveformLibrary('~/.jds6600/waveforms')
+    #   lib.sync(dev)
+    #   slot = lib.find(dev.get_serial_number(), arbitrary_hash(data))
+    def __init__(self, path, capacity=64):
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._data_path = os.path.join(self.path, 'waveforms.npy')
+        self._index_path = os.path.join(self.path, 'index.json')
+
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                index = json.load(f)
+        else:
+            index = {'waveforms': {}, 'devices': {}}
+
+        # hash -> row number
+        self._rows = index['waveforms']
+
+        # serial number (as a string) -> {slot: hash}
+        self._devices = dict((serial, dict((int(s), h) for s, h in slots.items())) for serial, slots in index['devices'].items())
+
+        np = _numpy()
+        if os.path.exists(self._data_path):
+            self._data = np.load(self._data_path, mmap_mode='r+')
+        else:
+            self._data = np.lib.format.open_memmap(self._data_path, mode='w+', dtype=np.uint16, shape=(capacity, ARB_POINTS))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, digest):
+        return digest in self._rows
+
+    def _grow(self):
+        # Double the number of rows of the backing file
+        np = _numpy()
+        old = self._data
+        tmp_path = self._data_path + '.tmp'
+        new = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint16, shape=(old.shape[0] * 2, ARB_POINTS))
+        new[:old.shape[0]] = old
+        new.flush()
+        del old, new
+        os.replace(tmp_path, self._data_path)
+        self._data = np.load(self._data_path, mmap_mode='r+')
+
+    def add(self, data):
+        # Stores prepared DAC values (if they aren't stored already) and
+        # returns their content hash
+        digest = arbitrary_hash(data)
+        if digest not in self._rows:
+            row = len(self._rows)
+            if row >= self._data.shape[0]:
+                self._grow()
+            self._data[row] = data
+            self._rows[digest] = row
+        return digest
+
+    def get(self, digest):
+        # Returns a read-only view of the stored waveform
+        view = self._data[self._rows[digest]]
+        view.flags.writeable = False
+        return view
+
+    def record(self, serial, slot, data):
+        # Records that the slot of the device now holds data, the library is
+        # saved right away so later sessions know about it
+        digest = self.add(data)
+        self._devices.setdefault(str(serial), {})[arb_slot(slot)] = digest
+        self.save()
+        return digest
+
+    def forget(self, serial, slot=None):
+        # Drops what is known about one slot (or all slots) of a device
+        slots = self._devices.get(str(serial), {})
+        if slot is None:
+            slots.clear()
+        else:
+            slots.pop(arb_slot(slot), None)
+        self.save()
+
+    def slots(self, serial):
+        # {slot: hash} of the known slot contents of a device
+        return dict(self._devices.get(str(serial), {}))
+
+    def find(self, serial, digest):
+        # Returns the lowest slot of the device that holds the waveform or
+        # None
+        matches = [slot for slot, h in self._devices.get(str(serial), {}).items() if h == digest]
+        return min(matches) if matches else None
+
+    def sync(self, dev, refresh=False):
+        # Reads back every enabled arbitrary waveform slot of the device that
+        # isn't already known (all of them if refresh is set) and saves the
+        # index.  Returns the {slot: hash} of the device.
+        serial = dev.get_serial_number()
+        known = self._devices.setdefault(str(serial), {})
+
+        num_slots = min(dev.get_arb_max_num(), ARB_MAX_SLOTS)
+        for slot in range(1, num_slots + 1):
+            if refresh or slot not in known:
+                known[slot] = self.add(dev.download_arbitrary(slot))
+
+        self.save()
+        return dict(known)
+
+    def save(self):
+        self._data.flush()
+
+        index = {
+            'waveforms': self._rows,
+            'devices': dict((serial, dict((str(s), h) for s, h in slots.items())) for serial, slots in self._devices.items()),
+        }
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, self._index_path)
+
+
+__all__ = [
+    'WaveformLibrary',
+]
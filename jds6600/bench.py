@@ -0,0 +1,208 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from .types import *
+from .iface import JDS6600
+from .sim import Simulator
+
+
+# Run with:
+#   python -m jds6600.bench --latency 0.002 --output results.json
+#
+# Every benchmark runs against a local Simulator so the numbers only depend
+# on the simulated link settings and the host side of the library.
+
+
+def _summarize(samples):
+    # Summary statistics (in seconds) of a list of durations
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def pct(p):
+        # Nearest-rank percentile
+        idx = max(0, min(count - 1, math.ceil(p * count / 100) - 1))
+        return ordered[idx]
+
+    total = sum(ordered)
+    return {
+        'count': count,
+        'total': total,
+        'mean': total / count,
+        'min': ordered[0],
+        'p50': pct(50),
+        'p90': pct(90),
+        'p99': pct(99),
+        'max': ordered[-1],
+    }
+
+
+def _time_calls(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_command_latency(dev, iterations):
+    # Round trip of the smallest possible command
+    stats = _summarize(_time_calls(dev.get_model, iterations))
+    stats['commands_per_second'] = stats['count'] / stats['total']
+    return stats
+
+
+def bench_pipelined_reads(dev, iterations):
+    # Same command as bench_command_latency() but with several commands in
+    # flight at a time
+    start = time.perf_counter()
+    with dev.pipeline() as p:
+        pending = [p.get(Command.MODEL) for _ in range(iterations)]
+    for req in pending:
+        req.result()
+    total = time.perf_counter() - start
+    return {
+        'count': iterations,
+        'total': total,
+        'commands_per_second': iterations / total,
+    }
+
+
+def bench_get_config(dev, iterations):
+    return _summarize(_time_calls(dev.get_config, iterations))
+
+
+def bench_set_config(dev, iterations):
+    # Alternate between two configurations so every write changes something
+    configs = [
+        dict(waveform=Waveform.SINE, frequency=1000, amplitude=1.0, offset=0.0, dutycycle=50, output=Output.ON),
+        dict(waveform=Waveform.SQUARE, frequency=2000.5, amplitude=2.5, offset=-0.5, dutycycle=25, output=Output.OFF),
+    ]
+    count = iter(range(iterations))
+    return _summarize(_time_calls(lambda: dev.set_config(**configs[next(count) % 2]), iterations))
+
+
+def bench_frequency_step(dev, iterations):
+    # Host stepped sweep from 1 kHz in 0.01 Hz steps
+    freqs = iter(1000 + i / 100 for i in range(iterations))
+    stats = _summarize(_time_calls(lambda: dev.set_frequency(next(freqs), Channel.CH1), iterations))
+    stats['steps_per_second'] = stats['count'] / stats['total']
+    return stats
+
+
+def bench_profile_save_load(dev, iterations):
+    count = iter(range(iterations))
+
+    def save_load():
+        slot = next(count) % 100
+        dev.profile_save(slot)
+        dev.profile_load(slot)
+
+    return _summarize(_time_calls(save_load, iterations))
+
+
+# Run in a fresh interpreter by bench_startup(), prints the import, discovery
+# and connect times
+_STARTUP_SCRIPT = '''
+import sys, time
+t0 = time.perf_counter()
+import jds6600
+t1 = time.perf_counter()
+jds6600.find_devices()
+t2 = time.perf_counter()
+dev = jds6600.JDS6600(port=sys.argv[1])
+dev.get_model()
+t3 = time.perf_counter()
+print(t1 - t0, t2 - t1, t3 - t2)
+'''
+
+
+def bench_startup(dev, iterations):
+    # What a short-lived script pays before its first command: importing the
+    # package, looking for USB devices and opening the port.  Each sample is
+    # a new process (at most 20 of them), the discovery cache is kept in a
+    # temporary directory for the whole run.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = {'import': [], 'discover': [], 'connect': [], 'process': []}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, XDG_CACHE_HOME=cache_dir, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+        for _ in range(min(iterations, 20)):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, dev._args['port']], env=env, check=True, capture_output=True, text=True).stdout
+            samples['process'].append(time.perf_counter() - start)
+            for name, value in zip(('import', 'discover', 'connect'), out.split()):
+                samples[name].append(float(value))
+    return dict((name, _summarize(values)) for name, values in samples.items())
+
+
+BENCHMARKS = {
+    'command_latency': bench_command_latency,
+    'pipelined_reads': bench_pipelined_reads,
+    'get_config': bench_get_config,
+    'set_config': bench_set_config,
+    'frequency_step': bench_frequency_step,
+    'profile_save_load': bench_profile_save_load,
+    'startup': bench_startup,
+}
+
+
+def run(names=None, iterations=200, latency=0.001, process_time=0.0, baudrate=115200):
+    if names is None:
+        names = list(BENCHMARKS)
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'link': {
+            'latency': latency,
+            'process_time': process_time,
+            'baudrate': baudrate,
+        },
+        'iterations': iterations,
+        'benchmarks': {},
+    }
+
+    with Simulator(latency=latency, process_time=process_time, baudrate=baudrate) as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            for name in names:
+                results['benchmarks'][name] = BENCHMARKS[name](dev, iterations)
+        finally:
+            dev.close()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jds6600.bench', description='JDS6600 host-side benchmarks against a simulated device')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark', help=f'benchmarks to run (default: all): {", ".join(BENCHMARKS)}')
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.001, help='simulated link latency in seconds')
+    parser.add_argument('--process-time', type=float, default=0.0, help='simulated per-command device time in seconds')
+    parser.add_argument('--baudrate', type=int, default=115200, help='simulated line rate, 0 to disable throttling')
+    parser.add_argument('-o', '--output', help='write the JSON results to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    unknown = [n for n in args.benchmarks if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmark: {", ".join(unknown)}')
+
+    results = run(args.benchmarks or None, args.iterations, args.latency, args.process_time, args.baudrate or None)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
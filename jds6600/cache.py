@@ -0,0 +1,148 @@
+import time
+
+from .types import *
+
+
+# Registers that hold live measurements or that trigger an action on the
+# device instead of holding a setting.  These always go to the wire.
+_UNCACHEABLE = frozenset(int(c) for c in (
+    Command.ACTION,
+    Command.RESET_COUNTER,
+    Command.PROFILE_SAVE,
+    Command.PROFILE_LOAD,
+    Command.PROFILE_CLEAR,
+    Command.COUNTER,
+    Command.MEASURE_FREQ_10HZ,
+    Command.MEASURE_FREQ_1000HZ,
+    Command.MEASURE_PULSE_PLUS,
+    Command.MEASURE_PULSE_MINUS,
+    Command.MEASURE_PERIOD,
+    Command.MEASURE_DUTYCYCLE,
+    Command.MEASURE_UNKNOWN_1,
+    Command.MEASURE_UNKNOWN_2,
+    Command.MEASURE_UNKNOWN_3,
+))
+
+# On some models the system settings are read from the write register + 1
+# (see JDS6600.fix_read_bug) so a write to one of these registers can't be
+# stored under a single key.  Instead any write to the system settings drops
+# every register in this range.
+_SYSTEM_SETTINGS = range(Command.SYSTEM_SOUND, Command.SYSTEM_READ_BUG_ARB_MAX_NUM + 1)
+
+# Registers that can be changed from the front panel without the host knowing
+# about it, so cached values for these go stale after a short time.
+DEFAULT_TTL = {
+    Command.UI_MODE: 1.0,
+    Command.CHANNEL_ENABLE: 1.0,
+}
+
+
+def _normalize(args):
+    # Values read from the device are always ints (or a tuple of ints when
+    # the register holds more than one value), make the written arguments
+    # look the same so they can be compared against what was read.
+    values = tuple(int(a) if float(a).is_integer() else a for a in args)
+    if len(values) == 1:
+        return values[0]
+    return values
+
+
+class RegisterCache:
+    # Write-through shadow copy of the device registers.  JDS6600._get() and
+    # JDS6600._set() keep this up to date, reads are served from here while
+    # the value is fresh and writes that would not change anything are
+    # skipped.
+    #
+    # ttl maps Command values to the number of seconds a cached value stays
+    # valid, registers not listed use default_ttl.  A TTL of None means the
+    # value never expires and a TTL of 0 disables caching of that register.
+    def __init__(self, ttl=None, default_ttl=None):
+        self.ttl = dict((int(k), v) for k, v in DEFAULT_TTL.items())
+        if ttl is not None:
+            self.ttl.update((int(k), v) for k, v in ttl.items())
+        self.default_ttl = default_ttl
+
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+        self.skipped_writes = 0
+
+    def cacheable(self, cmd):
+        return int(cmd) not in _UNCACHEABLE and self.ttl.get(int(cmd), self.default_ttl) != 0
+
+    def _fresh(self, cmd):
+        entry = self._values.get(cmd)
+        if entry is None:
+            return None
+
+        value, timestamp = entry
+        ttl = self.ttl.get(cmd, self.default_ttl)
+        if ttl is not None and time.monotonic() - timestamp > ttl:
+            del self._values[cmd]
+            return None
+        return entry
+
+    def lookup(self, cmd):
+        # Returns a (found, value) tuple so that cached values of None can be
+        # told apart from missing values.
+        cmd = int(cmd)
+        if not self.cacheable(cmd):
+            return (False, None)
+
+        entry = self._fresh(cmd)
+        if entry is None:
+            self.misses += 1
+            return (False, None)
+
+        self.hits += 1
+        return (True, entry[0])
+
+    def store(self, cmd, value):
+        cmd = int(cmd)
+        if self.cacheable(cmd):
+            self._values[cmd] = (value, time.monotonic())
+
+    def unchanged(self, cmd, args):
+        # Returns True if writing args to the register would not change the
+        # currently cached (and still fresh) value.
+        cmd = int(cmd)
+        if not self.cacheable(cmd) or cmd in _SYSTEM_SETTINGS:
+            return False
+
+        entry = self._fresh(cmd)
+        if entry is None or entry[0] != _normalize(args):
+            return False
+
+        self.skipped_writes += 1
+        return True
+
+    def update(self, cmd, args):
+        # Record a successful write
+        cmd = int(cmd)
+        if cmd == Command.PROFILE_LOAD:
+            # Loading a profile changes most of the waveform settings
+            self.invalidate()
+        elif cmd in _SYSTEM_SETTINGS:
+            for c in _SYSTEM_SETTINGS:
+                self._values.pop(c, None)
+        else:
+            self.store(cmd, _normalize(args))
+
+    def invalidate(self, cmd=None):
+        if cmd is None:
+            self._values.clear()
+        else:
+            self._values.pop(int(cmd), None)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'skipped_writes': self.skipped_writes,
+            'entries': len(self._values),
+        }
+
+
+__all__ = [
+    'RegisterCache',
+]
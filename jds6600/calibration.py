@@ -0,0 +1,187 @@
+import bisect
+import json
+import math
+import os
+import statistics
+import time
+
+from .types import *
+from .freqplan import plan_frequency
+from .measure import MEASURE_SCALE
+
+
+# Default calibration points, 10 Hz to 1 MHz in roughly 1-2-5 steps.  The
+# frequency counter's 1000HZ register (mHz) overflows above a few MHz.
+CALIBRATION_FREQUENCIES = tuple(m * 10 ** e for e in range(1, 6) for m in (1, 2, 5)) + (1000000,)
+
+
+def default_calibration_dir():
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_dir, 'jds6600', 'calibration')
+
+
+def calibration_path(serial_number, directory=None):
+    return os.path.join(directory or default_calibration_dir(), f'{serial_number}.json')
+
+
+class FrequencyCalibration:
+    # Per unit frequency correction table.  points are (frequency, ratio)
+    # pairs where ratio is the measured output frequency divided by the
+    # frequency that was programmed, between the points the ratio is
+    # interpolated linearly on a log frequency scale (and held constant
+    # outside of them).  Both channels share the reference clock so one table
+    # covers both.
+    #
+    #   cal = calibrate(dev)                 # or load_calibration(serial)
+    #   dev.use_calibration(cal)
+    #   dev.set_frequency(1000)              # programs 1000 / cal.ratio(1000)
+    def __init__(self, points, serial_number=None, created=None):
+        points = sorted((float(f), float(r)) for f, r in points)
+        if not points:
+            raise ValueError('A calibration needs at least one point')
+        if any(f <= 0 or r <= 0 for f, r in points):
+            raise ValueError('Calibration frequencies and ratios must be positive')
+
+        self.frequencies = tuple(f for f, _ in points)
+        self.ratios = tuple(r for _, r in points)
+        self.serial_number = serial_number
+        self.created = created
+
+        self._log_frequencies = tuple(math.log(f) for f in self.frequencies)
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def __repr__(self):
+        return f'FrequencyCalibration({len(self)} points, serial_number={self.serial_number!r})'
+
+    def ratio(self, freq):
+        # Interpolated measured / programmed ratio at a frequency
+        ratios = self.ratios
+        if freq <= self.frequencies[0]:
+            return ratios[0]
+        if freq >= self.frequencies[-1]:
+            return ratios[-1]
+
+        idx = bisect.bisect_right(self.frequencies, freq)
+        x0, x1 = self._log_frequencies[idx - 1], self._log_frequencies[idx]
+        t = (math.log(freq) - x0) / (x1 - x0)
+        return ratios[idx - 1] + t * (ratios[idx] - ratios[idx - 1])
+
+    def correct(self, freq):
+        # Frequency to program so that the output is freq
+        if freq <= 0:
+            return freq
+        return freq / self.ratio(freq)
+
+    def uncorrect(self, freq):
+        # Actual output frequency for a programmed frequency
+        if freq <= 0:
+            return freq
+        return freq * self.ratio(freq)
+
+    def to_dict(self):
+        return {
+            'serial_number': self.serial_number,
+            'created': self.created,
+            'points': [list(p) for p in zip(self.frequencies, self.ratios)],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['points'], data.get('serial_number'), data.get('created'))
+
+    def save(self, path):
+        # Written to a temporary file first so a crash never leaves a
+        # truncated table behind
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def load_calibration(serial_number, directory=None):
+    # The cached calibration of a unit, None if it hasn't been calibrated
+    path = calibration_path(serial_number, directory)
+    if not os.path.exists(path):
+        return None
+    return FrequencyCalibration.load(path)
+
+
+def _measure(dev, register, samples, interval):
+    # Median of several counter readings, the counter only updates once per
+    # gate time so the readings are spaced out by interval.  Zero readings
+    # (no signal, or out of the counter's range) are left out.
+    scale = MEASURE_SCALE[register]
+    values = []
+    for idx in range(samples):
+        if idx:
+            time.sleep(interval)
+        value = dev.get_measurement(register)
+        if value:
+            values.append(value * scale)
+    return statistics.median(values) if values else None
+
+
+def calibrate(dev, frequencies=CALIBRATION_FREQUENCIES, which=Channel.CH1, settle=1.0, samples=3, interval=1.0, register=Command.MEASURE_FREQ_1000HZ, directory=None, save=True):
+    # Builds a FrequencyCalibration for a device by stepping one channel
+    # (which has to be wired to the measurement input) through frequencies
+    # and reading the frequency counter.  settle is the time allowed after
+    # each frequency change before the first reading, it should be longer
+    # than the counter gate time (1 s by default).  This takes a few
+    # minutes with the defaults.
+    #
+    # The device settings and UI mode are restored afterwards.  With save set
+    # the table is also stored in the calibration cache (see
+    # load_calibration()) under the device serial number.
+    if which not in (Channel.CH1, Channel.CH2):
+        raise ValueError('Calibrate one channel at a time')
+    if register not in (Command.MEASURE_FREQ_10HZ, Command.MEASURE_FREQ_1000HZ):
+        raise ValueError(f'Not a frequency measurement register: {register}')
+
+    serial_number = dev.get_serial_number()
+    state = dev.get_state()
+    ui_mode = dev.get_ui_mode()
+    freq_cmd = (Command.FREQUENCY_CH1, Command.FREQUENCY_CH2)[which]
+
+    points = []
+    try:
+        dev.set_ui_mode(UIMode.MEASURE)
+        dev._set(Command.MEASURE_MODE, MeasureMode.FREQUENCY)
+        dev.set_output(Output.ON, which)
+
+        for freq in frequencies:
+            # Written directly, the calibration attached to the device (if
+            # any) must not be applied to its own measurement
+            dev._set(freq_cmd, *plan_frequency(freq))
+            time.sleep(settle)
+            measured = _measure(dev, register, samples, interval)
+            if measured is not None:
+                points.append((freq, measured / freq))
+    finally:
+        dev.restore_state(state)
+        dev.set_ui_mode(ui_mode)
+
+    if not points:
+        raise Exception('No frequency measurements, is the output connected to the measurement input?')
+
+    calibration = FrequencyCalibration(points, serial_number, time.time())
+    if save:
+        calibration.save(calibration_path(serial_number, directory))
+    return calibration
+
+
+__all__ = [
+    'CALIBRATION_FREQUENCIES',
+    'FrequencyCalibration',
+    'calibrate',
+    'calibration_path',
+    'default_calibration_dir',
+    'load_calibration',
+]
@@ -0,0 +1,292 @@
+import itertools
+import struct
+import threading
+import time
+
+from .codec import resync, is_response
+from .transport import open_transport
+
+
+# Capture log format: the magic bytes followed by one record per transport
+# call, each is a header (nanoseconds since the capture started, direction,
+# data length; little endian) and the raw bytes sent or received.
+#
+#   JDS6600(port, capture='run.jdscap')       # or dev.start_capture(path)
+#   python -m jds6600.replay replay run.jdscap --speed max
+_MAGIC = b'JDSCAP\x01\n'
+_RECORD = struct.Struct('<qBI')
+
+# Record directions
+TX = 0
+RX = 1
+
+
+class CaptureWriter:
+    # Appends capture records to a file.  Records go through a large write
+    # buffer so logging an exchange costs about a microsecond, call flush()
+    # (or close()) to get everything onto the disk.
+    def __init__(self, path, buffer_size=65536):
+        self.path = path
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(_MAGIC)
+        self._t0 = time.monotonic_ns()
+        self._lock = threading.Lock()
+
+        # Count of records written
+        self.records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record(self, direction, data, timestamp=None):
+        # timestamp is a time.monotonic_ns() value, default now
+        if not data:
+            return
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+        with self._lock:
+            self._file.write(_RECORD.pack(timestamp - self._t0, direction, len(data)))
+            self._file.write(data)
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_capture(path):
+    # Yields the records of a capture log as (seconds, direction, data)
+    with open(path, 'rb') as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f'Not a JDS6600 capture log: {path}')
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                # A capture that wasn't closed can end in a partial record
+                break
+            timestamp, direction, length = _RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                break
+            yield (timestamp / 1e9, direction, data)
+
+
+class CaptureTransport:
+    # Wraps a transport (see transport.py) and records everything written to
+    # and read from it in a CaptureWriter
+    def __init__(self, transport, writer):
+        self.transport = transport
+        self.writer = writer
+
+    @property
+    def timeout(self):
+        return self.transport.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.transport.timeout = value
+
+    @property
+    def write_timeout(self):
+        return self.transport.write_timeout
+
+    @write_timeout.setter
+    def write_timeout(self, value):
+        self.transport.write_timeout = value
+
+    @property
+    def is_open(self):
+        return self.transport.is_open
+
+    @property
+    def in_waiting(self):
+        return self.transport.in_waiting
+
+    def write(self, data):
+        timestamp = time.monotonic_ns()
+        written = self.transport.write(data)
+        self.writer.record(TX, data, timestamp)
+        return written
+
+    def readline(self):
+        line = self.transport.readline()
+        self.writer.record(RX, line)
+        return line
+
+    def read(self, size=1):
+        data = self.transport.read(size)
+        self.writer.record(RX, data)
+        return data
+
+    def close(self):
+        self.transport.close()
+
+
+def _split_lines(buf):
+    # Removes the complete lines from buf (a bytearray) and returns them
+    # without their line endings
+    lines = []
+    while True:
+        idx = buf.find(b'\n')
+        if idx < 0:
+            return lines
+        lines.append(bytes(buf[:idx]).rstrip(b'\r'))
+        del buf[:idx + 1]
+
+
+def _responses(lines):
+    # The well formed responses among the lines, junk in front of a response
+    # is dropped the same way JDS6600 does
+    return [line for line in map(resync, lines) if is_response(line)]
+
+
+class _Send:
+    # One write of a capture log to replay: when it was sent, the command
+    # lines it holds and the number of responses that had arrived before it
+    __slots__ = ('time', 'data', 'lines', 'after')
+
+    def __init__(self, time, data, after):
+        self.time = time
+        self.data = data
+        self.lines = _split_lines(bytearray(data))
+        self.after = after
+
+
+def _load_replay(path):
+    sends = []
+    expected = []
+    rx = bytearray()
+    for timestamp, direction, data in read_capture(path):
+        if direction == TX:
+            sends.append(_Send(timestamp, data, len(expected)))
+        else:
+            rx += data
+            expected += _responses(_split_lines(rx))
+    return sends, expected
+
+
+class ReplayResult:
+    # Outcome of replay_capture(): the responses that the capture log holds
+    # and the ones the stand-in device sent back, in order
+    def __init__(self, commands, expected, received, duration, timeouts):
+        self.commands = commands
+        self.expected = expected
+        self.received = received
+        self.duration = duration
+        self.timeouts = timeouts
+
+    def mismatches(self):
+        # (index, expected, received) of every response that differs, None
+        # for responses that are missing on either side
+        pairs = itertools.zip_longest(self.expected, self.received)
+        return [(idx, e, r) for idx, (e, r) in enumerate(pairs) if e != r]
+
+    def summary(self):
+        return {
+            'commands': self.commands,
+            'expected_responses': len(self.expected),
+            'responses': len(self.received),
+            'mismatches': len(self.mismatches()),
+            'timeouts': self.timeouts,
+            'duration': self.duration,
+            'commands_per_second': self.commands / self.duration if self.duration > 0 else None,
+        }
+
+
+class _Receiver:
+    # Collects the responses arriving on a transport
+    def __init__(self, link):
+        self.link = link
+        self.buf = bytearray()
+        self.lines = []
+
+    def _add(self, data):
+        self.buf += data
+        self.lines += _responses(_split_lines(self.buf))
+
+    def poll(self):
+        waiting = self.link.in_waiting
+        if waiting:
+            self._add(self.link.read(waiting))
+
+    def wait(self, count):
+        # Reads until count responses have arrived, False if the transport
+        # timeout expires first
+        while len(self.lines) < count:
+            line = self.link.readline()
+            self._add(line)
+            if not line.endswith(b'\n'):
+                return False
+        return True
+
+
+def _wait_until(deadline):
+    delay = deadline - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def replay_capture(path, target, speed=1.0, transport=None, timeout=1.0, **kwargs):
+    # Sends the commands of a capture log to a stand-in device and collects
+    # its responses.  target is a port (opened with open_transport(), extra
+    # arguments are passed on) or an object with a handle() method like
+    # Simulator which is called in-process.
+    #
+    # speed 1.0 keeps the original timing, 2.0 is twice as fast and None
+    # sends as fast as possible.  Either way a command isn't sent before the
+    # responses that arrived ahead of it in the log have arrived again (for up
+    # to timeout seconds each), so the replay has the same mix of waiting
+    # and pipelined commands as the original traffic.
+    sends, expected = _load_replay(path)
+    commands = sum(len(send.lines) for send in sends)
+    t0 = sends[0].time if sends else 0.0
+
+    if hasattr(target, 'handle'):
+        received = []
+        start = time.monotonic()
+        for send in sends:
+            if speed is not None:
+                _wait_until(start + (send.time - t0) / speed)
+            for line in send.lines:
+                resp = target.handle(line)
+                if resp is not None:
+                    received += _responses(_split_lines(bytearray(resp)))
+        return ReplayResult(commands, expected, received, time.monotonic() - start, 0)
+
+    link = open_transport(target, transport=transport, timeout=timeout, **kwargs)
+    try:
+        receiver = _Receiver(link)
+        timeouts = 0
+        start = time.monotonic()
+        for send in sends:
+            if not receiver.wait(send.after):
+                timeouts += 1
+            if speed is not None:
+                _wait_until(start + (send.time - t0) / speed)
+            link.write(send.data)
+            receiver.poll()
+
+        if not receiver.wait(len(expected)):
+            timeouts += 1
+        duration = time.monotonic() - start
+    finally:
+        link.close()
+
+    return ReplayResult(commands, expected, receiver.lines, duration, timeouts)
+
+
+__all__ = [
+    'CaptureTransport',
+    'CaptureWriter',
+    'ReplayResult',
+    'read_capture',
+    'replay_capture',
+]
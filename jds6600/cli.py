@@ -0,0 +1,244 @@
+import argparse
+import enum
+import inspect
+import json
+import os
+import shlex
+import sys
+
+from .types import *
+from .iface import JDS6600
+
+
+# Run with:
+#   jds6600 set_frequency 1000 CH1
+#   jds6600 set_config waveform=SQUARE frequency=2500 which=CH2
+#   jds6600 batch setup.txt            (or - for stdin)
+#   jds6600 repl
+#   jds6600 serve --port /dev/ttyUSB0  (keeps the port open, see daemon.py)
+#
+# Commands are JDS6600 method names followed by their arguments, positional
+# or name=value.  Enum arguments are given by name (SINE, CH1, ON, ...) or by
+# value.  In a batch file every line is one command, # starts a comment.
+#
+# While a daemon is running on the default socket every invocation uses it
+# instead of opening the port, so scripts don't pay for a process start and
+# a port open per command.
+
+# The JDS6600 methods that can be run, set_sweep() needs a SweepConfig which
+# can't be given on the command line
+_COMMANDS = sorted(n for n in dir(JDS6600) if n.startswith(('get_', 'set_', 'profile_')) and n != 'set_sweep')
+
+# Enum types of the method parameters, by method and parameter or by
+# parameter for all methods
+_PARAM_ENUMS = {
+    ('set_waveform', 'value'): Waveform,
+    ('set_output', 'value'): Output,
+    ('set_ui_mode', 'value'): UIMode,
+    'which': Channel,
+    'waveform': Waveform,
+    'output': Output,
+    'register': Command,
+}
+
+
+class CommandError(ValueError):
+    # A command line that can't be turned into a method call
+    pass
+
+
+def _convert(method, param, token):
+    typ = _PARAM_ENUMS.get((method, param)) or _PARAM_ENUMS.get(param)
+    if typ is not None and not token.lstrip('-').isdigit():
+        try:
+            return typ[token.upper()]
+        except KeyError:
+            raise CommandError(f'Invalid {param} for {method}: {token}, should be one of {", ".join(typ.__members__)}')
+    for convert in (int, float):
+        try:
+            return convert(token)
+        except ValueError:
+            pass
+    raise CommandError(f'Invalid {param} for {method}: {token}')
+
+
+def parse_command(line):
+    # Returns (method, args, kwargs) for a command line, None for blank and
+    # comment lines
+    tokens = shlex.split(line, comments=True)
+    if not tokens:
+        return None
+
+    method, tokens = tokens[0], tokens[1:]
+    if method not in _COMMANDS:
+        raise CommandError(f'Unknown command: {method}')
+    params = list(inspect.signature(getattr(JDS6600, method)).parameters)[1:]
+
+    args = []
+    kwargs = {}
+    for token in tokens:
+        name, sep, value = token.partition('=')
+        if sep:
+            if name not in params:
+                raise CommandError(f'Unknown argument for {method}: {name}')
+            kwargs[name] = _convert(method, name, value)
+        else:
+            if kwargs:
+                raise CommandError(f'Positional argument after name=value arguments: {token}')
+            if len(args) >= len(params):
+                raise CommandError(f'Too many arguments for {method}')
+            args.append(_convert(method, params[len(args)], token))
+    return method, tuple(args), kwargs
+
+
+def _plain(value):
+    # JSON compatible copy of a result, enums by name
+    if isinstance(value, enum.Enum):
+        return value.name
+    elif isinstance(value, (tuple, list)):
+        return [_plain(v) for v in value]
+    elif isinstance(value, dict):
+        return dict((k, _plain(v)) for k, v in value.items())
+    elif hasattr(value, 'to_dict'):
+        return _plain(value.to_dict())
+    elif hasattr(value, '__slots__'):
+        return dict((n, _plain(getattr(value, n))) for n in value.__slots__)
+    return value
+
+
+def format_result(value, as_json=False):
+    # Text to print for a method result, None if there's nothing to print
+    if value is None:
+        return None
+    value = _plain(value)
+    if as_json:
+        return json.dumps(value)
+
+    def fmt(v):
+        if isinstance(v, dict):
+            return ' '.join(f'{k}={fmt(x)}' for k, x in v.items())
+        elif isinstance(v, list):
+            return ' '.join(fmt(x) for x in v)
+        return str(v)
+
+    # get_config(Channel.BOTH): one line per channel
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return '\n'.join(fmt(v) for v in value)
+    return fmt(value)
+
+
+def _connect(args):
+    # A running daemon is used unless a port is given or --direct is set
+    if not args.direct and (args.port is None or args.socket is not None):
+        from .daemon import JDS6600Client, default_socket_path
+        socket_path = args.socket or default_socket_path()
+        if args.socket is not None or os.path.exists(socket_path):
+            try:
+                return JDS6600Client(socket_path)
+            except OSError:
+                # A socket left behind by a daemon that is gone
+                if args.socket is not None:
+                    raise
+    return JDS6600(port=args.port)
+
+
+def _run(dev, command, as_json):
+    method, cmd_args, cmd_kwargs = command
+    text = format_result(getattr(dev, method)(*cmd_args, **cmd_kwargs), as_json)
+    if text is not None:
+        print(text, flush=True)
+
+
+def run_batch(dev, lines, as_json=False, pipeline=True):
+    # Runs every command of a batch in one session.  All of the lines are
+    # parsed before anything is sent, and with a directly opened device the
+    # commands are pipelined (see JDS6600.pipeline()) so writes don't wait
+    # for each other.
+    commands = []
+    for lineno, line in enumerate(lines, 1):
+        try:
+            command = parse_command(line)
+        except (CommandError, ValueError) as e:
+            raise CommandError(f'line {lineno}: {e}')
+        if command is not None:
+            commands.append(command)
+
+    if pipeline and isinstance(dev, JDS6600):
+        with dev.pipeline():
+            for command in commands:
+                _run(dev, command, as_json)
+    else:
+        for command in commands:
+            _run(dev, command, as_json)
+    return len(commands)
+
+
+def run_repl(dev, as_json=False, stdin=sys.stdin):
+    # Runs commands one at a time as they are typed, errors are reported and
+    # the session goes on
+    interactive = stdin.isatty()
+    while True:
+        try:
+            line = input('jds6600> ') if interactive else stdin.readline()
+        except EOFError:
+            break
+        if not interactive and not line:
+            break
+        if line.strip() in ('exit', 'quit'):
+            break
+        if line.strip() == 'help':
+            print(' '.join(_COMMANDS))
+            continue
+
+        try:
+            command = parse_command(line)
+            if command is not None:
+                _run(dev, command, as_json)
+        except Exception as e:
+            print(f'error: {e}', file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='jds6600', description='Control a JDS6600 signal generator', epilog=f'commands: {" ".join(_COMMANDS)}')
+    parser.add_argument('--port', help='serial port of the device (default: the daemon if it is running, else autodetect)')
+    parser.add_argument('--socket', help='Unix socket of the daemon to use')
+    parser.add_argument('--direct', action='store_true', help="open the port even if a daemon is running")
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--no-pipeline', action='store_true', help="don't pipeline batch commands")
+    parser.add_argument('command', help='a command, or batch FILE, repl or serve')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        from .daemon import main as serve
+        extra = [] if args.port is None else ['--port', args.port]
+        extra += [] if args.socket is None else ['--socket', args.socket]
+        serve(extra + args.args)
+        return 0
+
+    try:
+        if args.command == 'batch':
+            if len(args.args) != 1:
+                parser.error('batch needs one file name (or - for stdin)')
+            if args.args[0] == '-':
+                lines = sys.stdin.readlines()
+            else:
+                with open(args.args[0]) as f:
+                    lines = f.readlines()
+        elif args.command != 'repl':
+            command = parse_command(shlex.join([args.command] + args.args))
+
+        dev = _connect(args)
+        try:
+            if args.command == 'batch':
+                run_batch(dev, lines, args.json, not args.no_pipeline)
+            elif args.command == 'repl':
+                run_repl(dev, args.json)
+            else:
+                _run(dev, command, args.json)
+        finally:
+            dev.close()
+    except Exception as e:
+        print(f'jds6600: error: {e}', file=sys.stderr)
+        return 1
+    return 0
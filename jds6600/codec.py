@@ -0,0 +1,139 @@
+# Bytes level encoding and decoding of the JDS6600 command protocol.
+#
+# Every command is ":<op><NN>=<v1>,<v2>,...<vN>." followed by "\r\n", where
+# <op> is 'r' (read) or 'w' (write) and NN is the two digit register number.
+# Reads are answered with ":r<NN>=<values>." and writes with ":ok".
+#
+# The command prefixes, the complete default read commands and the digits of
+# small values are encoded once up front so that building a command is only a
+# few bytearray appends, and responses are parsed straight from the received
+# bytes.
+
+from .errors import ProtocolError, CommandMismatchError, ResponseFormatError
+
+
+# Register numbers are two digits
+_NUM_REGISTERS = 100
+
+_READ_PREFIX = tuple(b':r%02d=' % r for r in range(_NUM_REGISTERS))
+_WRITE_PREFIX = tuple(b':w%02d=' % r for r in range(_NUM_REGISTERS))
+
+# Reads without arguments (almost all of them) always send a 0 value
+_READ_CMDS = tuple(b':r%02d=0.\r\n' % r for r in range(_NUM_REGISTERS))
+
+# Most values written are small (enums, amplitudes in mV, ...)
+_SMALL_INTS = tuple(b'%d' % v for v in range(10000))
+
+_OK = b':ok'
+
+# Stale responses (see answers()) thrown away while waiting for a response
+_MAX_STALE_LINES = 4
+
+
+def _value_bytes(value):
+    if isinstance(value, int):
+        if 0 <= value < len(_SMALL_INTS):
+            return _SMALL_INTS[value]
+        return b'%d' % value
+    return str(value).encode()
+
+
+class CommandEncoder:
+    # Builds commands into one reusable buffer.  The buffer returned by
+    # read() and write() is only valid until the next command is encoded,
+    # copy it (bytes(buf)) if it needs to be kept.
+    __slots__ = ('_buf',)
+
+    def __init__(self):
+        self._buf = bytearray(64)
+
+    def _encode(self, prefix, args):
+        buf = self._buf
+        del buf[:]
+        buf += prefix
+        for idx, value in enumerate(args):
+            if idx:
+                buf += b','
+            buf += _value_bytes(value)
+        buf += b'.\r\n'
+        return buf
+
+    def read(self, cmd, args=()):
+        if not args:
+            return _READ_CMDS[cmd]
+        return self._encode(_READ_PREFIX[cmd], args)
+
+    def write(self, cmd, args):
+        return self._encode(_WRITE_PREFIX[cmd], args)
+
+
+def encode_command(op, cmd, args):
+    # Stand-alone version of CommandEncoder for callers that need to keep the
+    # command bytes
+    if op == 'r' and not args:
+        return _READ_CMDS[cmd]
+    prefix = _READ_PREFIX[cmd] if op == 'r' else _WRITE_PREFIX[cmd]
+    return prefix + b','.join(_value_bytes(v) for v in args) + b'.\r\n'
+
+
+def _errmsg(kind, cmd_bytes, line):
+    # Only used on the error paths, so the decoding cost doesn't matter
+    cmd_str = bytes(cmd_bytes).strip().decode(errors='replace')
+    ret_str = bytes(line).decode(errors='replace')
+    return f'{kind}: [cmd] {cmd_str} [ret] {ret_str}'
+
+
+def parse_read(cmd, cmd_bytes, line):
+    # Parses the response line (without the line ending) of a read of
+    # register cmd.  Returns an int, or a tuple of ints for registers that
+    # hold more than one value.
+    prefix = _READ_PREFIX[cmd]
+    if not line.startswith(prefix) or line[-1:] != b'.':
+        # Work out which error message applies
+        if line[:2] != b':r' or line[-1:] != b'.':
+            raise ProtocolError(_errmsg('Bad Response', cmd_bytes, line))
+        raise CommandMismatchError(_errmsg('Command mismatch', cmd_bytes, line))
+
+    body = line[len(prefix):-1]
+    try:
+        if b',' not in body:
+            return int(body)
+        return tuple(int(v) for v in body.split(b','))
+    except ValueError:
+        raise ResponseFormatError(_errmsg('Unexpected Response Format', cmd_bytes, line))
+
+
+def parse_write(cmd, cmd_bytes, line):
+    # Verifies the response line of a write
+    if line != _OK:
+        raise ProtocolError(_errmsg('Bad Response', cmd_bytes, line))
+
+
+def resync(line):
+    # Junk in front of a response (a partial line left over from an earlier
+    # timeout, noise on the line, ...) ends up at the start of the line that
+    # is read next.  Every response starts with ':', so the response is
+    # whatever follows the last one.
+    idx = line.rfind(b':')
+    if idx > 0:
+        return line[idx:]
+    return line
+
+
+def is_response(line):
+    # Whether line is a well formed response to some command
+    return line == _OK or (line[:1] == b':' and line[-1:] == b'.' and line[4:5] == b'=')
+
+
+def expected_prefix(cmd_bytes):
+    # The start of the response to cmd_bytes (":r23=" for reads of register
+    # 23, ":ok" for writes)
+    if cmd_bytes[1:2] in (b'w', b'a'):
+        return _OK
+    return bytes(cmd_bytes[:5])
+
+
+def answers(cmd_bytes, line):
+    # Whether line is the response to cmd_bytes as far as the register
+    # number goes, the values are checked when parsing.
+    return line.startswith(expected_prefix(cmd_bytes))
@@ -0,0 +1,286 @@
+import argparse
+import concurrent.futures
+import enum
+import errno
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from . import errors, types
+from .iface import JDS6600
+from .state import DeviceState
+from .sweep import SweepConfig
+
+
+# Run with:
+#   python -m jds6600.daemon [--port /dev/ttyUSB0] [--socket PATH]
+#
+# The daemon owns the serial port and any number of processes can use the
+# device at the same time through JDS6600Client, which has the same methods
+# as JDS6600.  Identical reads (same getter and arguments) that arrive while
+# one is already queued or running are answered by that one read.
+#
+# The protocol is one JSON object per line:
+#   {"id": 1, "method": "get_frequency", "args": [0], "kwargs": {}}
+#   {"id": 1, "result": 1000.0}
+#   {"id": 2, "error": {"type": "ValueError", "message": "..."}}
+#
+# Errors from jds6600.errors also carry their attributes (e.g. the
+# mismatches of a VerificationError) as "fields", the client raises the same
+# error type again with them.
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'jds6600.sock')
+    return f'/tmp/jds6600-{os.getuid()}.sock'
+
+
+# Only these JDS6600 methods can be called remotely
+_METHOD_PREFIXES = ('get_', 'set_', 'profile_', 'sweep_', 'restore_state')
+
+# Types that can be passed to and returned from remote calls besides the
+# plain JSON types
+_ENUMS = dict((name, getattr(types, name)) for name in types.__all__)
+_OBJECTS = {
+    'DeviceState': (DeviceState, DeviceState.to_dict, DeviceState.from_dict),
+    'SweepConfig': (SweepConfig, lambda c: dict((n, getattr(c, n)) for n in c.__slots__), lambda d: SweepConfig(**d)),
+}
+
+
+def _encode(obj):
+    if isinstance(obj, enum.Enum):
+        return {'__enum__': type(obj).__name__, 'value': obj.value}
+    elif isinstance(obj, tuple):
+        return {'__tuple__': [_encode(v) for v in obj]}
+    elif isinstance(obj, list):
+        return [_encode(v) for v in obj]
+    elif isinstance(obj, dict):
+        return dict((k, _encode(v)) for k, v in obj.items())
+    for name, (cls, to_dict, _) in _OBJECTS.items():
+        if isinstance(obj, cls):
+            return {'__object__': name, 'value': _encode(to_dict(obj))}
+    return obj
+
+
+def _decode(obj):
+    if isinstance(obj, list):
+        return [_decode(v) for v in obj]
+    elif not isinstance(obj, dict):
+        return obj
+
+    if '__enum__' in obj:
+        return _ENUMS[obj['__enum__']](obj['value'])
+    elif '__tuple__' in obj:
+        return tuple(_decode(v) for v in obj['__tuple__'])
+    elif '__object__' in obj:
+        _, _, from_dict = _OBJECTS[obj['__object__']]
+        return from_dict(_decode(obj['value']))
+    return dict((k, _decode(v)) for k, v in obj.items())
+
+
+def _call_key(method, args, kwargs):
+    # Requests are compared by their (already JSON) encoding
+    return json.dumps([method, args, kwargs], sort_keys=True)
+
+
+class _Dispatcher:
+    # Runs requests on the device one at a time and coalesces identical reads
+    def __init__(self, dev):
+        self.dev = dev
+        self._dev_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._reads = {}
+
+        self.requests = 0
+        self.coalesced = 0
+
+    def call(self, method, args, kwargs):
+        if not method.startswith(_METHOD_PREFIXES) or not callable(getattr(self.dev, method, None)):
+            raise ValueError(f'Unknown method: {method}')
+
+        key = None
+        with self._lock:
+            self.requests += 1
+        if method.startswith('get_'):
+            key = _call_key(method, args, kwargs)
+            with self._lock:
+                future = self._reads.get(key)
+                owner = future is None
+                if owner:
+                    future = self._reads[key] = concurrent.futures.Future()
+                else:
+                    self.coalesced += 1
+
+            # Another request is already going to do this read
+            if not owner:
+                return future.result()
+
+        try:
+            with self._dev_lock:
+                if key is not None:
+                    # From here on this read is on the wire, later requests
+                    # get their own read
+                    with self._lock:
+                        del self._reads[key]
+                result = getattr(self.dev, method)(*_decode(args), **_decode(kwargs))
+        except Exception as e:
+            if key is not None:
+                future.set_exception(e)
+            raise
+
+        if key is not None:
+            future.set_result(result)
+        return result
+
+
+def _error_response(req_id, e):
+    error = {'type': type(e).__name__, 'message': str(e)}
+    if type(e).__name__ in errors.__all__ and vars(e):
+        error['fields'] = _encode(vars(e))
+    return {'id': req_id, 'error': error}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        dispatcher = self.server.dispatcher
+        for line in self.rfile:
+            # Requests that can't be understood still get a response, the
+            # client is waiting for one
+            req_id = None
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('A request must be a JSON object')
+                req_id = request.get('id')
+                result = dispatcher.call(request['method'], request.get('args', []), request.get('kwargs', {}))
+                response = {'id': req_id, 'result': _encode(result)}
+            except Exception as e:
+                response = _error_response(req_id, e)
+
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class JDS6600Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # Shares one JDS6600 with any number of clients over a Unix socket.  The
+    # socket is only accessible by the user running the server.
+    daemon_threads = True
+
+    def __init__(self, dev, socket_path=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.dispatcher = _Dispatcher(dev)
+
+        # Remove a socket left behind by a server that didn't shut down
+        # cleanly, but not the socket of one that is still running
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+            else:
+                raise OSError(errno.EADDRINUSE, f'A JDS6600 server is already running on {self.socket_path}')
+            finally:
+                probe.close()
+
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(self.socket_path, _Handler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class JDS6600Client:
+    # Proxy with the same methods as JDS6600 that forwards every call to a
+    # JDS6600Server.  One instance can be shared between threads.
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = socket_path or default_socket_path()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(self.socket_path)
+        self._file = self._sock.makefile('rwb')
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+
+    def _call(self, method, *args, **kwargs):
+        with self._lock:
+            self._next_id += 1
+            request = {'id': self._next_id, 'method': method, 'args': _encode(list(args)), 'kwargs': _encode(kwargs)}
+            self._file.write(json.dumps(request).encode() + b'\n')
+            self._file.flush()
+
+            line = self._file.readline()
+            if not line:
+                raise Exception('JDS6600 server closed the connection')
+            response = json.loads(line)
+
+        if 'error' in response:
+            raise self._error(response['error'])
+        return _decode(response['result'])
+
+    @staticmethod
+    def _error(error):
+        # The exception for an error response, errors whose constructor
+        # doesn't match what was sent become a plain JDS6600Error
+        if error['type'] == 'ValueError':
+            return ValueError(error['message'])
+        elif error['type'] in errors.__all__:
+            cls = getattr(errors, error['type'])
+            fields = _decode(error.get('fields', {}))
+            try:
+                return cls(**fields) if fields else cls(error['message'])
+            except Exception:
+                return errors.JDS6600Error(f'{error["type"]}: {error["message"]}')
+        return Exception(f'{error["type"]}: {error["message"]}')
+
+    def __getattr__(self, name):
+        if not name.startswith(_METHOD_PREFIXES):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jds6600.daemon', description='Share a JDS6600 between processes over a Unix socket')
+    parser.add_argument('--port', help='serial port of the device (default: autodetect)')
+    parser.add_argument('--socket', help=f'path of the Unix socket (default: {default_socket_path()})')
+    parser.add_argument('--cache', action='store_true', help='serve repeated reads from the register cache')
+    args = parser.parse_args(argv)
+
+    dev = JDS6600(port=args.port, cache=args.cache)
+    with JDS6600Server(dev, args.socket) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    dev.close()
+
+
+__all__ = [
+    'JDS6600Client',
+    'JDS6600Server',
+]
+
+
+if __name__ == '__main__':
+    main()
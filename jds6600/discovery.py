@@ -0,0 +1,199 @@
+import json
+import os
+import stat
+
+
+# USB VID:PID of the JDS6600 (a CH340 serial converter)
+_USB_ID = '1a86:7523'
+
+# Directory whose modification time changes whenever a device node is added
+# or removed
+_DEV_DIR = '/dev'
+
+
+def default_discovery_cache():
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_dir, 'jds6600', 'devices.json')
+
+
+def _node_id(path):
+    # Identity of a device node: it changes when the node is recreated (the
+    # adapter was unplugged and plugged back in), None if it doesn't exist
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISCHR(st.st_mode):
+        return None
+    return [st.st_rdev, st.st_ctime_ns]
+
+
+def _dev_mtime():
+    try:
+        return os.stat(_DEV_DIR).st_mtime_ns
+    except OSError:
+        return None
+
+
+class DiscoveryCache:
+    # The ports found by the last USB scan and the device serial number seen
+    # on each of them, stored in a small JSON file.  Scanning the USB serial
+    # ports (and importing pyserial's port listing) costs more than the rest
+    # of a short script, the cache is trusted as long as no device node has
+    # been added to or removed from /dev and each port's node is the same one
+    # as when it was scanned, which only takes a few stat() calls to check.
+    def __init__(self, path=None):
+        self.path = path or default_discovery_cache()
+        self._data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or 'ports' not in data:
+            return None
+        return data
+
+    def _save(self):
+        # Best effort, a read-only cache directory just means no caching
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def valid(self):
+        # Without a /dev modification time (no /dev, or it can't be read)
+        # nothing would ever tell the cache is out of date, so it isn't used
+        data = self._data
+        dev_mtime = _dev_mtime()
+        if data is None or dev_mtime is None or data.get('dev_mtime') != dev_mtime:
+            return False
+        return all(_node_id(entry['port']) == entry['node'] for entry in data['ports'])
+
+    def ports(self):
+        # Cached ports in scan order, None if the cache is out of date
+        if not self.valid():
+            return None
+        return [entry['port'] for entry in self._data['ports']]
+
+    def update(self, ports):
+        # Records the result of a scan, serial numbers of ports that are still
+        # the same device node are kept
+        known = {}
+        if self._data is not None:
+            known = dict((e['port'], e) for e in self._data['ports'] if e.get('serial_number') is not None)
+
+        entries = []
+        for port in ports:
+            entry = {'port': port, 'node': _node_id(port), 'serial_number': None}
+            old = known.get(port)
+            if old is not None and old['node'] == entry['node']:
+                entry['serial_number'] = old['serial_number']
+            entries.append(entry)
+
+        self._data = {'dev_mtime': _dev_mtime(), 'ports': entries}
+        self._save()
+
+    def serial_number(self, port):
+        if not self.valid():
+            return None
+        for entry in self._data['ports']:
+            if entry['port'] == port:
+                return entry['serial_number']
+        return None
+
+    def set_serial_number(self, port, serial_number):
+        if not self.valid():
+            return
+        for entry in self._data['ports']:
+            if entry['port'] == port:
+                entry['serial_number'] = serial_number
+                self._save()
+                return
+
+    def find(self, serial_number):
+        # Port of the device with this serial number, if it's known
+        if not self.valid():
+            return None
+        for entry in self._data['ports']:
+            if entry['serial_number'] == serial_number:
+                return entry['port']
+        return None
+
+
+def scan_devices():
+    # Enumerates the USB serial ports (no cache) and returns the ones that
+    # match the VID:PID expected for the JDS6600 function generator
+    import serial.tools.list_ports
+    return [p.device for p in serial.tools.list_ports.grep(_USB_ID)]
+
+
+def find_devices(cache=True):
+    """
+    Returns the ports of all USB devices that match the VID:PID expected for
+    the JDS6600 function generator.  The last scan is reused while it is still
+    valid (see DiscoveryCache), cache can also be a DiscoveryCache or False
+    to always scan.
+    """
+    if not cache:
+        return scan_devices()
+    if cache is True:
+        cache = DiscoveryCache()
+
+    ports = cache.ports()
+    if ports is None:
+        ports = scan_devices()
+        cache.update(ports)
+    return ports
+
+
+def find_device(serial_number=None, cache=True):
+    """
+    Identifies if there are any USB devices that match the VID:PID expected for
+    the JDS6600 function generator.  With serial_number the port of that
+    device is returned, ports whose device isn't known yet are opened to read
+    their serial number (and the result is cached).
+    """
+    if cache is True:
+        cache = DiscoveryCache()
+    found = find_devices(cache)
+    if serial_number is None:
+        return found[0] if found else None
+
+    if cache:
+        port = cache.find(serial_number)
+        if port is not None:
+            return port
+
+    from .iface import JDS6600
+    for port in found:
+        if cache and cache.serial_number(port) is not None:
+            continue
+        try:
+            dev = JDS6600(port=port)
+            try:
+                found_serial = dev.get_serial_number()
+            finally:
+                dev.close()
+        except Exception:
+            continue
+        if cache:
+            cache.set_serial_number(port, found_serial)
+        if found_serial == serial_number:
+            return port
+    return None
+
+
+__all__ = [
+    'DiscoveryCache',
+    'default_discovery_cache',
+    'find_device',
+    'find_devices',
+    'scan_devices',
+]
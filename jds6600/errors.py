@@ -0,0 +1,55 @@
+class JDS6600Error(Exception):
+    # Base class of the errors raised for problems talking to the device
+    pass
+
+
+class TransportError(JDS6600Error):
+    # The connection to the device failed (write timeout, connection closed)
+    pass
+
+
+class ProtocolError(JDS6600Error):
+    # The device didn't answer a command with the expected response
+    pass
+
+
+class CommandMismatchError(ProtocolError):
+    # The response is for a different register than the one in the command
+    pass
+
+
+class ResponseFormatError(ProtocolError):
+    # The response is for the right register but the values can't be parsed
+    pass
+
+
+class ResponseTimeoutError(ProtocolError):
+    # No (complete) response line arrived before the serial timeout
+    pass
+
+
+class ResponseLostError(ProtocolError):
+    # When pipelining: the device answered a later command, so the response to
+    # this one was lost on the way
+    pass
+
+
+class VerificationError(JDS6600Error):
+    # Registers that don't hold the values that were written to them, see
+    # JDS6600.verify().  mismatches is a list of (Command, expected, actual).
+    def __init__(self, mismatches):
+        self.mismatches = list(mismatches)
+        details = ', '.join(f'{cmd.name} expected {expected} got {actual}' for cmd, expected, actual in self.mismatches)
+        super().__init__(f'{len(self.mismatches)} register(s) failed verification: {details}')
+
+
+__all__ = [
+    'JDS6600Error',
+    'TransportError',
+    'ProtocolError',
+    'CommandMismatchError',
+    'ResponseFormatError',
+    'ResponseTimeoutError',
+    'ResponseLostError',
+    'VerificationError',
+]
@@ -0,0 +1,197 @@
+import concurrent.futures
+import threading
+
+from .types import *
+from .iface import JDS6600, _check_arg_type
+from .discovery import DiscoveryCache, find_devices
+from .metrics import CommandMetrics, prometheus_text
+
+
+class FleetResult:
+    # Outcome of running an operation on every device of a Fleet.  results
+    # and errors are indexed by device serial number, every device shows up
+    # in exactly one of them.
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+
+    def __repr__(self):
+        return f'FleetResult(results={self.results!r}, errors={self.errors!r})'
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def raise_errors(self):
+        # Raises the first error (by serial number) if any device failed
+        if self.errors:
+            serial = sorted(self.errors)[0]
+            raise Exception(f'{len(self.errors)} device(s) failed, {serial}: {self.errors[serial]}') from self.errors[serial]
+        return self
+
+
+class Fleet:
+    # Controls many function generators in parallel.  Each device is only
+    # ever used by one worker thread at a time, so the operations on different
+    # devices overlap while the operations on one device stay in order.
+    #
+    #   fleet = Fleet.discover()
+    #   fleet.set_config(frequency=1000, output=Output.ON).raise_errors()
+    #   configs = fleet.get_config().results
+    def __init__(self, devices=None, max_workers=None):
+        # devices maps serial numbers to open JDS6600 instances
+        self.devices = dict(devices or {})
+        self.max_workers = max_workers or max(1, len(self.devices))
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+        # CommandMetrics for every device, see instrument()
+        self.metrics = {}
+
+        # Ports that discover() couldn't use, indexed by port
+        self.errors = {}
+
+    @classmethod
+    def discover(cls, ports=None, max_workers=None, cache=True, **kwargs):
+        # Opens every matching USB serial port (or the ports given) in
+        # parallel and identifies each unit by its serial number.  kwargs are
+        # passed to JDS6600().  The serial numbers are recorded in the
+        # discovery cache (see find_device()), cache works the same way as
+        # for find_devices().
+        #
+        # Ports that can't be used are skipped, the error for each is kept in
+        # the errors of the Fleet.  A port whose unit reports the same serial
+        # number as one on an earlier port is closed and counts as an error.
+        if cache is True:
+            cache = DiscoveryCache()
+        if ports is None:
+            ports = find_devices(cache)
+
+        def connect(port):
+            dev = JDS6600(port=port, **kwargs)
+            try:
+                return dev.get_serial_number(), dev
+            except Exception:
+                dev.close()
+                raise
+
+        devices = {}
+        ports_used = {}
+        errors = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(ports))) as pool:
+            futures = [(port, pool.submit(connect, port)) for port in ports]
+            for port, future in futures:
+                try:
+                    serial_number, dev = future.result()
+                except Exception as e:
+                    errors[port] = e
+                    continue
+
+                if cache:
+                    cache.set_serial_number(port, serial_number)
+                if serial_number in devices:
+                    dev.close()
+                    errors[port] = Exception(f'Duplicate serial number {serial_number}, already on {ports_used[serial_number]}')
+                    continue
+                devices[serial_number] = dev
+                ports_used[serial_number] = port
+
+        fleet = cls(devices, max_workers)
+        fleet.errors = errors
+        return fleet
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __getitem__(self, serial_number):
+        return self.devices[serial_number]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._pool.shutdown()
+        for dev in self.devices.values():
+            dev.close()
+
+    def instrument(self):
+        # Attaches a CommandMetrics (labelled with the serial number) to every
+        # device that doesn't have one yet
+        for serial_number, dev in self.devices.items():
+            if serial_number not in self.metrics:
+                self.metrics[serial_number] = dev.add_hook(CommandMetrics(labels={'serial': serial_number}))
+        return self.metrics
+
+    def prometheus(self, prefix='jds6600'):
+        # The metrics of all of the devices in the Prometheus text format
+        return prometheus_text(self.metrics.values(), prefix)
+
+    def map(self, func, *args, **kwargs):
+        # Runs func(dev, *args, **kwargs) for every device in parallel
+        futures = dict((serial_number, self._pool.submit(func, dev, *args, **kwargs)) for serial_number, dev in self.devices.items())
+
+        out = FleetResult()
+        for serial_number, future in futures.items():
+            try:
+                out.results[serial_number] = future.result()
+            except Exception as e:
+                out.errors[serial_number] = e
+        return out
+
+    def call(self, method, *args, **kwargs):
+        # Calls a JDS6600 method on every device
+        return self.map(lambda dev: getattr(dev, method)(*args, **kwargs))
+
+    def get_config(self, which=Channel.BOTH):
+        return self.call('get_config', which)
+
+    def set_config(self, **kwargs):
+        return self.call('set_config', **kwargs)
+
+    def get_state(self):
+        return self.call('get_state')
+
+    def profile_load(self, profile=0):
+        return self.call('profile_load', profile)
+
+    def set_output(self, value, which=Channel.BOTH, aligned=False):
+        # With aligned set every worker waits until all of the devices are
+        # ready to send the command so the outputs change as close together
+        # as possible (devices that fail before the barrier break it for the
+        # others).
+        if not aligned:
+            return self.call('set_output', value, which)
+
+        # Every device needs its own worker to wait at the barrier
+        if self.max_workers < len(self.devices):
+            raise Exception('Aligned output changes need one worker per device')
+
+        _check_arg_type(value, Output)
+        barrier = threading.Barrier(len(self.devices))
+
+        def set_output(dev):
+            try:
+                # Work out the new channel states before lining up with the
+                # other devices so only the write is left after the barrier
+                if which == Channel.BOTH:
+                    states = (value, value)
+                else:
+                    states = list(dev.get_output())
+                    states[which] = value
+                dev._flush_input()
+            except BaseException:
+                barrier.abort()
+                raise
+
+            barrier.wait()
+            dev._set(Command.CHANNEL_ENABLE, *states)
+
+        return self.map(set_output)
+
+
+__all__ = [
+    'Fleet',
+    'FleetResult',
+]
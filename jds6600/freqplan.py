@@ -0,0 +1,122 @@
+import collections
+import fractions
+import functools
+
+from .types import *
+from .arb import _numpy
+
+
+# The JDS6600 frequency units (see JDS6600._tgt_freq_conv) are all whole
+# multiples of 1e-8 Hz, the resolution of the Frequency.uHz unit.  Planning is
+# done in these "ticks" so that checking whether a frequency can be set
+# exactly in a unit is integer arithmetic instead of a float is_integer()
+# check (which misclassifies values like 1.1 Hz).
+_TICKS_PER_HZ = 100000000
+
+# (unit, ticks per device value, max frequency in Hz), from the most to the
+# least coarse unit.  Frequency.KHz and Frequency.MHz have the same resolution
+# as Frequency.Hz so they are never needed.
+_UNITS = (
+    (Frequency.Hz,  1000000, None),
+    (Frequency.mHz, 1000,    80000),
+    (Frequency.uHz, 1,       80),
+)
+
+
+def _to_ticks(freq):
+    # Exact conversion of a frequency to ticks, floats are converted using
+    # their shortest repr so 0.1 means 1/10 and not the closest binary value.
+    if isinstance(freq, float):
+        freq = fractions.Fraction(repr(freq))
+    else:
+        freq = fractions.Fraction(freq)
+    return round(freq * _TICKS_PER_HZ)
+
+
+@functools.lru_cache(maxsize=4096)
+def plan_frequency(freq):
+    # Returns the (value, Frequency) pair to send to the device for a
+    # frequency in Hz.  The most coarse unit that represents the frequency
+    # exactly is used, if the frequency has more resolution than the units
+    # allowed for its range the closest value of the finest allowed unit is
+    # used.
+    ticks = _to_ticks(freq)
+    freq = fractions.Fraction(ticks, _TICKS_PER_HZ)
+
+    best = _UNITS[0]
+    for unit in _UNITS:
+        _, unit_ticks, max_freq = unit
+        if max_freq is not None and freq > max_freq:
+            break
+        best = unit
+        if ticks % unit_ticks == 0:
+            break
+
+    unit, unit_ticks, _ = best
+    return (round(fractions.Fraction(ticks, unit_ticks)), unit)
+
+
+class FrequencyPlanner:
+    # Vectorized version of plan_frequency() for whole tables of frequencies
+    # (sweep tables, test vector lists, ...):
+    #
+    #   planner = FrequencyPlanner()
+    #   values, units = planner.plan(np.linspace(1, 1000, 100000))
+    #
+    # The result of the most recent plans is cached (by the contents of the
+    # input array) so re-planning the same table is free.  The returned arrays
+    # are read-only because they are shared with the cache.
+    #
+    # Frequencies up to 80 kHz (where the mHz and uHz units can be used) are
+    # planned exactly for values with up to 8 decimal places, above that only
+    # the Hz unit is available and the value is rounded to 0.01 Hz.
+    def __init__(self, max_cached=16):
+        self.max_cached = max_cached
+        self._cache = collections.OrderedDict()
+
+    def plan(self, freqs):
+        # Returns (values, units) arrays, int64 device values and uint8
+        # Frequency units
+        import hashlib
+        np = _numpy()
+
+        freqs = np.ascontiguousarray(freqs, dtype=np.float64)
+        key = (freqs.shape, hashlib.sha1(freqs.tobytes()).digest())
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        ticks = np.rint(freqs * _TICKS_PER_HZ).astype(np.int64)
+
+        # Start with the coarsest unit and move to the finer units where the
+        # frequency isn't exact yet and is within the range of the finer unit.
+        unit, unit_ticks, _ = _UNITS[0]
+        units = np.full(freqs.shape, unit, dtype=np.uint8)
+        values = np.rint(ticks / unit_ticks).astype(np.int64)
+        inexact = ticks % unit_ticks != 0
+        for unit, unit_ticks, max_freq in _UNITS[1:]:
+            use = inexact & (freqs <= max_freq)
+            units[use] = unit
+            values[use] = np.rint(ticks[use] / unit_ticks).astype(np.int64)
+            inexact &= use & (ticks % unit_ticks != 0)
+
+        values.flags.writeable = False
+        units.flags.writeable = False
+        result = (values, units)
+
+        self._cache[key] = result
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return result
+
+    def pairs(self, freqs):
+        # Same as plan() but as a list of (value, Frequency) tuples, the
+        # format used by JDS6600._freq_convert_to_tgt()
+        values, units = self.plan(freqs)
+        return [(v, Frequency(u)) for v, u in zip(values.tolist(), units.tolist())]
+
+
+__all__ = [
+    'FrequencyPlanner',
+    'plan_frequency',
+]
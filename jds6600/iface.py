@@ -1,7 +1,30 @@
-import serial
-import serial.tools.list_ports
+import contextlib
+import time
 
 from .types import *
+from .cache import RegisterCache
+from .pipeline import Pipeline
+from .state import DeviceState, STATE_REGISTERS
+from .freqplan import plan_frequency
+from .calibration import load_calibration
+from .measure import MEASURE_REGISTERS
+from .sweep import SweepConfig, SWEEP_REGISTERS
+from .codec import CommandEncoder, encode_command, parse_read, parse_write, resync, answers, _MAX_STALE_LINES
+from .errors import ProtocolError, ResponseTimeoutError, ResponseFormatError
+from .metrics import CommandEvent, VerboseHook
+from .verify import WriteVerifier
+from .transport import open_transport
+from .discovery import find_device
+from .capture import CaptureWriter, CaptureTransport
+from .arb import ARB_POINTS, arb_slot, prepare_arbitrary, arbitrary_hash, encode_arbitrary, parse_arbitrary
+
+
+# Longest wait before retrying a command
+_MAX_RETRY_BACKOFF = 0.2
+
+# Sent to line the input up with the commands after a timeout, see
+# _flush_input().  The model register never changes.
+_SYNC_CMD = encode_command('r', Command.MODEL, ())
 
 
 def _check_arg_type(value, typ):
@@ -15,17 +38,6 @@ def _check_arg_type(value, typ):
             raise ValueError(f'Invalid param value: {value}, should be one of {typ}')
 
 
-def find_device():
-    """
-    Identifies if there are any USB devices that match the VID:PID expected for
-    the JDS6600 function generator.
-    """
-    found = [p for p in serial.tools.list_ports.grep('1a86:7523')]
-    if found:
-        return found[0].device
-    return None
-
-
 class JDS6600:
     # Indicates the multipler/divider to use with frequency values being read 
     #     from/sent to the frequency generator.  This table also holds the 
@@ -65,9 +77,50 @@ class JDS6600:
         Frequency.uHz: (100.0 * 1000000.0, 80.0),
     }
 
-    def __init__(self, port=None, baudrate=115200, verbose=False, fix_read_bug=True, timeout=0.5, write_timeout=0.5, bytesize=serial.EIGHTBITS, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE):
-        self.verbose = verbose
-        self._serial = None
+    def __init__(self, port=None, baudrate=115200, verbose=False, fix_read_bug=True, timeout=0.5, write_timeout=0.5, bytesize=8, parity='N', stopbits=1, cache=False, cache_ttl=None, hooks=None, retries=2, retry_backoff=0.01, transport=None, read_size=4096, capture=None):
+        self._transport = None
+        self._capture = None
+
+        # InstrumentationHook objects that are told about every command (see 
+        # metrics.py), verbose adds a VerboseHook that prints them.
+        self.hooks = list(hooks or [])
+        if verbose:
+            self.hooks.append(VerboseHook())
+        self._pipeline = None
+        self._verifier = None
+
+        # Reads that fail with a ProtocolError (garbled, lost or mismatched 
+        # responses) are sent again up to retries times, the first retry 
+        # waits retry_backoff seconds and every following one twice as long.
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+        # Reused buffer for building commands, and whether there may be 
+        # unread input (see _flush_input()) that belongs to an earlier command
+        self._encoder = CommandEncoder()
+        self._stream_clean = False
+
+        # Number of commands that timed out whose response may still arrive 
+        # (see _flush_input())
+        self._late_responses = 0
+
+        # Content hashes of the arbitrary waveforms uploaded by this instance,
+        # indexed by slot number.
+        self._arb_hashes = {}
+        self.waveform_library = None
+        self._library_serial = None
+
+        # Optional FrequencyCalibration, applied by set_frequency() and
+        # get_frequency() (see use_calibration())
+        self.calibration = None
+
+        # UI mode to go back to when the sweep screen opened by sweep_show()
+        # is left again
+        self._sweep_ui_mode = None
+
+        # Optional write-through shadow copy of the device registers, see
+        # RegisterCache for how cache_ttl is used.
+        self.cache = RegisterCache(cache_ttl) if cache else None
 
         # On some models the read "register" for the system settings are the 
         # write register + 1.  Setting this flag enables that workaround.
@@ -79,9 +132,12 @@ class JDS6600:
             if port is None:
                 raise Exception('JDS6600 USB device not found')
 
+        # See transport.py for the transports, by default the port decides
+        self._transport_type = transport
         self._args = {
             'port': port,
-            'baudrate': 115200,
+            'baudrate': baudrate,
+            'read_size': read_size,
 
             # Standard serial options that probably won't need to be changed
             'timeout': timeout,
@@ -93,102 +149,296 @@ class JDS6600:
 
         self.open()
 
+        # Optional binary log of all of the traffic, see capture.py
+        if capture is not None:
+            self.start_capture(capture)
+
     def __del__(self):
         self.close()
 
     def open(self):
-        self._serial = serial.Serial(**self._args)
+        # Anything could have been changed while the port was closed
+        if self.cache is not None:
+            self.cache.invalidate()
+        self._transport = open_transport(transport=self._transport_type, **self._args)
+        if self._capture is not None:
+            self._transport = CaptureTransport(self._transport, self._capture)
+        self._stream_clean = False
 
     def close(self):
-        if self._serial:
-            if self._serial.is_open:
-                self._serial.close()
-            self._serial = None
+        if self._transport:
+            if self._transport.is_open:
+                self._transport.close()
+            self._transport = None
+
+        # The capture ends with the session, reopening doesn't resume it.
+        # Called directly, subclasses may route stop_capture() through a port
+        # that is already gone (see ThreadedJDS6600).
+        JDS6600.stop_capture(self)
+
+    def start_capture(self, path):
+        # Records every byte sent to and received from the device (with 
+        # timestamps) in a capture log until stop_capture(), see 
+        # replay_capture() for playing it back.  Returns the CaptureWriter.
+        self.stop_capture()
+        self._capture = CaptureWriter(path)
+        if self._transport is not None:
+            self._transport = CaptureTransport(self._transport, self._capture)
+        return self._capture
+
+    def stop_capture(self):
+        if self._capture is None:
+            return
+        if isinstance(self._transport, CaptureTransport):
+            self._transport = self._transport.transport
+        self._capture.close()
+        self._capture = None
+
+    @property
+    def verbose(self):
+        return any(isinstance(h, VerboseHook) for h in self.hooks)
+
+    @verbose.setter
+    def verbose(self, value):
+        if value and not self.verbose:
+            self.hooks.append(VerboseHook())
+        elif not value:
+            self.hooks[:] = [h for h in self.hooks if not isinstance(h, VerboseHook)]
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
 
     def _flush_input(self):
-        if self._serial.in_waiting:
-            out = self._serial.read(self._serial.in_waiting)
-            if self.verbose:
-                flushed = out.strip().decode()
-                print(f'[flush]:\n{flushed}')
-
-    def _command(self, cmd_str):
-        if self.verbose:
-            print(f'[cmd] {cmd_str}')
-        self._serial.write(f'{cmd_str}\r\n'.encode())
-
-        # Just use the default UTF-8 decode, this protocol is all ASCII text and 
-        # shouldn't require latin-1 decoding.
-        ret_str = self._serial.readline().strip().decode()
-        if self.verbose:
-            print(f'[ret] {ret_str}')
-
-        return ret_str
+        # The response to a command that timed out may still be on its way, 
+        # and if it is for the same register as the next command nothing 
+        # would tell it apart from the real response.  Instead of waiting for 
+        # it the model register is read: the device answers in order, so 
+        # everything up to that response is stale.  A lost response only 
+        # costs this one round trip.  Mixing up the sync response with a late 
+        # read of the model register is harmless, they hold the same value.
+        transport = self._transport
+        if self._late_responses:
+            late, self._late_responses = self._late_responses, 0
+            transport.write(_SYNC_CMD)
+            for _ in range(late + _MAX_STALE_LINES):
+                line = transport.readline()
+                if line:
+                    for hook in self.hooks:
+                        hook.on_flush(line)
+                if line[-1:] != b'\n':
+                    # No answer yet, the next command syncs again
+                    self._late_responses = 1
+                    break
+                if answers(_SYNC_CMD, resync(line.rstrip(b'\r\n'))):
+                    break
+
+        if transport.in_waiting:
+            out = transport.read(transport.in_waiting)
+            for hook in self.hooks:
+                hook.on_flush(out)
+        self._stream_clean = not self._late_responses
+
+    def _write_line(self, cmd_bytes):
+        # cmd_bytes is a complete command including the line ending, see 
+        # codec.py
+        self._transport.write(cmd_bytes)
+
+    def _read_line(self):
+        # Returns the raw response line without the line ending, and whether 
+        # the line was complete.  If it isn't (timeout) the rest of it may 
+        # still arrive, so the input is drained before the next command.
+        line = self._transport.readline()
+        complete = line[-1:] == b'\n'
+        if not complete:
+            self._stream_clean = False
+            self._late_responses += 1
+        return line.rstrip(b'\r\n'), complete
+
+    def _read_response(self, cmd, cmd_bytes, parse):
+        # Reads and parses the response to cmd_bytes.  Lines that don't answer 
+        # it are junk (line noise, front panel echo) or responses left over 
+        # from commands that timed out or failed earlier, these are thrown 
+        # away (a few at most) and the next line is read instead.
+        for _ in range(_MAX_STALE_LINES):
+            line, complete = self._read_line()
+            line = resync(line)
+            try:
+                return parse(cmd, cmd_bytes, line), line, complete
+            except ProtocolError as e:
+                error = e
+            if not complete:
+                raise ResponseTimeoutError(f'Timeout: {error}') from error
+            if answers(cmd_bytes, line):
+                raise error
+
+            for hook in self.hooks:
+                hook.on_flush(line)
+        raise error
+
+    def _exchange(self, op, cmd, cmd_bytes, parse, retries=0):
+        # Sends one command, waits for the response and returns the result of 
+        # parse(cmd, cmd_bytes, line).  Commands that fail with a 
+        # ProtocolError are sent again up to retries times (only use this for 
+        # commands that can safely be repeated), waiting a little longer 
+        # before each retry.  The hooks are only timed and called when there 
+        # are any.
+        hooks = self.hooks
+        attempt = 0
+        while True:
+            start = time.perf_counter() if hooks else 0.0
+            line = b''
+            complete = False
+            error = None
+            try:
+                self._write_line(cmd_bytes)
+                value, line, complete = self._read_response(cmd, cmd_bytes, parse)
+                return value
+            except Exception as e:
+                # Any response that doesn't match the command means the input 
+                # may be out of step with the commands, so flush it before the 
+                # next one.
+                self._stream_clean = False
+                error = e
+                if not isinstance(e, ProtocolError) or attempt >= retries:
+                    raise
+            finally:
+                if hooks:
+                    # cmd_bytes may be the encoder's buffer, which the next 
+                    # command overwrites
+                    event = CommandEvent(op, cmd, bytes(cmd_bytes), line, time.perf_counter() - start, error, not complete)
+                    for hook in hooks:
+                        hook.on_command(event)
+
+            # Retrying, whatever arrives while waiting is discarded
+            attempt += 1
+            for hook in hooks:
+                hook.on_retry(event, attempt)
+            time.sleep(min(self.retry_backoff * 2 ** (attempt - 1), _MAX_RETRY_BACKOFF))
+            self._flush_input()
 
     def _get(self, cmd, *args):
-        # If no arguments are supplied set it to [0].  The command format 
-        # requires at least one value after '='
-        if len(args) == 0:
-            args = [0]
-
-        # If there is pending input read it now so the output is for the correct 
-        # command
-        self._flush_input()
+        # When pipelining the pipeline takes care of the caching
+        if self._pipeline is not None:
+            return self._pipeline.get(cmd, *args).result()
+
+        # Only plain register reads (no arguments) are cached
+        cached = self.cache is not None and len(args) == 0
+        if cached:
+            found, value = self.cache.lookup(cmd)
+            if found:
+                return value
+
+        # If there may be pending input read it now so the output is for the 
+        # correct command
+        if not self._stream_clean:
+            self._flush_input()
 
         # Example of retrieving the model:
         #   [cmd] :r00=0.\r\n
         #   [ret] :r00=30.\r\n
-        args_str = ','.join(f'{a}' for a in args)
-        cmd_str = f':r{cmd:02}={args_str}.'
-
-        ret_str = self._command(cmd_str)
-
-        # Verify the start and end of the response looks correct
-        if ret_str[:2] != ':r' or ret_str[-1] != '.':
-            errmsg = f'Bad Response: [cmd] {cmd_str} [ret] {ret_str}'
-            raise Exception(errmsg)
-
-        out_cmd, rest = ret_str[2:-1].split('=')
+        #
+        # If no arguments are supplied the encoder sends [0], the command 
+        # format requires at least one value after '='
+        cmd_bytes = self._encoder.read(cmd, args)
+        value = self._exchange('r', cmd, cmd_bytes, parse_read, self.retries)
 
-        # Verify this output is for the correct command
-        if int(out_cmd) != cmd:
-            errmsg = f'Command mismatch: [cmd] {cmd_str} [ret] {ret_str}'
-            raise Exception(errmsg)
-
-        out_val = rest.split(',')
-        if len(out_val) == 0:
-            return None
-
-        # Try to provide a little more details if the int() conversions fail
-        try:
-            if len(out_val) == 1:
-                return int(out_val[0])
-            else:
-                return tuple(int(v) for v in out_val)
-        except ValueError:
-            errmsg = f'Unexpected Response Format: [cmd] {cmd_str} [ret] {ret_str}'
-            raise Exception(errmsg)
+        if cached:
+            self.cache.store(cmd, value)
+        return value
 
     def _set(self, cmd, *args):
         # Extra arguments are required in the set function
         assert len(args) > 0
 
-        # If there is pending input read it now so the output is for the correct 
-        # command
-        self._flush_input()
+        if self._verifier is not None:
+            self._verifier.record(cmd, args)
 
-        # Example of retrieving the model:
+        # Writes are queued when pipelining, any error is raised when the 
+        # pipeline is flushed.
+        if self._pipeline is not None:
+            self._pipeline.set(cmd, *args)
+            return
+
+        # Don't bother sending values the device already has
+        if self.cache is not None and self.cache.unchanged(cmd, args):
+            return
+
+        # If there may be pending input read it now so the output is for the 
+        # correct command
+        if not self._stream_clean:
+            self._flush_input()
+
+        # Example of setting the CH1 waveform:
         #   [cmd]  :w21=4.\r\n
         #   [ret] :ok\r\n
-        args_str = ','.join(f'{a}' for a in args)
-        cmd_str = f':w{cmd:02}={args_str}.'
+        cmd_bytes = self._encoder.write(cmd, args)
+        self._exchange('w', cmd, cmd_bytes, parse_write)
+
+        if self.cache is not None:
+            self.cache.update(cmd, args)
+
+    @contextlib.contextmanager
+    def pipeline(self, window=8):
+        # While this context is active commands are written back to back with
+        # up to "window" commands waiting for a response.  Getters still
+        # return their value (waiting only for their own response), setters
+        # return immediately and any write errors are raised when the context
+        # exits.  The Pipeline object can also be used directly to queue
+        # reads and collect the results later.
+        if self._pipeline is not None:
+            # Already pipelining, just share the outer pipeline
+            yield self._pipeline
+            return
+
+        self._pipeline = Pipeline(self, window)
+        try:
+            yield self._pipeline
+        except BaseException:
+            # Keep the response stream in sync but don't hide the original 
+            # exception
+            self._pipeline.drain()
+            raise
+        else:
+            self._pipeline.flush()
+        finally:
+            self._pipeline = None
+
+    @contextlib.contextmanager
+    def verify(self, raise_errors=True):
+        # Records the registers written inside the block and reads them all 
+        # back in one batch when it ends (pipelined together with the writes 
+        # if a pipeline is active), so every setter doesn't need its own 
+        # read-back.  A VerificationError lists the registers that don't hold 
+        # the (converted) values that were written, unless raise_errors is 
+        # cleared; the WriteVerifier has the mismatches either way.
+        #
+        #   with dev.verify():
+        #       dev.set_config(frequency=1000, amplitude=2.5)
+        if self._verifier is not None:
+            # Already verifying, the outer block checks everything
+            yield self._verifier
+            return
+
+        verifier = self._verifier = WriteVerifier()
+        try:
+            yield verifier
+        finally:
+            self._verifier = None
 
-        ret_str = self._command(cmd_str)
+        verifier.check(self)
+        if raise_errors:
+            verifier.raise_errors()
 
-        # Verify the value was changed successfully
-        if ret_str != ':ok':
-            errmsg = f'Bad Response: [cmd] {cmd_str} [ret] {ret_str}'
-            raise Exception(errmsg)
+    def _read_cmd(self, cmd):
+        # With fix_read_bug set the system settings are read from the write 
+        # register + 1
+        if self.fix_read_bug and Command.SYSTEM_SOUND <= cmd <= Command.SYSTEM_ARB_MAX_NUM:
+            return cmd + 1
+        return cmd
 
     def get_model(self):
         # I think the "model" returns the maximum frequency.  So a model of "30" 
@@ -242,8 +492,7 @@ class JDS6600:
             ch2_config = dict((k, v[1]) for k, v in zip(keys, out))
             return (ch1_config, ch2_config)
         elif which != Channel.NONE:
-            config = dict((k, v) for k, v in zip(keys, out))
-            return (ch1_config, ch2_config)
+            return dict((k, v) for k, v in zip(keys, out))
         else:
             return None
 
@@ -274,6 +523,24 @@ class JDS6600:
         if output is not None and output == Output.ON:
             self.set_output(output, which)
 
+    def get_state(self):
+        # Reads every setting register (see DeviceState) in one pipelined 
+        # batch.
+        with self.pipeline() as p:
+            pending = [(cmd, p.get(self._read_cmd(cmd))) for cmd in STATE_REGISTERS]
+        return DeviceState(**dict((cmd.name.lower(), req.result()) for cmd, req in pending))
+
+    def restore_state(self, state):
+        # Only writes the registers that are different from the current 
+        # device settings, outputs are turned off first and on last like 
+        # set_config() does.  Returns the number of writes that were needed.
+        writes = state.diff(self.get_state())
+        with self.pipeline():
+            for cmd, value in writes:
+                args = value if isinstance(value, tuple) else (value,)
+                self._set(cmd, *args)
+        return len(writes)
+
     def profile_save(self, profile=0):
         assert profile >= 0 and profile <= 99
         self._set(Command.PROFILE_SAVE, profile)
@@ -327,60 +594,22 @@ class JDS6600:
     def _freq_convert_to_tgt(self, freq):
         # Input values are always in Hz, normally this is simple we just multiply by 
         # the Frequency.Hz multiplier (100), but if that value is not an integer 
-        # then we will try the next more accurate unit.
-        mult, max_freq = self._tgt_freq_conv[Frequency.Hz]
-        hz_value = freq * mult
-
-        if self.verbose:
-            print(f'Checking Hz (mult: {mult}, max: {max_freq}) conversion for {freq}')
-            print(f'\t{freq} * {mult} = {hz_value}')
-
-        # If the value is a whole number, or the target frequency is > the max freq 
-        # allowed in this mode, we found the most accurate frequency units to use.
-        if hz_value.is_integer() or freq > max_freq:
-            return (int(hz_value), Frequency.Hz)
-
-        # Not enough accuracy, try mHz
-        mult, max_freq = self._tgt_freq_conv[Frequency.mHz]
-        mhz_value = freq * mult
-
-        if self.verbose:
-            print(f'Checking mHz (mult: {mult}, max: {max_freq}) conversion for {freq}')
-            print(f'\t{freq} * {mult} = {mhz_value}')
-
-        # If this value is greater than the max frequency allowed in this mode use 
-        # the previous value
-        if freq > max_freq:
-            return (int(hz_value), Frequency.Hz)
-
-        # If the value is a whole number we found the most accurate frequency units 
-        # to use.
-        if mhz_value.is_integer():
-            return (int(mhz_value), Frequency.mHz)
-
-        # Not enough accuracy, try uHz
-        mult, max_freq = self._tgt_freq_conv[Frequency.uHz]
-        uhz_value = freq * mult
-
-        if self.verbose:
-            print(f'Checking uHz (mult: {mult}, max: {max_freq}) conversion for {freq}')
-            print(f'\t{freq} * {mult} = {uhz_value}')
-
-        # If this value is greater than the max frequency allowed in this mode use 
-        # the previous value
-        if freq > max_freq:
-            return (int(mhz_value), Frequency.mHz)
-
-        # If we reached this point this is the most accurate value to use regardless 
-        # of if this is a whole number or not.
-        return (int(uhz_value), Frequency.uHz)
+        # then the next more accurate unit is used (if the frequency is within 
+        # the maximum frequency of that unit).  See plan_frequency() for the 
+        # details, the results are cached so repeated values are cheap.
+        return plan_frequency(freq)
 
     def get_frequency(self, which=Channel.BOTH):
         cmds = (Command.FREQUENCY_CH1, Command.FREQUENCY_CH2)
-        return self._get_per_channel(cmds, which, self._freq_convert_from_tgt)
+        convert = self._freq_convert_from_tgt
+        if self.calibration is not None:
+            convert = lambda args: self.calibration.uncorrect(self._freq_convert_from_tgt(args))
+        return self._get_per_channel(cmds, which, convert)
 
     def set_frequency(self, value, which=Channel.BOTH):
         cmds = (Command.FREQUENCY_CH1, Command.FREQUENCY_CH2)
+        if self.calibration is not None:
+            value = self.calibration.correct(value)
         args = self._freq_convert_to_tgt(value)
         self._set_per_channel(cmds, which, *args)
 
@@ -390,9 +619,13 @@ class JDS6600:
         cmds = (Command.AMPLITUDE_CH1, Command.AMPLITUDE_CH2)
         return self._get_per_channel(cmds, which, amplitude_convert)
 
-    def set_amplitude(self, value, which=Channel.BOTH):
+    @staticmethod
+    def _amplitude_to_tgt(value):
         # Convert from V to mV (use by the target)
-        converted_value = value * 1000
+        return round(value * 1000)
+
+    def set_amplitude(self, value, which=Channel.BOTH):
+        converted_value = self._amplitude_to_tgt(value)
         cmds = (Command.AMPLITUDE_CH1, Command.AMPLITUDE_CH2)
         self._set_per_channel(cmds, which, converted_value)
 
@@ -405,9 +638,13 @@ class JDS6600:
         cmds = (Command.OFFSET_CH1, Command.OFFSET_CH2)
         return self._get_per_channel(cmds, which, offset_convert)
 
-    def set_offset(self, value, which=Channel.BOTH):
+    @staticmethod
+    def _offset_to_tgt(value):
         # Reverse the value conversion used in get_offset()
-        converted_value = (value * 100) + 1000
+        return round(value * 100) + 1000
+
+    def set_offset(self, value, which=Channel.BOTH):
+        converted_value = self._offset_to_tgt(value)
         cmds = (Command.OFFSET_CH1, Command.OFFSET_CH2)
         self._set_per_channel(cmds, which, converted_value)
 
@@ -418,10 +655,14 @@ class JDS6600:
         cmds = (Command.DUTYCYCLE_CH1, Command.DUTYCYCLE_CH2)
         return self._get_per_channel(cmds, which, offset_convert)
 
-    def set_dutycycle(self, value, which=Channel.BOTH):
+    @staticmethod
+    def _dutycycle_to_tgt(value):
         # Dutycycle values from the function generator are in units of 0.1%.
         # Multiply by 10 to convert these to the command value.
-        converted_value = value * 10
+        return round(value * 10)
+
+    def set_dutycycle(self, value, which=Channel.BOTH):
+        converted_value = self._dutycycle_to_tgt(value)
         cmds = (Command.DUTYCYCLE_CH1, Command.DUTYCYCLE_CH2)
         self._set_per_channel(cmds, which, converted_value)
 
@@ -435,7 +676,7 @@ class JDS6600:
     def set_phase(self, value):
         # Like get_phase() expect the input value to be in degrees and multiply 
         # by 10 to get the target value.
-        converted_value = value * 10
+        converted_value = round(value * 10)
         self._set(Command.PHASE, converted_value)
 
     """
@@ -461,6 +702,153 @@ class JDS6600:
         _check_arg_type(value, UIMode)
         self._set(Command.UI_MODE, value)
 
+    def get_measurement(self, register=Command.MEASURE_FREQ_1000HZ):
+        # Raw value of one of the measurement registers, see MEASURE_SCALE for 
+        # the units.  Use a MeasurementStream to log measurements continuously.
+        assert register in MEASURE_REGISTERS
+        return self._get(register)
+
+    def get_sweep(self):
+        # Reads the hardware sweep configuration as a SweepConfig
+        with self.pipeline() as p:
+            pending = [p.get(cmd) for cmd in SWEEP_REGISTERS]
+        return SweepConfig.from_registers([req.result() for req in pending], self._freq_convert_from_tgt)
+
+    def set_sweep(self, config):
+        # Programs all of the sweep registers in one pipelined batch, with the 
+        # register cache enabled unchanged settings are not written again.
+        with self.pipeline():
+            for cmd, args in config.to_registers():
+                self._set(cmd, *args)
+
+    def sweep_show(self, which=Channel.CH1, config=None):
+        # Puts the UI on the sweep screen of one channel, optionally 
+        # programming the sweep first.  This does not start the sweep, that 
+        # is done from the front panel: the ACTION register that would start 
+        # it doesn't work reliably yet (see set_action() above).  Once 
+        # started the sweep runs on the device without any host traffic.
+        assert which in (Channel.CH1, Channel.CH2)
+        ui_modes = (UIMode.SWEEP_CH1, UIMode.SWEEP_CH2)
+        if self._sweep_ui_mode is None:
+            self._sweep_ui_mode = self.get_ui_mode()
+        with self.pipeline():
+            if config is not None:
+                self.set_sweep(config)
+            self._set(Command.UI_MODE, ui_modes[which])
+
+    def sweep_hide(self):
+        # Leaves the sweep screen, back to the UI mode from before 
+        # sweep_show()
+        if self._sweep_ui_mode is not None:
+            self.set_ui_mode(self._sweep_ui_mode)
+            self._sweep_ui_mode = None
+
+    def upload_arbitrary(self, slot, samples, force=False):
+        # Loads a waveform into one of the arbitrary waveform slots, slot can 
+        # be a slot number (1-60) or a Waveform.ARBITRARY_* value.  samples is 
+        # a numpy array of floats between -1.0 and 1.0 that is resampled to the 
+        # 2048 points the device uses (see prepare_arbitrary()).
+        #
+        # Uploading the same waveform to the same slot again is skipped unless 
+        # force is set.  Returns True if the waveform was sent to the device.
+        slot = arb_slot(slot)
+        data = prepare_arbitrary(samples)
+        digest = arbitrary_hash(data)
+        if not force and self._arb_hashes.get(slot) == digest:
+            return False
+
+        # Any queued commands need their responses before the input is 
+        # flushed
+        if self._pipeline is not None:
+            self._pipeline.drain()
+        self._flush_input()
+
+        # If the upload fails the slot contents are unknown
+        self._arb_hashes.pop(slot, None)
+
+        # Keep the 10 kB command out of the error messages
+        cmd_bytes = encode_arbitrary(slot, data)
+        def parse(cmd, cmd_bytes, line):
+            parse_write(cmd, b':a%02d=...' % cmd, line)
+
+        with self._extended_timeouts(len(cmd_bytes)):
+            self._exchange('a', slot, cmd_bytes, parse)
+
+        self._arb_hashes[slot] = digest
+        if self.waveform_library is not None:
+            self.waveform_library.record(self._library_serial, slot, data)
+        return True
+
+    def download_arbitrary(self, slot):
+        # Reads the 2048 DAC values stored in an arbitrary waveform slot, 
+        # returned as a numpy uint16 array.
+        slot = arb_slot(slot)
+
+        if self._pipeline is not None:
+            self._pipeline.drain()
+        self._flush_input()
+
+        # Example of reading slot 1:
+        #   [cmd] :b01=0.\r\n
+        #   [ret] :b01=2048,2054,...,2041.\r\n
+        with self._extended_timeouts(ARB_POINTS * 5):
+            data = self._exchange('b', slot, b':b%02d=0.\r\n' % slot, self._parse_download)
+
+        self._arb_hashes[slot] = arbitrary_hash(data)
+        return data
+
+    @staticmethod
+    def _parse_download(slot, cmd_bytes, line):
+        cmd_str = bytes(cmd_bytes).strip().decode()
+        ret_str = line.decode(errors='replace')
+
+        prefix = f':b{slot:02}='
+        if not ret_str.startswith(prefix) or ret_str[-1:] != '.':
+            errmsg = f'Bad Response: [cmd] {cmd_str} [ret] {ret_str[:32]}...'
+            raise ProtocolError(errmsg)
+
+        data = parse_arbitrary(ret_str[len(prefix):-1])
+        if data is None:
+            errmsg = f'Unexpected Response Format: [cmd] {cmd_str} [ret] {ret_str[:32]}...'
+            raise ResponseFormatError(errmsg)
+        return data
+
+    def get_arb_max_num(self):
+        # Number of arbitrary waveform slots that are enabled
+        return self._get(self._read_cmd(Command.SYSTEM_ARB_MAX_NUM))
+
+    def use_waveform_library(self, library):
+        # Attach a WaveformLibrary, the slot contents it already knows about 
+        # for this device are used to skip redundant uploads and every upload 
+        # is recorded in it.
+        self._library_serial = self.get_serial_number()
+        self.waveform_library = library
+        self._arb_hashes.update(library.slots(self._library_serial))
+
+    def use_calibration(self, calibration=None, directory=None):
+        # Attach a FrequencyCalibration, without one the cached calibration
+        # for this device's serial number is loaded (see calibrate()).  The
+        # correction is a local table lookup so calibrated frequency changes
+        # cost no extra commands.  Returns the calibration that is in use
+        # (None if this device hasn't been calibrated).
+        if calibration is None:
+            calibration = load_calibration(self.get_serial_number(), directory)
+        self.calibration = calibration
+        return calibration
+
+    @contextlib.contextmanager
+    def _extended_timeouts(self, nbytes):
+        # Arbitrary waveform data takes close to a second to transfer at 115200 
+        # baud (10 bits per byte), allow for that on top of the normal timeouts.
+        line_time = nbytes * 10 / self._args['baudrate']
+        timeout, write_timeout = self._transport.timeout, self._transport.write_timeout
+        try:
+            self._transport.write_timeout = (write_timeout or 0) + line_time
+            self._transport.timeout = (timeout or 0) + line_time
+            yield
+        finally:
+            self._transport.timeout, self._transport.write_timeout = timeout, write_timeout
+
     # TODO: Lots more commands need to have set/get functions implemented.
 
 
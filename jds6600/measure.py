@@ -0,0 +1,177 @@
+import time
+
+from .types import *
+from .arb import _numpy
+from .errors import ProtocolError
+
+
+# The measurement registers that hold a value, in register order
+MEASURE_REGISTERS = (
+    Command.MEASURE_FREQ_10HZ,
+    Command.MEASURE_FREQ_1000HZ,
+    Command.MEASURE_PULSE_PLUS,
+    Command.MEASURE_PULSE_MINUS,
+    Command.MEASURE_PERIOD,
+    Command.MEASURE_DUTYCYCLE,
+)
+
+# Multipliers to convert the raw measurement values into SI units (Hz and %),
+# as far as I can tell the two frequency registers only differ in their
+# resolution.  Registers that aren't listed here are only available raw.
+MEASURE_SCALE = {
+    Command.MEASURE_FREQ_10HZ:   0.1,
+    Command.MEASURE_FREQ_1000HZ: 0.001,
+    Command.MEASURE_DUTYCYCLE:   0.1,
+}
+
+
+class MeasurementRing:
+    # Fixed size buffer of timestamped measurement samples.  All of the memory
+    # is allocated up front, once the buffer is full the oldest samples are
+    # overwritten.  timestamps are time.monotonic() values and values holds
+    # one column of raw register values per register.
+    def __init__(self, registers=MEASURE_REGISTERS, capacity=100000):
+        np = _numpy()
+        self.registers = tuple(Command(r) for r in registers)
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.registers)), dtype=np.int64)
+
+        # Total number of samples ever added
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _next_row(self):
+        # Index of the row the next sample goes into
+        return self.count % self.capacity
+
+    def append(self, timestamp, values):
+        row = self._next_row()
+        self.timestamps[row] = timestamp
+        self.values[row] = values
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def column(self, register):
+        return self.registers.index(Command(register))
+
+    def segments(self):
+        # Returns the stored samples in chronological order as a list of
+        # (timestamps, values) views into the buffer (two of them once the
+        # buffer has wrapped around).  No data is copied, so the views change
+        # when more samples are added.
+        if self.count <= self.capacity:
+            return [(self.timestamps[:self.count], self.values[:self.count])]
+
+        row = self._next_row()
+        return [
+            (self.timestamps[row:], self.values[row:]),
+            (self.timestamps[:row], self.values[:row]),
+        ]
+
+    def arrays(self):
+        # Copy of the stored samples in chronological order
+        np = _numpy()
+        segments = self.segments()
+        if len(segments) == 1:
+            timestamps, values = segments[0]
+            return timestamps.copy(), values.copy()
+        return np.concatenate([s[0] for s in segments]), np.concatenate([s[1] for s in segments])
+
+    def scaled(self, register):
+        # Copy of one register's samples (chronological) converted to SI units
+        _, values = self.arrays()
+        register = Command(register)
+        return values[:, self.column(register)] * MEASURE_SCALE[register]
+
+
+class MeasurementStream:
+    # Polls a set of measurement registers as fast as the link allows and
+    # stores the samples in a MeasurementRing.  Two rounds of reads are kept in
+    # flight (see JDS6600.pipeline()) so the link never idles between rounds.
+    #
+    #   stream = MeasurementStream(dev, [Command.MEASURE_FREQ_1000HZ])
+    #   stream.run(duration=3600)
+    #   timestamps, values = stream.ring.arrays()
+    #
+    # or as a generator of (timestamp, values) where values is a view of the
+    # row in the ring buffer:
+    #
+    #   for timestamp, values in stream.samples(count=1000):
+    #       ...
+    #
+    # A round of reads that fails (timeout, garbled response) doesn't end the
+    # run, the sample is skipped and counted in errors.
+    def __init__(self, dev, registers=MEASURE_REGISTERS, capacity=100000, ring=None):
+        self._dev = dev
+        if ring is None:
+            ring = MeasurementRing(registers, capacity)
+        self.ring = ring
+
+        # Number of samples skipped because of an error, and the last error
+        self.errors = 0
+        self.last_error = None
+
+    def samples(self, count=None, duration=None):
+        registers = self.ring.registers
+        ring = self.ring
+        end = None if duration is None else time.monotonic() + duration
+
+        with self._dev.pipeline(window=2 * len(registers)) as p:
+            previous = None
+            taken = 0
+            while True:
+                # The round in flight is counted, if it fails another one is
+                # queued
+                done = (count is not None and taken + (previous is not None) >= count) or (end is not None and time.monotonic() >= end)
+
+                # Queue the next round before collecting the previous one
+                current = None if done else [p.get(r) for r in registers]
+
+                failed = False
+                if previous is not None:
+                    # Once the ring is full the next row holds the oldest
+                    # sample, it's only overwritten by a complete one
+                    values = []
+                    for req in previous:
+                        try:
+                            values.append(req.result())
+                        except ProtocolError as e:
+                            self.last_error = e
+                            failed = True
+                    if failed:
+                        self.errors += 1
+                    else:
+                        row = ring._next_row()
+                        ring.values[row] = values
+                        ring.timestamps[row] = time.monotonic()
+                        ring.count += 1
+                        taken += 1
+                        yield ring.timestamps[row], ring.values[row]
+
+                if done:
+                    # The last round failed, a replacement is still due
+                    if failed and count is not None and taken < count and (end is None or time.monotonic() < end):
+                        previous = None
+                        continue
+                    break
+                previous = current
+
+    def run(self, count=None, duration=None):
+        # Acquire samples until count samples have been taken or duration
+        # seconds have passed (at least one of them should be set)
+        for _ in self.samples(count, duration):
+            pass
+        return self.ring
+
+
+__all__ = [
+    'MEASURE_REGISTERS',
+    'MEASURE_SCALE',
+    'MeasurementRing',
+    'MeasurementStream',
+]
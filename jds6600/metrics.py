@@ -0,0 +1,248 @@
+import bisect
+import threading
+
+from .types import Command
+
+
+class CommandEvent:
+    # Description of one command/response exchange passed to the hooks.  op
+    # is the command type ('r' read, 'w' write, 'a'/'b' arbitrary waveform
+    # upload/download) and cmd the register (or slot) number.  cmd_bytes and
+    # line are the raw bytes sent and received (line without the line
+    # ending), elapsed is the time in seconds from sending the command until
+    # the response was received.  timeout is set if the response line was
+    # incomplete and error is the exception raised for the response, if any.
+    __slots__ = ('op', 'cmd', 'cmd_bytes', 'line', 'elapsed', 'error', 'timeout')
+
+    def __init__(self, op, cmd, cmd_bytes, line, elapsed, error=None, timeout=False):
+        self.op = op
+        self.cmd = cmd
+        self.cmd_bytes = cmd_bytes
+        self.line = line
+        self.elapsed = elapsed
+        self.error = error
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f'CommandEvent(op={self.op!r}, cmd={self.cmd!r}, elapsed={self.elapsed!r}, error={self.error!r}, timeout={self.timeout!r})'
+
+
+class InstrumentationHook:
+    # Base class for the objects passed to JDS6600(hooks=[...]) or
+    # JDS6600.add_hook().  The methods are called from whichever thread is
+    # using the device and should return quickly, the default implementations
+    # do nothing.
+    def on_command(self, event):
+        # Called with a CommandEvent once the response of a command has been
+        # received and checked
+        pass
+
+    def on_retry(self, event, attempt):
+        # Called with the CommandEvent of a failed attempt before the command
+        # is sent again
+        pass
+
+    def on_flush(self, data):
+        # Called with the stale input that was thrown away before a command
+        pass
+
+
+class VerboseHook(InstrumentationHook):
+    # Prints every command, response and flush (what verbose=True does)
+    def __init__(self, max_length=80):
+        # Longer lines (arbitrary waveforms) are shortened
+        self.max_length = max_length
+
+    def _format(self, data):
+        text = bytes(data).strip().decode(errors='replace')
+        if len(text) > self.max_length:
+            text = f'{text[:self.max_length]}...<{len(text)} bytes>'
+        return text
+
+    def on_command(self, event):
+        print(f'[cmd] {self._format(event.cmd_bytes)}')
+        print(f'[ret] {self._format(event.line)}')
+
+    def on_retry(self, event, attempt):
+        print(f'[retry {attempt}] {self._format(event.cmd_bytes)}: {event.error}')
+
+    def on_flush(self, data):
+        print(f'[flush]:\n{self._format(data)}')
+
+
+# Upper bounds (in seconds) of the latency histogram buckets, the last bucket
+# (+Inf) holds everything slower than the last bound.
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+class _CommandStats:
+    __slots__ = ('count', 'errors', 'timeouts', 'retries', 'bytes_out', 'bytes_in', 'latency_sum', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+def _command_name(op, cmd):
+    if op not in ('r', 'w'):
+        return 'ARBITRARY_WAVEFORM'
+    try:
+        return Command(cmd).name
+    except ValueError:
+        return 'UNKNOWN'
+
+
+class CommandMetrics(InstrumentationHook):
+    # Counters and latency histograms per command type and register.  One
+    # instance can be shared by several devices (from different threads), or
+    # each device gets its own with labels to tell them apart in the
+    # Prometheus output:
+    #
+    #   metrics = CommandMetrics(labels={'serial': dev.get_serial_number()})
+    #   dev.add_hook(metrics)
+    #   ...
+    #   print(metrics.prometheus())
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.flushes = 0
+            self.flushed_bytes = 0
+
+    def _get_stats(self, op, cmd):
+        key = (op, int(cmd))
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _CommandStats()
+        return stats
+
+    def on_command(self, event):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, event.elapsed)
+        with self._lock:
+            stats = self._get_stats(event.op, event.cmd)
+            stats.count += 1
+            if event.error is not None:
+                stats.errors += 1
+            if event.timeout:
+                stats.timeouts += 1
+            stats.bytes_out += len(event.cmd_bytes)
+            stats.bytes_in += len(event.line) + (0 if event.timeout else 2)
+            stats.latency_sum += event.elapsed
+            stats.buckets[bucket] += 1
+
+    def on_retry(self, event, attempt):
+        with self._lock:
+            self._get_stats(event.op, event.cmd).retries += 1
+
+    def on_flush(self, data):
+        with self._lock:
+            self.flushes += 1
+            self.flushed_bytes += len(data)
+
+    def snapshot(self):
+        # Copy of the current values as plain (JSON compatible) data.  The
+        # commands are indexed by their wire prefix ('r23', 'w23', ...) and
+        # the latency buckets match LATENCY_BUCKETS plus one for +Inf.
+        with self._lock:
+            commands = {}
+            for (op, cmd), stats in sorted(self._stats.items()):
+                commands[f'{op}{cmd:02}'] = {
+                    'op': op,
+                    'register': cmd,
+                    'name': _command_name(op, cmd),
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'timeouts': stats.timeouts,
+                    'retries': stats.retries,
+                    'bytes_out': stats.bytes_out,
+                    'bytes_in': stats.bytes_in,
+                    'latency_sum': stats.latency_sum,
+                    'latency_buckets': list(stats.buckets),
+                }
+
+            return {
+                'labels': dict(self.labels),
+                'commands': commands,
+                'flushes': self.flushes,
+                'flushed_bytes': self.flushed_bytes,
+            }
+
+    def top(self, count=10):
+        # The registers that used the most link time, as (key, seconds) pairs
+        commands = self.snapshot()['commands']
+        ranked = sorted(commands.items(), key=lambda item: item[1]['latency_sum'], reverse=True)
+        return [(key, stats['latency_sum']) for key, stats in ranked[:count]]
+
+    def prometheus(self, prefix='jds6600'):
+        return prometheus_text([self], prefix)
+
+
+def _label_str(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{k}="{escape(v)}"' for k, v in labels.items())
+
+
+def prometheus_text(metrics, prefix='jds6600'):
+    # Formats the values of one or more CommandMetrics in the Prometheus text
+    # exposition format.  Use different labels for each of them (serial
+    # number, port, ...) when combining the metrics of several devices.
+    families = {
+        'commands_total': ('counter', 'Commands sent', 'count'),
+        'command_errors_total': ('counter', 'Commands with a bad response', 'errors'),
+        'command_timeouts_total': ('counter', 'Commands with an incomplete response', 'timeouts'),
+        'command_retries_total': ('counter', 'Commands that were sent again', 'retries'),
+        'bytes_sent_total': ('counter', 'Bytes written to the device', 'bytes_out'),
+        'bytes_received_total': ('counter', 'Bytes received from the device', 'bytes_in'),
+    }
+
+    snapshots = [m.snapshot() for m in metrics]
+    lines = []
+    for name, (typ, help_text, field) in families.items():
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} {typ}')
+        for snapshot in snapshots:
+            for stats in snapshot['commands'].values():
+                labels = _label_str(dict(snapshot['labels'], op=stats['op'], register=stats['register'], name=stats['name']))
+                lines.append(f'{prefix}_{name}{{{labels}}} {stats[field]}')
+
+    name = f'{prefix}_command_duration_seconds'
+    lines.append(f'# HELP {name} Time from sending a command until its response was received')
+    lines.append(f'# TYPE {name} histogram')
+    for snapshot in snapshots:
+        for stats in snapshot['commands'].values():
+            labels = dict(snapshot['labels'], op=stats['op'], register=stats['register'], name=stats['name'])
+            total = 0
+            for bound, value in zip(LATENCY_BUCKETS + ('+Inf',), stats['latency_buckets']):
+                total += value
+                lines.append(f'{name}_bucket{{{_label_str(dict(labels, le=bound))}}} {total}')
+            lines.append(f'{name}_sum{{{_label_str(labels)}}} {stats["latency_sum"]}')
+            lines.append(f'{name}_count{{{_label_str(labels)}}} {stats["count"]}')
+
+    for name, help_text, field in (('flushes_total', 'Times stale input was thrown away', 'flushes'), ('flushed_bytes_total', 'Bytes of stale input thrown away', 'flushed_bytes')):
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} counter')
+        for snapshot in snapshots:
+            lines.append(f'{prefix}_{name}{{{_label_str(snapshot["labels"])}}} {snapshot[field]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+__all__ = [
+    'CommandEvent',
+    'CommandMetrics',
+    'InstrumentationHook',
+    'LATENCY_BUCKETS',
+    'VerboseHook',
+    'prometheus_text',
+]
@@ -0,0 +1,215 @@
+import collections
+import time
+
+from .codec import encode_command, parse_read, parse_write, resync, is_response, answers, _errmsg, _MAX_STALE_LINES
+from .errors import ProtocolError, ResponseTimeoutError, ResponseLostError
+from .metrics import CommandEvent
+
+
+class PendingCommand:
+    # Handle for a command that has been queued in a Pipeline.  result()
+    # waits for the response (if necessary) and either returns the parsed
+    # value or raises the error that was detected for this command.
+    __slots__ = ('cmd', 'args', 'cmd_bytes', 'is_read', 'cached', 'sent', 'done', '_pipeline', '_value', '_error')
+
+    def __init__(self, pipeline, cmd, args, cmd_bytes, is_read, cached=False):
+        self._pipeline = pipeline
+        self.cmd = cmd
+        self.args = args
+        self.cmd_bytes = cmd_bytes
+        self.is_read = is_read
+        self.cached = cached
+        self.sent = None
+        self.done = False
+        self._value = None
+        self._error = None
+
+    @classmethod
+    def completed(cls, cmd, args, is_read, value=None):
+        # For commands that were served by the register cache
+        req = cls(None, cmd, args, None, is_read)
+        req._complete(value, None)
+        return req
+
+    def _complete(self, value, error):
+        self._value = value
+        self._error = error
+        self.done = True
+
+    def result(self):
+        if not self.done:
+            self._pipeline.wait(self)
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def error(self):
+        if not self.done:
+            self._pipeline.wait(self)
+        return self._error
+
+
+class Pipeline:
+    # Keeps up to "window" commands in flight on the serial link.  The
+    # device answers commands in the order they were received so responses
+    # are matched to the oldest outstanding command, the echoed register
+    # number of read responses and the ":ok" of write responses are checked
+    # the same way as JDS6600._get() and JDS6600._set() do.
+    def __init__(self, dev, window=8):
+        assert window > 0
+        self._dev = dev
+        self.window = window
+        self._inflight = collections.deque()
+
+        # Errors for write commands, these are raised by flush()
+        self._errors = []
+
+    def get(self, cmd, *args):
+        cache = self._dev.cache
+        cached = cache is not None and len(args) == 0
+        if cached:
+            found, value = cache.lookup(cmd)
+            if found:
+                return PendingCommand.completed(cmd, args, True, value)
+
+        # The commands are kept until their responses arrive, so they can't
+        # share the device's encoder buffer
+        cmd_bytes = encode_command('r', cmd, args)
+        return self._submit(PendingCommand(self, cmd, args, cmd_bytes, True, cached))
+
+    def set(self, cmd, *args):
+        assert len(args) > 0
+
+        cache = self._dev.cache
+        if cache is not None and cache.unchanged(cmd, args):
+            return PendingCommand.completed(cmd, args, False)
+
+        cmd_bytes = encode_command('w', cmd, args)
+        req = self._submit(PendingCommand(self, cmd, args, cmd_bytes, False))
+
+        # The cache holds the value the register will have once the queued
+        # writes are done, so later get() and set() calls see this write.
+        # _finish() drops it again if the write fails.
+        if cache is not None:
+            cache.update(cmd, args)
+        return req
+
+    def _submit(self, req):
+        # Make room in the window if necessary
+        while len(self._inflight) >= self.window:
+            self._complete_next()
+
+        # Anything pending on the input before the first command goes out is
+        # stale, once commands are in flight the input belongs to them.
+        if not self._inflight and not self._dev._stream_clean:
+            self._dev._flush_input()
+
+        # The time the command was sent is only needed for the hooks
+        if self._dev.hooks:
+            req.sent = time.perf_counter()
+        self._dev._write_line(req.cmd_bytes)
+        self._inflight.append(req)
+        return req
+
+    def _complete_next(self):
+        dev = self._dev
+        for _ in range(_MAX_STALE_LINES):
+            line, complete = dev._read_line()
+            line = resync(line)
+            req = self._inflight[0]
+            value, error = self._parse(req, line)
+            if error is None or not complete or answers(req.cmd_bytes, line):
+                break
+
+            # Lines that aren't a response at all (front panel echo, noise) are
+            # skipped.  If it was the garbled response to this command the next
+            # line answers a later command, or the read times out.
+            later = None
+            if is_response(line):
+                later = next((idx for idx, r in enumerate(self._inflight) if idx and answers(r.cmd_bytes, line)), None)
+            if later is None:
+                # Junk, or a response left over from before the pipeline was
+                # started
+                for hook in dev.hooks:
+                    hook.on_flush(line)
+                continue
+
+            # The device answered a later command, so the responses to the
+            # commands in front of it were lost.  Only those fail instead of
+            # every command after them getting the wrong response.
+            for _ in range(later):
+                lost = self._inflight.popleft()
+                self._finish(lost, b'', None, ResponseLostError(_errmsg('Response lost', lost.cmd_bytes, line)), True)
+            req = self._inflight[0]
+            value, error = self._parse(req, line)
+            break
+
+        self._inflight.popleft()
+        if error is not None:
+            dev._stream_clean = False
+            if not complete:
+                timeout = ResponseTimeoutError(f'Timeout: {error}')
+                timeout.__cause__ = error
+                error = timeout
+        self._finish(req, line, value, error, complete)
+
+    @staticmethod
+    def _parse(req, line):
+        # Returns (value, error)
+        try:
+            if req.is_read:
+                return parse_read(req.cmd, req.cmd_bytes, line), None
+            parse_write(req.cmd, req.cmd_bytes, line)
+            return None, None
+        except ProtocolError as e:
+            return None, e
+
+    def _finish(self, req, line, value, error, complete):
+        # The elapsed time includes the time the command spent waiting for the
+        # responses of the commands in front of it
+        hooks = self._dev.hooks
+        if hooks and req.sent is not None:
+            op = 'r' if req.is_read else 'w'
+            event = CommandEvent(op, req.cmd, req.cmd_bytes, line, time.perf_counter() - req.sent, error, not complete)
+            for hook in hooks:
+                hook.on_command(event)
+
+        # Writes are recorded in the cache when they are queued.  A read that
+        # was queued in front of a write to the same register returns the
+        # value from before the write, which mustn't replace it.
+        cache = self._dev.cache
+        if cache is not None:
+            if req.is_read:
+                if error is None and req.cached and not any(not r.is_read and r.cmd == req.cmd for r in self._inflight):
+                    cache.store(req.cmd, value)
+            elif error is not None:
+                cache.invalidate(req.cmd)
+
+        if error is not None and not req.is_read:
+            self._errors.append(error)
+        req._complete(value, error)
+
+    def wait(self, req):
+        while not req.done:
+            self._complete_next()
+
+    def drain(self):
+        # Collect all outstanding responses
+        while self._inflight:
+            self._complete_next()
+
+    def flush(self):
+        # Wait for all outstanding responses and raise the first write error
+        # that was detected (if any).  Read errors are raised by the result()
+        # of the command they belong to.
+        self.drain()
+        if self._errors:
+            error = self._errors[0]
+            self._errors = []
+            raise error
+
+
+__all__ = [
+    'Pipeline',
+    'PendingCommand',
+]
@@ -0,0 +1,248 @@
+import json
+import os
+import time
+
+from .types import *
+from .state import DeviceState
+
+
+PROFILE_SLOTS = range(100)
+
+# Registers that are stored in a profile slot, in register order
+PROFILE_REGISTERS = tuple(Command(r) for r in range(Command.CHANNEL_ENABLE, Command.PHASE + 1))
+
+
+def _profile_key(state):
+    # Identity of the contents of a profile, for the exact match index
+    return json.dumps([state[cmd] for cmd in PROFILE_REGISTERS])
+
+
+class ProfileLibrary:
+    # Host side copy of the contents of the 100 profile slots of each device
+    # (identified by serial number), kept in <path>/profiles.json.  Each slot
+    # is a DeviceState with only the profile registers set, the settings
+    # that loading the slot gives.  The device has no way to tell an unused
+    # slot apart, so a slot is only None (empty) if it was recorded that way.
+    #
+    # Dumping and restoring are pipelined batches that put the live settings
+    # back afterwards, and once a device has been dumped its slots can be
+    # looked up without any device traffic:
+    #
+    #   lib = ProfileLibrary('~/.jds6600/profiles')
+    #   lib.dump(old_dev)
+    #   lib.restore(new_dev, serial=old_serial)
+    #   slots = lib.find(old_serial, dev.get_state())
+    #
+    # Profiles saved from the front panel (or with profile_save()) after the
+    # dump aren't known until the next dump, use record() to keep the library
+    # up to date.
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._index_path = os.path.join(self.path, 'profiles.json')
+
+        # serial number (as a string) -> {'dumped': timestamp, 'slots': {slot: DeviceState or None}}
+        self._devices = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                index = json.load(f)
+            for serial, device in index['devices'].items():
+                slots = dict((int(s), None if v is None else DeviceState.from_dict(v)) for s, v in device['slots'].items())
+                self._devices[serial] = {'dumped': device.get('dumped'), 'slots': slots}
+
+        # serial number -> {profile key: [slots]}, for exact matches
+        self._keys = dict((serial, self._build_keys(device['slots'])) for serial, device in self._devices.items())
+
+    def __contains__(self, serial):
+        return str(serial) in self._devices
+
+    @staticmethod
+    def _build_keys(slots):
+        keys = {}
+        for slot, state in sorted(slots.items()):
+            if state is not None:
+                keys.setdefault(_profile_key(state), []).append(slot)
+        return keys
+
+    def save(self):
+        index = {'devices': dict(
+            (serial, {
+                'dumped': device['dumped'],
+                'slots': dict((str(s), None if v is None else v.to_dict()) for s, v in sorted(device['slots'].items())),
+            })
+            for serial, device in self._devices.items()
+        )}
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, self._index_path)
+
+    def _device(self, serial):
+        serial = str(serial)
+        if serial not in self._devices:
+            self._devices[serial] = {'dumped': None, 'slots': {}}
+            self._keys[serial] = {}
+        return self._devices[serial]
+
+    def record(self, serial, slot, state):
+        # Records the contents of one slot (a DeviceState, None for empty)
+        assert slot in PROFILE_SLOTS
+        if state is not None:
+            state = DeviceState(**dict((cmd.name.lower(), state[cmd]) for cmd in PROFILE_REGISTERS))
+        device = self._device(serial)
+        device['slots'][slot] = state
+        self._keys[str(serial)] = self._build_keys(device['slots'])
+        self.save()
+
+    def get(self, serial, slot):
+        # Contents of a slot, None if it is empty or hasn't been dumped
+        device = self._devices.get(str(serial))
+        if device is None:
+            return None
+        return device['slots'].get(slot)
+
+    def slots(self, serial):
+        # {slot: DeviceState or None} of every known slot of a device
+        device = self._devices.get(str(serial))
+        return dict(device['slots']) if device is not None else {}
+
+    def find(self, serial, state):
+        # The slots of a device whose profile matches state (a DeviceState,
+        # e.g. from get_state()).  Profile registers that are None in state
+        # match anything.
+        if all(state[cmd] is not None for cmd in PROFILE_REGISTERS):
+            return list(self._keys.get(str(serial), {}).get(_profile_key(state), []))
+
+        matches = []
+        for slot, profile in sorted(self.slots(serial).items()):
+            if profile is not None and all(state[cmd] is None or state[cmd] == profile[cmd] for cmd in PROFILE_REGISTERS):
+                matches.append(slot)
+        return matches
+
+    def dump(self, dev, slots=PROFILE_SLOTS):
+        # Reads the contents of the slots by loading each one in turn, all of
+        # it in one pipelined batch.  Loading a slot also loads its output
+        # settings, so the outputs are switched off again right after each
+        # load (they are only on for a round trip) and stay off in between.
+        # The live settings are restored afterwards.  Returns the number of
+        # slots read.
+        serial = dev.get_serial_number()
+        live = dev.get_state()
+
+        # Writes have to reach the device even when the register cache
+        # thinks they wouldn't change anything, it doesn't know what each
+        # profile load does
+        cache, dev.cache = dev.cache, None
+        try:
+            pending = {}
+            off = (Output.OFF, Output.OFF)
+            with dev.pipeline() as p:
+                p.set(Command.CHANNEL_ENABLE, *off)
+                for slot in slots:
+                    assert slot in PROFILE_SLOTS
+                    p.set(Command.PROFILE_LOAD, slot)
+                    reads = [(Command.CHANNEL_ENABLE, p.get(Command.CHANNEL_ENABLE))]
+                    p.set(Command.CHANNEL_ENABLE, *off)
+                    reads += [(cmd, p.get(dev._read_cmd(cmd))) for cmd in PROFILE_REGISTERS if cmd != Command.CHANNEL_ENABLE]
+                    pending[slot] = reads
+        finally:
+            dev.cache = cache
+            if cache is not None:
+                cache.invalidate()
+            dev.restore_state(live)
+
+        device = self._device(serial)
+        for slot, reads in pending.items():
+            values = dict((cmd.name.lower(), req.result()) for cmd, req in reads)
+            device['slots'][slot] = DeviceState(**values)
+        device['dumped'] = time.time()
+        self._keys[str(serial)] = self._build_keys(device['slots'])
+        self.save()
+        return len(pending)
+
+    def restore(self, dev, serial=None, slots=None, clear_empty=True, outputs=False, force=False):
+        # Writes the profiles dumped from the device with this serial number
+        # (default: dev itself) to dev's slots in one pipelined batch, only
+        # the registers that differ from the previous profile are written
+        # before each save.  Slots recorded as empty are cleared unless
+        # clear_empty is false.
+        #
+        # The outputs stay off while the profiles are written and are saved
+        # that way.  With outputs=True they follow the profiles instead (they
+        # have to be on to save a profile with them on), so the outputs turn
+        # on and off during the restore.
+        #
+        # Slots whose contents in the library for dev already match are
+        # skipped unless force is set.  The live settings are restored
+        # afterwards.  Returns the number of slots written.
+        target = dev.get_serial_number()
+        serial = target if serial is None else serial
+        profiles = self.slots(serial)
+        if not profiles:
+            raise ValueError(f'No profiles dumped for serial number {serial}')
+        if slots is not None:
+            profiles = dict((s, profiles[s]) for s in slots if s in profiles)
+
+        # The contents each slot is going to have
+        off = (Output.OFF, Output.OFF)
+        if not outputs:
+            for slot, profile in profiles.items():
+                if profile is not None:
+                    profile = DeviceState(**profile.to_dict())
+                    profile.channel_enable = off
+                    profiles[slot] = profile
+        if not clear_empty:
+            profiles = dict((s, v) for s, v in profiles.items() if v is not None)
+
+        # Slots are compared by their profile key, not by what they hold
+        known = dict((s, None if v is None else _profile_key(v)) for s, v in self.slots(target).items())
+        pending = dict(
+            (slot, profile) for slot, profile in profiles.items()
+            if force or slot not in known or known[slot] != (None if profile is None else _profile_key(profile))
+        )
+        if not pending:
+            return 0
+
+        live = dev.get_state()
+        current = dict((cmd, live[cmd]) for cmd in PROFILE_REGISTERS)
+
+        cache, dev.cache = dev.cache, None
+        written = 0
+        try:
+            with dev.pipeline() as p:
+                if not outputs and current[Command.CHANNEL_ENABLE] != off:
+                    p.set(Command.CHANNEL_ENABLE, *off)
+                    current[Command.CHANNEL_ENABLE] = off
+
+                for slot, profile in sorted(pending.items()):
+                    if profile is None:
+                        p.set(Command.PROFILE_CLEAR, slot)
+                        written += 1
+                        continue
+
+                    for cmd in PROFILE_REGISTERS:
+                        value = profile[cmd]
+                        if value is not None and value != current[cmd]:
+                            p.set(cmd, *(value if isinstance(value, tuple) else (value,)))
+                            current[cmd] = value
+                    p.set(Command.PROFILE_SAVE, slot)
+                    written += 1
+        finally:
+            dev.cache = cache
+            if cache is not None:
+                cache.invalidate()
+            dev.restore_state(live)
+
+        # The device now holds these profiles
+        device = self._device(target)
+        device['slots'].update(pending)
+        self._keys[str(target)] = self._build_keys(device['slots'])
+        self.save()
+        return written
+
+
+__all__ = [
+    'PROFILE_REGISTERS',
+    'PROFILE_SLOTS',
+    'ProfileLibrary',
+]
@@ -0,0 +1,60 @@
+import argparse
+import json
+import sys
+
+from .capture import TX, read_capture, replay_capture
+from .sim import Simulator
+
+
+# Run with:
+#   python -m jds6600.replay dump run.jdscap
+#   python -m jds6600.replay replay run.jdscap --speed max
+#
+# Capture logs are recorded with JDS6600(port, capture=path), by default they
+# are replayed against a local Simulator.
+
+
+def _speed(value):
+    return None if value == 'max' else float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jds6600.replay', description='Inspect and replay JDS6600 capture logs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    dump = commands.add_parser('dump', help='print the records of a capture log')
+    dump.add_argument('log')
+
+    replay = commands.add_parser('replay', help='replay a capture log against a device or the simulator')
+    replay.add_argument('log')
+    replay.add_argument('--port', help='port of the device to replay against (default: a local Simulator)')
+    replay.add_argument('--transport', help='transport to open the port with')
+    replay.add_argument('--speed', type=_speed, default=1.0, help='1.0 for the original timing, 2.0 twice as fast, ... or max')
+    replay.add_argument('--latency', type=float, default=0.0, help='simulated link latency in seconds')
+    replay.add_argument('--in-process', action='store_true', help='call the Simulator directly instead of through a pty')
+    replay.add_argument('--timeout', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'dump':
+        for timestamp, direction, data in read_capture(args.log):
+            print(f'{timestamp:12.6f} {"TX" if direction == TX else "RX"} {data!r}')
+        return
+
+    if args.port is not None:
+        result = replay_capture(args.log, args.port, args.speed, args.transport, args.timeout)
+    else:
+        sim = Simulator(latency=args.latency)
+        if args.in_process:
+            result = replay_capture(args.log, sim, args.speed)
+        else:
+            with sim:
+                result = replay_capture(args.log, sim.port, args.speed, args.transport, args.timeout)
+
+    json.dump(result.summary(), sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    for idx, expected, received in result.mismatches()[:20]:
+        print(f'response {idx}: expected {expected!r} got {received!r}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+import time
+
+from .types import *
+from .codec import encode_command, parse_write
+from .errors import ProtocolError, ResponseTimeoutError
+from .freqplan import plan_frequency
+from .iface import JDS6600, _check_arg_type
+from .metrics import CommandEvent
+
+
+# Per channel registers of each set_config() setting, and the conversion
+# from the set_config() value to the register arguments
+_SETTINGS = (
+    ('waveform', (Command.WAVEFORM_CH1, Command.WAVEFORM_CH2), lambda v: (v,)),
+    ('frequency', (Command.FREQUENCY_CH1, Command.FREQUENCY_CH2), plan_frequency),
+    ('amplitude', (Command.AMPLITUDE_CH1, Command.AMPLITUDE_CH2), lambda v: (JDS6600._amplitude_to_tgt(v),)),
+    ('offset', (Command.OFFSET_CH1, Command.OFFSET_CH2), lambda v: (JDS6600._offset_to_tgt(v),)),
+    ('dutycycle', (Command.DUTYCYCLE_CH1, Command.DUTYCYCLE_CH2), lambda v: (JDS6600._dutycycle_to_tgt(v),)),
+)
+
+_STEP_KEYS = set(name for name, _, _ in _SETTINGS) | {'output', 'dwell'}
+
+
+class CompiledStep:
+    # The writes of one step (only the registers that change from the
+    # previous step), the encoded command of each write and all of them as
+    # one block of bytes
+    __slots__ = ('writes', 'commands', 'data', 'dwell')
+
+    def __init__(self, writes, dwell):
+        self.writes = tuple(writes)
+        self.commands = tuple(encode_command('w', cmd, args) for cmd, args in self.writes)
+        self.data = b''.join(self.commands)
+        self.dwell = dwell
+
+    def __repr__(self):
+        return f'CompiledStep(writes={self.writes!r}, dwell={self.dwell!r})'
+
+
+class Sequence:
+    # A list of configurations that is validated, converted and encoded once
+    # so that it can be played back (see SequencePlayer) as fast as the link
+    # allows.  Each step is a dict with the set_config() arguments (waveform,
+    # frequency, amplitude, offset, dutycycle, output) and optionally the
+    # time in seconds to hold it before the next step (dwell).  Settings that
+    # aren't in a step keep their value from the previous step.
+    #
+    #   seq = Sequence([
+    #       {'frequency': 1000, 'amplitude': 1.0, 'output': Output.ON},
+    #       {'frequency': 2000},
+    #       {'frequency': 5000, 'dwell': 0.5},
+    #   ], dwell=0.1)
+    #
+    # Frequencies are corrected with calibration (a FrequencyCalibration) if
+    # one is given.  SequencePlayer compiles the sequence again with the
+    # device's calibration (see JDS6600.use_calibration()) if it differs.
+    def __init__(self, steps, which=Channel.BOTH, dwell=0.0, calibration=None):
+        self.which = Channel(which)
+        self.dwell = dwell
+        self.calibration = calibration
+        self._source = [dict(step) for step in steps]
+        self.steps = self._compile(self._source)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __getitem__(self, idx):
+        return self.steps[idx]
+
+    def calibrated(self, calibration):
+        # The same sequence compiled for another calibration (None for none)
+        if calibration is self.calibration:
+            return self
+        return Sequence(self._source, self.which, self.dwell, calibration)
+
+    def _channels(self):
+        if self.which == Channel.BOTH:
+            return (Channel.CH1, Channel.CH2)
+        elif self.which == Channel.NONE:
+            return ()
+        return (self.which,)
+
+    def _compile(self, steps):
+        channels = self._channels()
+
+        # Register values after each step, the first step writes everything
+        # it sets
+        current = {}
+        compiled = []
+        for idx, step in enumerate(steps):
+            unknown = set(step) - _STEP_KEYS
+            if unknown:
+                raise ValueError(f'Unknown settings in step {idx}: {", ".join(sorted(unknown))}')
+
+            writes = []
+            for name, cmds, convert in _SETTINGS:
+                value = step.get(name)
+                if value is None:
+                    continue
+                if name == 'waveform':
+                    _check_arg_type(value, Waveform)
+                elif name == 'frequency' and self.calibration is not None:
+                    value = self.calibration.correct(value)
+                args = tuple(convert(value))
+                for channel in channels:
+                    cmd = cmds[channel]
+                    if current.get(cmd) != args:
+                        current[cmd] = args
+                        writes.append((cmd, args))
+
+            # Like set_config() outputs are turned off before and on after
+            # the other settings are changed
+            output = step.get('output')
+            if output is not None:
+                _check_arg_type(output, Output)
+                if self.which != Channel.BOTH:
+                    raise ValueError('output can only be part of a sequence for Channel.BOTH')
+                args = (output, output)
+                if current.get(Command.CHANNEL_ENABLE) != args:
+                    current[Command.CHANNEL_ENABLE] = args
+                    if output == Output.OFF:
+                        writes.insert(0, (Command.CHANNEL_ENABLE, args))
+                    else:
+                        writes.append((Command.CHANNEL_ENABLE, args))
+
+            dwell = step.get('dwell', self.dwell)
+            if dwell < 0:
+                raise ValueError(f'Invalid dwell time in step {idx}: {dwell}')
+            compiled.append(CompiledStep(writes, dwell))
+
+        return compiled
+
+
+class SequenceStats:
+    # Timing of each step of a playback, all times are in seconds relative to
+    # the start of the playback.  scheduled is when the step should have been
+    # sent, started when it was sent and finished when the last response of
+    # the step arrived.
+    def __init__(self):
+        self.scheduled = []
+        self.started = []
+        self.finished = []
+
+    def __len__(self):
+        return len(self.started)
+
+    def lateness(self):
+        return [s - d for d, s in zip(self.scheduled, self.started)]
+
+    def link_time(self):
+        return [f - s for s, f in zip(self.started, self.finished)]
+
+    def summary(self):
+        if not self.started:
+            return {'steps': 0}
+
+        lateness = sorted(self.lateness())
+        link_time = self.link_time()
+        duration = self.finished[-1]
+        return {
+            'steps': len(self.started),
+            'duration': duration,
+            'steps_per_second': len(self.started) / duration if duration > 0 else None,
+            'lateness_mean': sum(lateness) / len(lateness),
+            'lateness_p99': lateness[min(len(lateness) - 1, int(len(lateness) * 0.99))],
+            'lateness_max': lateness[-1],
+            'link_time_mean': sum(link_time) / len(link_time),
+            'link_time_max': max(link_time),
+        }
+
+
+class SequencePlayer:
+    # Plays a Sequence on a device.  Step deadlines are computed from the
+    # start of the playback (not from the end of the previous step), so a
+    # step that goes out late doesn't delay the ones after it.  The last
+    # "spin" seconds before each deadline are busy-waited because sleep()
+    # overshoots by about a scheduler tick.
+    #
+    # The writes of a step are sent as one block and their responses
+    # collected afterwards, so a step costs about one round trip however many
+    # registers it changes.  With a ThreadedJDS6600 run play() as a job on
+    # the I/O worker (dev.submit(lambda d: player.play())).
+    #
+    # The frequencies follow the calibration attached to the device when
+    # play() is called, the sequence is compiled again if necessary.
+    def __init__(self, dev, sequence, spin=0.001):
+        self.dev = dev
+        self.sequence = sequence
+        self.spin = spin
+        self.stats = SequenceStats()
+
+    def _wait_until(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.monotonic() < deadline:
+            pass
+
+    def _send_step(self, step):
+        dev = self.dev
+        if not dev._stream_clean:
+            dev._flush_input()
+
+        start = time.monotonic()
+        dev._write_line(step.data)
+
+        # Every response is collected even after an error so the input stays
+        # in step with the commands, the first error is raised
+        first_error = None
+        for (cmd, args), cmd_bytes in zip(step.writes, step.commands):
+            line, complete = dev._read_line()
+            error = None
+            try:
+                parse_write(cmd, cmd_bytes, line)
+            except ProtocolError as e:
+                dev._stream_clean = False
+                error = ResponseTimeoutError(f'Timeout: {e}') if not complete else e
+                first_error = first_error or error
+            else:
+                if dev.cache is not None:
+                    dev.cache.update(cmd, args)
+
+            if dev.hooks:
+                event = CommandEvent('w', cmd, cmd_bytes, line, time.monotonic() - start, error, not complete)
+                for hook in dev.hooks:
+                    hook.on_command(event)
+
+        if first_error is not None:
+            raise first_error
+        return start
+
+    def play(self, start=0, stop=None):
+        # Plays steps start to stop (exclusive) and returns the SequenceStats
+        # of this playback (also kept in self.stats)
+        if self.dev._pipeline is not None:
+            self.dev._pipeline.drain()
+
+        self.sequence = self.sequence.calibrated(self.dev.calibration)
+        steps = self.sequence.steps[start:stop]
+        stats = self.stats = SequenceStats()
+
+        t0 = time.monotonic()
+        deadline = t0
+        for idx, step in enumerate(steps):
+            self._wait_until(deadline)
+            try:
+                started = self._send_step(step)
+            except ProtocolError as e:
+                raise type(e)(f'Step {start + idx}: {e}') from e
+            finished = time.monotonic()
+
+            stats.scheduled.append(deadline - t0)
+            stats.started.append(started - t0)
+            stats.finished.append(finished - t0)
+            deadline += step.dwell
+
+        return stats
+
+
+__all__ = [
+    'Sequence',
+    'SequencePlayer',
+    'SequenceStats',
+]
@@ -0,0 +1,377 @@
+import os
+import queue
+import random
+import select
+import socket
+import threading
+import time
+import tty
+
+from .types import *
+
+
+# Power-on register values of the simulated device
+_DEFAULT_REGISTERS = {
+    Command.MODEL:               (30,),
+    Command.SERIAL_NUMBER:       (1234567890,),
+
+    Command.CHANNEL_ENABLE:      (0, 0),
+    Command.WAVEFORM_CH1:        (Waveform.SINE,),
+    Command.WAVEFORM_CH2:        (Waveform.SINE,),
+    Command.FREQUENCY_CH1:       (100000, Frequency.Hz),
+    Command.FREQUENCY_CH2:       (100000, Frequency.Hz),
+    Command.AMPLITUDE_CH1:       (5000,),
+    Command.AMPLITUDE_CH2:       (5000,),
+    Command.OFFSET_CH1:          (1000,),
+    Command.OFFSET_CH2:          (1000,),
+    Command.DUTYCYCLE_CH1:       (500,),
+    Command.DUTYCYCLE_CH2:       (500,),
+    Command.PHASE:               (0,),
+
+    Command.ACTION:              (0, 0, 0, 0),
+    Command.MODE:                (0,),
+    Command.UI_MODE:             (UIMode.WAVE_CH1,),
+
+    Command.MEASURE_COUPLING:    (MeasureCoupling.AC,),
+    Command.MEASURE_GATE_TIME:   (100,),
+    Command.MEASURE_MODE:        (MeasureMode.FREQUENCY,),
+
+    Command.SWEEP_START_FREQ:    (100000, Frequency.Hz),
+    Command.SWEEP_END_FREQ:      (1000000, Frequency.Hz),
+    Command.SWEEP_TIME:          (100,),
+    Command.SWEEP_DIRECTION:     (SweepDirection.RISE,),
+    Command.SWEEP_MODE:          (SweepMode.LINEAR,),
+
+    Command.PULSE_TIME:          (1000, 0),
+    Command.PULSE_PERIOD:        (10000, 0),
+    Command.PULSE_OFFSET:        (120,),
+    Command.PULSE_AMPLITUDE:     (500,),
+
+    Command.SYSTEM_SOUND:        (1,),
+    Command.SYSTEM_BRIGHTNESS:   (12,),
+    Command.SYSTEM_LANGUAGE:     (0,),
+    Command.SYSTEM_SYNC:         (0, 0, 0, 0, 0),
+    Command.SYSTEM_ARB_MAX_NUM:  (15,),
+
+    Command.COUNTER:             (0,),
+    Command.MEASURE_FREQ_10HZ:   (0,),
+    Command.MEASURE_FREQ_1000HZ: (0,),
+    Command.MEASURE_PULSE_PLUS:  (0,),
+    Command.MEASURE_PULSE_MINUS: (0,),
+    Command.MEASURE_PERIOD:      (0,),
+    Command.MEASURE_DUTYCYCLE:   (0,),
+    Command.MEASURE_UNKNOWN_1:   (0,),
+    Command.MEASURE_UNKNOWN_2:   (0,),
+    Command.MEASURE_UNKNOWN_3:   (0,),
+}
+
+# Registers that are saved to/restored from the profile slots
+_PROFILE_REGISTERS = tuple(range(Command.CHANNEL_ENABLE, Command.PHASE + 1))
+
+# System settings registers, these are read from register + 1 on devices with
+# the read bug (see JDS6600.fix_read_bug).
+_SYSTEM_REGISTERS = range(Command.SYSTEM_SOUND, Command.SYSTEM_ARB_MAX_NUM + 1)
+
+# Device values per Hz of each frequency unit, and the scale of the frequency
+# counter registers
+_FREQ_UNITS = {Frequency.Hz: 100, Frequency.KHz: 100, Frequency.MHz: 100, Frequency.mHz: 100000, Frequency.uHz: 100000000}
+_MEASURE_FREQ = {Command.MEASURE_FREQ_10HZ: 10, Command.MEASURE_FREQ_1000HZ: 1000}
+
+class Simulator:
+    # Software stand-in for a JDS6600 function generator.  It speaks the same
+    # ":rNN=..." / ":wNN=..." / ":ok" protocol as the real device and holds
+    # the state of every register in types.Command plus the 100 profile slots.
+    #
+    # handle() processes one command line in-process, start() exposes the
+    # simulator on a pseudo-terminal so an unmodified JDS6600(port=sim.port)
+    # can talk to it:
+    #
+    #   with Simulator(latency=0.005) as sim:
+    #       dev = JDS6600(port=sim.port)
+    #
+    # With tcp set it listens on a local TCP port instead, like a device
+    # behind a serial-over-TCP bridge, and port is "tcp://127.0.0.1:NNNN".
+    #
+    # Link behavior:
+    #   latency      - seconds between a command arriving and its response
+    #                  being sent, commands sent back to back overlap
+    #   process_time - seconds the device is busy with each command, this
+    #                  limits the command rate no matter how many are in flight
+    #   baudrate     - if set, responses are throttled to this line rate
+    #                  (10 bits per byte)
+    #   read_bug    - emulate the models that read the system settings from
+    #                 register + 1
+    #   clock_error  - if set, CH1 is looped back to the measurement input and
+    #                  the frequency counter reads its frequency times
+    #                  (1 + clock_error) while CH1 is on
+    #
+    # Fault injection (probabilities per command, 0.0 - 1.0):
+    #   drop_rate    - no response is sent
+    #   garbage_rate - a line of junk is sent before the response
+    #   stall_rate   - the response is delayed by stall_time seconds
+    def __init__(self, latency=0.0, process_time=0.0, baudrate=None, read_bug=True, drop_rate=0.0, garbage_rate=0.0, stall_rate=0.0, stall_time=1.0, seed=None, tcp=False, clock_error=None):
+        self.latency = latency
+        self.process_time = process_time
+        self.baudrate = baudrate
+        self.read_bug = read_bug
+        self.drop_rate = drop_rate
+        self.garbage_rate = garbage_rate
+        self.stall_rate = stall_rate
+        self.stall_time = stall_time
+        self._random = random.Random(seed)
+        self.tcp = tcp
+        self.clock_error = clock_error
+
+        self.registers = dict((int(k), tuple(int(v) for v in vals)) for k, vals in _DEFAULT_REGISTERS.items())
+        self.profiles = [None] * 100
+        self.arbitrary = dict((slot, (0,) * 2048) for slot in range(1, 61))
+
+        # Count of command lines received
+        self.commands = 0
+
+        self._lock = threading.Lock()
+        self._master = None
+        self._slave = None
+        self._listener = None
+        self._conn = None
+        self._thread = None
+        self._writer = None
+        self._stop_r = None
+        self._stop_w = None
+
+        # Responses waiting to be sent (due time, bytes) and the earliest time
+        # the device can send the next response.
+        self._responses = queue.Queue()
+        self._next_due = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def port(self):
+        if self._listener is not None:
+            return 'tcp://%s:%d' % self._listener.getsockname()
+        if self._slave is None:
+            return None
+        return os.ttyname(self._slave)
+
+    def start(self):
+        if self._thread is not None:
+            return self.port
+
+        if self.tcp:
+            self._listener = socket.create_server(('127.0.0.1', 0))
+        else:
+            self._master, self._slave = os.openpty()
+            tty.setraw(self._slave)
+        self._stop_r, self._stop_w = os.pipe()
+
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._writer = threading.Thread(target=self._send_responses, daemon=True)
+        self._thread.start()
+        self._writer.start()
+        return self.port
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        os.write(self._stop_w, b'x')
+        self._responses.put(None)
+        self._thread.join()
+        self._writer.join()
+        self._thread = None
+        self._writer = None
+
+        # The slave side is kept open for the whole life of the simulator so
+        # that the pty doesn't hang up when a client closes and reopens it.
+        for fd in (self._master, self._slave, self._stop_r, self._stop_w):
+            if fd is not None:
+                os.close(fd)
+        for sock in (self._listener, self._conn):
+            if sock is not None:
+                sock.close()
+        self._master = self._slave = self._stop_r = self._stop_w = None
+        self._listener = self._conn = None
+
+    def _serve(self):
+        buf = bytearray()
+        while True:
+            if self.tcp:
+                fds = [self._listener] + ([self._conn] if self._conn is not None else [])
+            else:
+                fds = [self._master]
+            ready, _, _ = select.select(fds + [self._stop_r], [], [])
+            if self._stop_r in ready:
+                break
+
+            if self._listener in ready:
+                # One client at a time, a new connection replaces the old one
+                conn, _ = self._listener.accept()
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = conn
+                buf.clear()
+                continue
+
+            try:
+                if self.tcp:
+                    data = self._conn.recv(4096)
+                    if not data:
+                        self._conn.close()
+                        self._conn = None
+                        continue
+                else:
+                    data = os.read(self._master, 4096)
+            except OSError:
+                continue
+            buf += data
+
+            while True:
+                idx = buf.find(b'\n')
+                if idx < 0:
+                    break
+                line = bytes(buf[:idx])
+                del buf[:idx + 1]
+                self._respond(line)
+
+    def _respond(self, line):
+        resp = self.handle(line)
+        if resp is None:
+            return
+
+        rand = self._random.random
+        if self.drop_rate and rand() < self.drop_rate:
+            return
+
+        due = max(time.monotonic() + self.latency, self._next_due)
+        self._next_due = due + self.process_time
+
+        if self.stall_rate and rand() < self.stall_rate:
+            due += self.stall_time
+            self._next_due = due
+        if self.garbage_rate and rand() < self.garbage_rate:
+            junk = bytes(self._random.randrange(0x21, 0x7f) for _ in range(self._random.randrange(1, 16)))
+            resp = junk + b'\r\n' + resp
+
+        self._responses.put((due, resp))
+
+    def _send_responses(self):
+        while True:
+            item = self._responses.get()
+            if item is None:
+                break
+
+            due, resp = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            if not self.tcp:
+                os.write(self._master, resp)
+            else:
+                # Responses for a client that went away are dropped
+                conn = self._conn
+                try:
+                    if conn is not None:
+                        conn.sendall(resp)
+                except OSError:
+                    pass
+            if self.baudrate:
+                time.sleep(len(resp) * 10 / self.baudrate)
+
+    def handle(self, line):
+        # Process one command line (with or without the line ending) and
+        # return the response bytes, or None if the device would ignore it.
+        line = line.strip()
+        if not line:
+            return None
+
+        with self._lock:
+            self.commands += 1
+            try:
+                text = line.decode()
+                if text[0] != ':' or text[-1] != '.' or '=' not in text:
+                    raise ValueError(text)
+                op = text[1]
+                reg_str, args_str = text[2:-1].split('=', 1)
+                reg = int(reg_str)
+                args = tuple(int(a) for a in args_str.split(','))
+            except (ValueError, IndexError, UnicodeDecodeError):
+                return b':err\r\n'
+
+            if op == 'r':
+                return self._read(reg)
+            elif op == 'w':
+                return self._write(reg, args)
+            elif op == 'a':
+                return self._write_arbitrary(reg, args)
+            elif op == 'b':
+                return self._read_arbitrary(reg)
+            return b':err\r\n'
+
+    def _read(self, reg):
+        # The response echoes the register that was asked for, on devices
+        # with the read bug the system settings come from the register below.
+        src = reg
+        if self.read_bug and reg - 1 in _SYSTEM_REGISTERS:
+            src = reg - 1
+        elif self.read_bug and reg == Command.SYSTEM_SOUND:
+            src = None
+
+        values = self.registers.get(src, (0,))
+        if self.clock_error is not None and src in _MEASURE_FREQ:
+            values = (self._loopback_frequency(_MEASURE_FREQ[src]),)
+        values_str = ','.join(str(v) for v in values)
+        return f':r{reg:02}={values_str}.\r\n'.encode()
+
+    def _loopback_frequency(self, scale):
+        if not self.registers[Command.CHANNEL_ENABLE][0]:
+            return 0
+        value, unit = self.registers[Command.FREQUENCY_CH1]
+        freq = value / _FREQ_UNITS[unit] * (1 + self.clock_error)
+        return round(freq * scale)
+
+    def _read_arbitrary(self, slot):
+        if slot not in self.arbitrary:
+            return b':err\r\n'
+        values_str = ','.join(str(v) for v in self.arbitrary[slot])
+        return f':b{slot:02}={values_str}.\r\n'.encode()
+
+    def _write_arbitrary(self, slot, args):
+        if slot not in self.arbitrary or len(args) != 2048 or min(args) < 0 or max(args) > 4095:
+            return b':err\r\n'
+        self.arbitrary[slot] = args
+        return b':ok\r\n'
+
+    def _write(self, reg, args):
+        if reg == Command.PROFILE_SAVE:
+            if not 0 <= args[0] <= 99:
+                return b':err\r\n'
+            self.profiles[args[0]] = dict((r, self.registers[r]) for r in _PROFILE_REGISTERS)
+        elif reg == Command.PROFILE_LOAD:
+            if not 0 <= args[0] <= 99:
+                return b':err\r\n'
+            if self.profiles[args[0]] is not None:
+                self.registers.update(self.profiles[args[0]])
+        elif reg == Command.PROFILE_CLEAR:
+            if not 0 <= args[0] <= 99:
+                return b':err\r\n'
+            self.profiles[args[0]] = None
+        elif reg == Command.RESET_COUNTER:
+            self.registers[Command.COUNTER] = (0,)
+        elif reg in self.registers:
+            self.registers[reg] = args
+        else:
+            return b':err\r\n'
+        return b':ok\r\n'
+
+
+__all__ = [
+    'Simulator',
+]
@@ -0,0 +1,133 @@
+import json
+
+from .types import *
+
+
+# Registers that identify the device, these are captured but never written
+_INFO_REGISTERS = (
+    Command.MODEL,
+    Command.SERIAL_NUMBER,
+)
+
+# Every readable register that holds a setting, in the order they are
+# restored.  CHANNEL_ENABLE is handled separately so the outputs can be turned
+# off before and on after the other settings change.
+_SETTING_REGISTERS = (
+    Command.WAVEFORM_CH1,
+    Command.WAVEFORM_CH2,
+    Command.FREQUENCY_CH1,
+    Command.FREQUENCY_CH2,
+    Command.AMPLITUDE_CH1,
+    Command.AMPLITUDE_CH2,
+    Command.OFFSET_CH1,
+    Command.OFFSET_CH2,
+    Command.DUTYCYCLE_CH1,
+    Command.DUTYCYCLE_CH2,
+    Command.PHASE,
+
+    Command.MEASURE_COUPLING,
+    Command.MEASURE_GATE_TIME,
+    Command.MEASURE_MODE,
+
+    Command.SWEEP_START_FREQ,
+    Command.SWEEP_END_FREQ,
+    Command.SWEEP_TIME,
+    Command.SWEEP_DIRECTION,
+    Command.SWEEP_MODE,
+
+    Command.PULSE_TIME,
+    Command.PULSE_PERIOD,
+    Command.PULSE_OFFSET,
+    Command.PULSE_AMPLITUDE,
+
+    Command.SYSTEM_SOUND,
+    Command.SYSTEM_BRIGHTNESS,
+    Command.SYSTEM_LANGUAGE,
+    Command.SYSTEM_SYNC,
+    Command.SYSTEM_ARB_MAX_NUM,
+
+    Command.UI_MODE,
+)
+
+STATE_REGISTERS = _INFO_REGISTERS + (Command.CHANNEL_ENABLE,) + _SETTING_REGISTERS
+
+
+class DeviceState:
+    # Snapshot of every readable setting of the device.  Values are kept in
+    # the raw device units (an int, or a tuple of ints for registers that hold
+    # more than one value) so that comparing two snapshots is exact and
+    # restoring one doesn't need any conversions.  The attributes are named
+    # after the Command members (state.frequency_ch1, state.channel_enable,
+    # ...).
+    __slots__ = tuple(c.name.lower() for c in STATE_REGISTERS)
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise ValueError(f'Unknown registers: {", ".join(values)}')
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'DeviceState({values})'
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceState):
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __getitem__(self, cmd):
+        return getattr(self, Command(cmd).name.lower())
+
+    def __setitem__(self, cmd, value):
+        setattr(self, Command(cmd).name.lower(), value)
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    @classmethod
+    def from_dict(cls, values):
+        # JSON turns the multi-value tuples into lists
+        return cls(**dict((k, tuple(v) if isinstance(v, list) else v) for k, v in values.items()))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def diff(self, current):
+        # Returns the (Command, value) pairs that need to be written to change
+        # a device in the "current" state to this state.  Registers that are
+        # None in this snapshot are left alone.
+        #
+        # The outputs that need to be turned off are turned off first and any
+        # outputs that need to be turned on are turned on last.
+        writes = []
+
+        final_output = None
+        if self.channel_enable is not None and self.channel_enable != current.channel_enable:
+            # Turn off any channel that is on now and should be off
+            off_output = tuple(min(c, t) for c, t in zip(current.channel_enable, self.channel_enable))
+            if off_output != current.channel_enable:
+                writes.append((Command.CHANNEL_ENABLE, off_output))
+            if off_output != self.channel_enable:
+                final_output = self.channel_enable
+
+        for cmd in _SETTING_REGISTERS:
+            value = self[cmd]
+            if value is not None and value != current[cmd]:
+                writes.append((cmd, value))
+
+        if final_output is not None:
+            writes.append((Command.CHANNEL_ENABLE, final_output))
+
+        return writes
+
+
+__all__ = [
+    'DeviceState',
+]
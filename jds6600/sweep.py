@@ -0,0 +1,60 @@
+from .types import *
+from .freqplan import plan_frequency
+
+
+# Registers that hold the sweep configuration, in the order they are written
+SWEEP_REGISTERS = (
+    Command.SWEEP_START_FREQ,
+    Command.SWEEP_END_FREQ,
+    Command.SWEEP_TIME,
+    Command.SWEEP_DIRECTION,
+    Command.SWEEP_MODE,
+)
+
+class SweepConfig:
+    # Hardware sweep settings.  start and end are in Hz and time is the
+    # duration of one sweep in seconds (the device uses 0.1 s units, 0.1 s to
+    # 999.9 s).
+    __slots__ = ('start', 'end', 'time', 'direction', 'mode')
+
+    def __init__(self, start, end, time, direction=SweepDirection.RISE, mode=SweepMode.LINEAR):
+        self.start = start
+        self.end = end
+        self.time = time
+        self.direction = SweepDirection(direction)
+        self.mode = SweepMode(mode)
+
+    def __repr__(self):
+        return f'SweepConfig(start={self.start!r}, end={self.end!r}, time={self.time!r}, direction={self.direction!r}, mode={self.mode!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, SweepConfig):
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def to_registers(self):
+        # Returns the (Command, args) pairs that program this sweep
+        sweep_time = round(self.time * 10)
+        if not 1 <= sweep_time <= 9999:
+            raise ValueError(f'Invalid sweep time: {self.time}, should be 0.1 - 999.9 seconds')
+
+        return [
+            (Command.SWEEP_START_FREQ, plan_frequency(self.start)),
+            (Command.SWEEP_END_FREQ, plan_frequency(self.end)),
+            (Command.SWEEP_TIME, (sweep_time,)),
+            (Command.SWEEP_DIRECTION, (self.direction,)),
+            (Command.SWEEP_MODE, (self.mode,)),
+        ]
+
+    @classmethod
+    def from_registers(cls, values, freq_convert):
+        # values are the raw register values in SWEEP_REGISTERS order,
+        # freq_convert is the JDS6600 frequency conversion for the start and
+        # end frequencies.
+        start, end, sweep_time, direction, mode = values
+        return cls(freq_convert(start), freq_convert(end), sweep_time / 10, direction, mode)
+
+
+__all__ = [
+    'SweepConfig',
+]
@@ -0,0 +1,158 @@
+import concurrent.futures
+import contextlib
+import enum
+import functools
+import itertools
+import queue
+import threading
+
+from .types import *
+from .iface import JDS6600
+
+
+class Priority(enum.IntEnum):
+    # Lanes of the ThreadedJDS6600 work queue, lower values go first
+    URGENT = 0
+    NORMAL = 1
+    BULK = 2
+
+
+# Queued after everything else to stop the worker
+_STOP = len(Priority)
+
+# The JDS6600 methods that run as a single job on the I/O worker, so any
+# commands they are made of are never interleaved with other threads' commands
+_METHOD_PREFIXES = ('get_', 'set_', 'profile_', 'sweep_', 'restore_state', 'upload_', 'download_', 'use_waveform_library', 'use_calibration', 'start_capture', 'stop_capture')
+
+
+class ThreadedJDS6600(JDS6600):
+    # JDS6600 that can be shared between threads.  A single I/O worker thread
+    # owns the serial port and runs the jobs submitted by the other threads
+    # one at a time, in priority order (and in submission order within each
+    # priority).  The usual methods block until their job is done:
+    #
+    #   dev = ThreadedJDS6600(port)
+    #   dev.get_frequency(Channel.CH1)
+    #
+    # or submit() returns a concurrent.futures.Future instead:
+    #
+    #   future = dev.submit('get_frequency', Channel.CH1)
+    #   future = dev.submit(lambda d: d.get_state(), priority=Priority.BULK)
+    #
+    # Turning outputs off always uses the URGENT lane, the lane of the calls
+    # made by one thread can be changed with priority():
+    #
+    #   with dev.priority(Priority.BULK):
+    #       ...
+    #
+    # pipeline() can only be used by a job running on the worker (e.g. from a
+    # function passed to submit()).
+    def __init__(self, *args, **kwargs):
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._local = threading.local()
+        self._worker = None
+        super().__init__(*args, **kwargs)
+
+    def open(self):
+        super().open()
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name=f'jds6600-io-{self._args["port"]}', daemon=True)
+            self._worker.start()
+
+    def close(self):
+        # Jobs that were already submitted are finished first
+        worker = getattr(self, '_worker', None)
+        if worker is not None:
+            self._worker = None
+            self._queue.put((_STOP, next(self._seq), None, None, None, None))
+            if threading.current_thread() is not worker:
+                worker.join()
+        super().close()
+
+    def _run(self):
+        while True:
+            _, _, future, func, args, kwargs = self._queue.get()
+            if future is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = func(self, *args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _on_worker(self):
+        return threading.current_thread() is self._worker
+
+    @contextlib.contextmanager
+    def priority(self, priority):
+        # Default lane for the calls made by the current thread
+        old = getattr(self._local, 'priority', Priority.NORMAL)
+        self._local.priority = Priority(priority)
+        try:
+            yield
+        finally:
+            self._local.priority = old
+
+    def submit(self, method, *args, priority=None, **kwargs):
+        # Queues method (a JDS6600 method name, or a function that is called
+        # with the device as its first argument) to run on the worker and
+        # returns a Future for its result.
+        if self._worker is None:
+            raise Exception('Device closed')
+        if priority is None:
+            priority = getattr(self._local, 'priority', Priority.NORMAL)
+        func = getattr(JDS6600, method) if isinstance(method, str) else method
+
+        future = concurrent.futures.Future()
+        self._queue.put((Priority(priority), next(self._seq), future, func, args, kwargs))
+        return future
+
+    def _call(self, func, *args, priority=None, **kwargs):
+        # Jobs that use the device again just run directly
+        if self._on_worker():
+            return func(self, *args, **kwargs)
+        return self.submit(func, *args, priority=priority, **kwargs).result()
+
+    def _get(self, cmd, *args):
+        return self._call(JDS6600._get, cmd, *args)
+
+    def _set(self, cmd, *args):
+        return self._call(JDS6600._set, cmd, *args)
+
+    def _flush_input(self):
+        return self._call(JDS6600._flush_input)
+
+    def pipeline(self, window=8):
+        if not self._on_worker():
+            raise Exception('pipeline() can only be used from a job submitted to the I/O worker')
+        return super().pipeline(window)
+
+    def set_output(self, value, which=Channel.BOTH):
+        # Turning outputs off goes ahead of everything else that is queued
+        priority = Priority.URGENT if value == Output.OFF else None
+        return self._call(JDS6600.set_output, value, which, priority=priority)
+
+
+def _threaded(name):
+    func = getattr(JDS6600, name)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        return self._call(func, *args, **kwargs)
+    return wrapper
+
+
+for _name in dir(JDS6600):
+    if _name.startswith(_METHOD_PREFIXES) and _name not in vars(ThreadedJDS6600):
+        setattr(ThreadedJDS6600, _name, _threaded(_name))
+
+
+__all__ = [
+    'Priority',
+    'ThreadedJDS6600',
+]
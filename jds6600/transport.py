@@ -0,0 +1,351 @@
+import abc
+import os
+import select
+import struct
+import time
+
+from .errors import TransportError
+
+
+# A transport is the byte stream JDS6600 talks to the device over.  They all
+# have the part of the serial.Serial interface that JDS6600 uses: write(),
+# readline(), read(), in_waiting, close(), is_open and the timeout and
+# write_timeout attributes (seconds, None waits forever).  readline() returns
+# an incomplete line (without b'\n') if the timeout expires first.
+#
+# The port decides which transport is used unless one is given:
+#   tcp://host:port       TcpTransport, e.g. ser2net in raw mode
+#   rfc2217://host:port   SerialTransport, pyserial's RFC 2217 client
+#   socket://host:port    SerialTransport, pyserial's raw socket client
+#   anything else         SerialTransport
+#
+# FdTransport ('fd') drives a local serial port or pty directly with termios
+# and select() which avoids most of the pyserial overhead.  It only works on
+# POSIX systems, the POSIX only modules are imported when it is used so the
+# package still imports everywhere.
+
+_TCP_PREFIX = 'tcp://'
+
+
+class Transport(abc.ABC):
+    def __init__(self, timeout=0.5, write_timeout=0.5, read_size=4096):
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+
+        # Largest number of bytes fetched from the OS at once
+        self.read_size = read_size
+        self._rx = bytearray()
+
+    @property
+    @abc.abstractmethod
+    def is_open(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        return len(self._rx) + self._pending()
+
+    def _pending(self):
+        # Bytes received by the OS that haven't been read yet
+        return 0
+
+    @abc.abstractmethod
+    def _read_some(self, timeout):
+        # Returns the bytes that are available (up to read_size) after
+        # waiting at most timeout seconds for any to arrive, b'' on timeout
+        pass
+
+    @abc.abstractmethod
+    def write(self, data):
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    def _remaining(self, deadline):
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    def readline(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        # Only the newly received bytes need to be searched
+        start = 0
+        while True:
+            idx = self._rx.find(b'\n', start)
+            if idx >= 0:
+                line = bytes(self._rx[:idx + 1])
+                del self._rx[:idx + 1]
+                return line
+
+            start = len(self._rx)
+            remaining = self._remaining(deadline)
+            if remaining == 0.0:
+                break
+            self._rx += self._read_some(remaining)
+
+        line = bytes(self._rx)
+        self._rx.clear()
+        return line
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while len(self._rx) < size:
+            remaining = self._remaining(deadline)
+            if remaining == 0.0:
+                break
+            self._rx += self._read_some(remaining)
+
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+
+class SerialTransport(Transport):
+    # pyserial, through serial_for_url() so its URL handlers (rfc2217://,
+    # socket://, loop://, ...) work as well as plain port names
+    def __init__(self, port, baudrate=115200, timeout=0.5, write_timeout=0.5, read_size=4096, **kwargs):
+        import serial
+        self._serial = serial.serial_for_url(port, baudrate=baudrate, timeout=timeout, write_timeout=write_timeout, **kwargs)
+        super().__init__(timeout, write_timeout, read_size)
+
+    # Timeout changes go straight to the port
+    @property
+    def timeout(self):
+        return self._serial.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._serial.timeout = value
+
+    @property
+    def write_timeout(self):
+        return self._serial.write_timeout
+
+    @write_timeout.setter
+    def write_timeout(self, value):
+        self._serial.write_timeout = value
+
+    @property
+    def is_open(self):
+        return self._serial.is_open
+
+    def _pending(self):
+        return self._serial.in_waiting
+
+    def _read_some(self, timeout):
+        # serial.readline() reads one byte at a time, instead wait for the
+        # first byte (with the port timeout) and then take everything that
+        # has arrived
+        data = self._serial.read(1)
+        if data:
+            waiting = min(self._serial.in_waiting, self.read_size)
+            if waiting:
+                data += self._serial.read(waiting)
+        return data
+
+    def readline(self):
+        # The port timeout applies to each wait for more data
+        start = 0
+        while True:
+            idx = self._rx.find(b'\n', start)
+            if idx >= 0:
+                line = bytes(self._rx[:idx + 1])
+                del self._rx[:idx + 1]
+                return line
+
+            start = len(self._rx)
+            data = self._read_some(None)
+            if not data:
+                break
+            self._rx += data
+
+        line = bytes(self._rx)
+        self._rx.clear()
+        return line
+
+    def read(self, size=1):
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        if len(data) < size:
+            data += self._serial.read(size - len(data))
+        return data
+
+    def write(self, data):
+        return self._serial.write(data)
+
+    def close(self):
+        self._serial.close()
+
+
+class _SelectTransport(Transport):
+    # Shared parts of the transports that wait for data with select()
+    @abc.abstractmethod
+    def _fileno(self):
+        pass
+
+    @abc.abstractmethod
+    def _recv(self, size):
+        pass
+
+    @abc.abstractmethod
+    def _send(self, data):
+        pass
+
+    def _pending(self):
+        import fcntl
+        import termios
+        buf = fcntl.ioctl(self._fileno(), termios.FIONREAD, b'\0\0\0\0')
+        return struct.unpack('i', buf)[0]
+
+    def _read_some(self, timeout):
+        ready, _, _ = select.select([self._fileno()], [], [], timeout)
+        if not ready:
+            return b''
+        try:
+            data = self._recv(self.read_size)
+        except BlockingIOError:
+            return b''
+        if not data:
+            raise TransportError('Connection closed by the device')
+        return data
+
+    def write(self, data):
+        deadline = None if self.write_timeout is None else time.monotonic() + self.write_timeout
+        view = memoryview(data)
+        while view:
+            try:
+                written = self._send(view)
+            except BlockingIOError:
+                written = 0
+            view = view[written:]
+            if not view:
+                break
+
+            _, ready, _ = select.select([], [self._fileno()], [], self._remaining(deadline))
+            if not ready:
+                raise TransportError('Write timeout')
+        return len(data)
+
+
+class FdTransport(_SelectTransport):
+    # Local serial port (or pty) opened with os.open() and set up with
+    # termios, reads and writes are plain os.read()/os.write() calls
+    def __init__(self, port, baudrate=115200, timeout=0.5, write_timeout=0.5, read_size=4096, bytesize=8, parity='N', stopbits=1):
+        import termios
+        import tty
+
+        super().__init__(timeout, write_timeout, read_size)
+
+        # termios settings for the pyserial style options (pyserial itself
+        # isn't needed for this transport, its constants are the plain
+        # values used here)
+        bytesizes = {5: termios.CS5, 6: termios.CS6, 7: termios.CS7, 8: termios.CS8}
+        parities = {
+            'N': 0,
+            'E': termios.PARENB,
+            'O': termios.PARENB | termios.PARODD,
+        }
+        if bytesize not in bytesizes or parity not in parities or stopbits not in (1, 2):
+            raise ValueError(f'Unsupported port settings: {bytesize}{parity}{stopbits}')
+        speed = getattr(termios, f'B{baudrate}', None)
+        if speed is None:
+            raise ValueError(f'Unsupported baudrate: {baudrate}')
+
+        self._fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(self._fd)
+            iflag, oflag, cflag, lflag, _, _, cc = termios.tcgetattr(self._fd)
+            cflag &= ~(termios.CSIZE | termios.PARENB | termios.PARODD | termios.CSTOPB | getattr(termios, 'CRTSCTS', 0))
+            cflag |= termios.CLOCAL | termios.CREAD | bytesizes[bytesize] | parities[parity]
+            if stopbits == 2:
+                cflag |= termios.CSTOPB
+            iflag &= ~(termios.IXON | termios.IXOFF | termios.IXANY)
+            termios.tcsetattr(self._fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, speed, speed, cc])
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    @property
+    def is_open(self):
+        return self._fd is not None
+
+    def _fileno(self):
+        return self._fd
+
+    def _recv(self, size):
+        return os.read(self._fd, size)
+
+    def _send(self, data):
+        return os.write(self._fd, data)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class TcpTransport(_SelectTransport):
+    # Device behind a serial-over-TCP bridge that passes the bytes through
+    # unchanged (ser2net raw mode, most WiFi/Ethernet serial adapters).  port
+    # is "tcp://host:port" or just "host:port".
+    def __init__(self, port, timeout=0.5, write_timeout=0.5, read_size=4096, connect_timeout=5.0, **kwargs):
+        super().__init__(timeout, write_timeout, read_size)
+        address = port[len(_TCP_PREFIX):] if port.startswith(_TCP_PREFIX) else port
+        host, _, tcp_port = address.rpartition(':')
+        if not host or not tcp_port.isdigit():
+            raise ValueError(f'Invalid TCP address: {port}, should be tcp://host:port')
+
+        # The serial port options (baudrate, ...) are set up on the bridge
+        import socket
+        self._sock = socket.create_connection((host.strip('[]'), int(tcp_port)), connect_timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.setblocking(False)
+
+    @property
+    def is_open(self):
+        return self._sock is not None
+
+    def _fileno(self):
+        return self._sock.fileno()
+
+    def _recv(self, size):
+        return self._sock.recv(size)
+
+    def _send(self, data):
+        return self._sock.send(data)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+TRANSPORTS = {
+    'serial': SerialTransport,
+    'fd': FdTransport,
+    'tcp': TcpTransport,
+}
+
+
+def open_transport(port, transport=None, **kwargs):
+    # transport is one of the TRANSPORTS names, a Transport class (or any
+    # callable with the same arguments), or None to pick one from the port
+    if transport is None:
+        transport = 'tcp' if port.startswith(_TCP_PREFIX) else 'serial'
+    if isinstance(transport, str):
+        if transport not in TRANSPORTS:
+            raise ValueError(f'Unknown transport: {transport}, should be one of {", ".join(TRANSPORTS)}')
+        transport = TRANSPORTS[transport]
+    return transport(port, **kwargs)
+
+
+__all__ = [
+    'FdTransport',
+    'SerialTransport',
+    'TcpTransport',
+    'Transport',
+    'open_transport',
+]
@@ -0,0 +1,49 @@
+from .types import *
+from .cache import _UNCACHEABLE, _normalize
+from .errors import VerificationError
+
+
+class WriteVerifier:
+    # Collects the register values written inside a JDS6600.verify() block
+    # and compares them with what the device reports afterwards.  Only the
+    # last write to each register counts, and registers that trigger actions
+    # or hold measurements are not verified.
+    def __init__(self):
+        # Command -> expected value, in the same form _get() returns it
+        self.expected = {}
+        # (Command, expected, actual) for every register that didn't match
+        self.mismatches = []
+
+    def record(self, cmd, args):
+        if int(cmd) not in _UNCACHEABLE:
+            self.expected[Command(cmd)] = _normalize(args)
+
+    def check(self, dev):
+        # Reads all of the recorded registers back in one pipelined pass (or
+        # as part of the pipeline that is already active) and returns the
+        # mismatches.  The reads always go to the device, the register cache
+        # is refreshed with the values that were read.
+        with dev.pipeline() as p:
+            pending = []
+            for cmd, expected in self.expected.items():
+                read_cmd = dev._read_cmd(cmd)
+                if dev.cache is not None:
+                    dev.cache.invalidate(read_cmd)
+                pending.append((cmd, expected, p.get(read_cmd)))
+
+        self.mismatches = []
+        for cmd, expected, req in pending:
+            actual = req.result()
+            if actual != expected:
+                self.mismatches.append((cmd, expected, actual))
+        return self.mismatches
+
+    def raise_errors(self):
+        if self.mismatches:
+            raise VerificationError(self.mismatches)
+        return self
+
+
+__all__ = [
+    'WriteVerifier',
+]
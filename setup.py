@@ -11,6 +11,12 @@ setup(
     name='jds6600',
     packages=find_packages(),
     install_requires=required,
+    extras_require={
+        'numpy': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': ['jds6600=jds6600.cli:main'],
+    },
     version=__version__ ,
     python_requires='>=3.8',
 )
@@ -0,0 +1,23 @@
+import asyncio
+
+from jds6600 import AsyncJDS6600, Channel, Command, Waveform
+from jds6600.sim import Simulator
+
+
+def test_concurrent_commands_get_their_own_responses():
+    async def run(port):
+        async with await AsyncJDS6600.connect(port=port) as dev:
+            await dev.set_config(waveform=Waveform.SQUARE, frequency=2500, amplitude=1.5, which=Channel.CH2)
+            return await asyncio.gather(
+                dev.get_frequency(Channel.CH2),
+                dev.get_waveform(Channel.CH2),
+                dev.get_amplitude(Channel.CH2),
+                dev.get_frequency(Channel.CH1),
+                *[dev.set_offset(i / 10, Channel.CH1) for i in range(5)],
+            )
+
+    with Simulator(latency=0.002) as sim:
+        results = asyncio.run(run(sim.port))
+        assert results[:4] == [2500.0, Waveform.SQUARE, 1.5, 1000.0]
+        assert sim.registers[Command.WAVEFORM_CH2] == (Waveform.SQUARE,)
+        assert sim.registers[Command.OFFSET_CH1] == (1040,)
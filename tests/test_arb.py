@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from jds6600 import JDS6600, Waveform, arb_slot, prepare_arbitrary
+from jds6600.arb import encode_arbitrary, parse_arbitrary
+from jds6600.sim import Simulator
+
+
+def test_prepare_and_encode():
+    assert arb_slot(5) == 5
+    assert arb_slot(Waveform.ARBITRARY_1) == 1
+    with pytest.raises(ValueError):
+        arb_slot(61)
+
+    data = prepare_arbitrary([-2.0, 0.0, 1.0])
+    assert data.dtype == np.uint16 and data.size == 2048
+    assert data[0] == 0 and data[-1] == 4095
+    raw = np.arange(2048, dtype=np.uint16)
+    assert (prepare_arbitrary(raw) == raw).all()
+    with pytest.raises(ValueError):
+        prepare_arbitrary(np.full(2048, 5000))
+
+    cmd = encode_arbitrary(7, raw)
+    assert cmd.startswith(b':a07=0,1,2,') and cmd.endswith(b',2047.\r\n')
+    assert (parse_arbitrary(cmd[5:-3].decode()) == raw).all()
+    assert parse_arbitrary('1,2,3') is None
+
+
+def test_upload_download_round_trip():
+    samples = np.sin(np.linspace(0, 2 * np.pi, 300))
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            assert dev.upload_arbitrary(2, samples)
+            assert sim.arbitrary[2] == tuple(prepare_arbitrary(samples))
+
+            # Same content, nothing sent
+            sent = sim.commands
+            assert not dev.upload_arbitrary(2, samples)
+            assert sim.commands == sent
+            assert dev.upload_arbitrary(2, samples, force=True)
+
+            assert (dev.download_arbitrary(Waveform.ARBITRARY_2) == prepare_arbitrary(samples)).all()
+        finally:
+            dev.close()
@@ -0,0 +1,28 @@
+import numpy as np
+
+from jds6600 import JDS6600, WaveformLibrary, arbitrary_hash, prepare_arbitrary
+from jds6600.sim import Simulator
+
+
+def test_uploads_are_remembered_across_sessions(tmp_path):
+    samples = np.sin(np.linspace(0, 2 * np.pi, 500))
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            dev.use_waveform_library(WaveformLibrary(tmp_path))
+            assert dev.upload_arbitrary(3, samples)
+        finally:
+            dev.close()
+
+        # A new session with a new library object, nothing saved explicitly
+        lib = WaveformLibrary(tmp_path)
+        digest = arbitrary_hash(prepare_arbitrary(samples))
+        assert lib.find(1234567890, digest) == 3
+        assert (lib.get(digest) == sim.arbitrary[3]).all()
+
+        dev = JDS6600(port=sim.port)
+        try:
+            dev.use_waveform_library(lib)
+            assert not dev.upload_arbitrary(3, samples)
+        finally:
+            dev.close()
@@ -0,0 +1,18 @@
+import json
+
+from jds6600 import bench
+
+
+def test_summary_percentiles():
+    summary = bench._summarize([i / 100 for i in range(1, 101)])
+    assert summary['count'] == 100
+    assert summary['min'] == 0.01 and summary['max'] == 1.0
+    assert summary['p50'] == 0.5 and summary['p99'] == 0.99
+
+
+def test_every_benchmark_runs(tmp_path):
+    output = tmp_path / 'results.json'
+    bench.main(['-n', '3', '--latency', '0', '-o', str(output)])
+    results = json.loads(output.read_text())
+    assert sorted(results['benchmarks']) == sorted(bench.BENCHMARKS)
+    assert results['iterations'] == 3
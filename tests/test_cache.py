@@ -0,0 +1,44 @@
+import time
+
+from jds6600 import JDS6600, Channel, Command, RegisterCache, Waveform
+from jds6600.sim import Simulator
+
+
+def test_ttl_and_uncacheable_registers():
+    cache = RegisterCache({Command.AMPLITUDE_CH1: 0.05})
+    cache.update(Command.FREQUENCY_CH1, (100000, 0))
+    cache.update(Command.AMPLITUDE_CH1, (1000,))
+    cache.update(Command.PROFILE_SAVE, (3,))
+    assert cache.lookup(Command.FREQUENCY_CH1) == (True, (100000, 0))
+    assert cache.lookup(Command.AMPLITUDE_CH1) == (True, 1000)
+    assert cache.lookup(Command.PROFILE_SAVE) == (False, None)
+
+    time.sleep(0.06)
+    assert cache.lookup(Command.AMPLITUDE_CH1) == (False, None)
+    assert cache.lookup(Command.FREQUENCY_CH1) == (True, (100000, 0))
+
+    assert cache.unchanged(Command.FREQUENCY_CH1, (100000.0, 0))
+    assert not cache.unchanged(Command.FREQUENCY_CH1, (200000, 0))
+
+    cache.update(Command.PROFILE_LOAD, (1,))
+    assert cache.lookup(Command.FREQUENCY_CH1) == (False, None)
+
+
+def test_cached_reads_and_skipped_writes_stay_off_the_wire():
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port, cache=True)
+        try:
+            dev.set_waveform(Waveform.SQUARE, Channel.CH1)
+            sent = sim.commands
+            dev.set_waveform(Waveform.SQUARE, Channel.CH1)
+            assert dev.get_waveform(Channel.CH1) == Waveform.SQUARE
+            assert sim.commands == sent
+            assert dev.cache.stats()['skipped_writes'] == 1
+
+            # Changed behind the cache's back, only seen once invalidated
+            sim.registers[Command.WAVEFORM_CH1] = (Waveform.SINE,)
+            assert dev.get_waveform(Channel.CH1) == Waveform.SQUARE
+            dev.cache.invalidate(Command.WAVEFORM_CH1)
+            assert dev.get_waveform(Channel.CH1) == Waveform.SINE
+        finally:
+            dev.close()
@@ -0,0 +1,49 @@
+import pytest
+
+from jds6600 import (JDS6600, Channel, Command, FrequencyCalibration, calibrate, calibration_path,
+                     load_calibration)
+from jds6600.sim import Simulator
+
+
+def test_interpolation_and_save(tmp_path):
+    cal = FrequencyCalibration([(1000, 1.002), (10, 1.001)], serial_number=42)
+    assert cal.frequencies == (10.0, 1000.0)
+    assert cal.ratio(1) == 1.001 and cal.ratio(1e6) == 1.002
+    assert cal.ratio(100) == pytest.approx(1.0015)
+    assert cal.uncorrect(cal.correct(500)) == pytest.approx(500)
+    assert cal.correct(0) == 0
+
+    path = str(tmp_path / 'cal.json')
+    cal.save(path)
+    loaded = FrequencyCalibration.load(path)
+    assert (loaded.frequencies, loaded.ratios, loaded.serial_number) == (cal.frequencies, cal.ratios, 42)
+
+    with pytest.raises(ValueError):
+        FrequencyCalibration([])
+    with pytest.raises(ValueError):
+        FrequencyCalibration([(100, 0)])
+
+
+def test_calibrate_against_the_simulator(tmp_path):
+    with Simulator(clock_error=0.001) as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            before = dict(sim.registers)
+            cal = calibrate(dev, frequencies=(100, 10000), settle=0, samples=2, interval=0, directory=tmp_path)
+            assert cal.ratios == pytest.approx((1.001, 1.001), abs=1e-6)
+            # Settings are put back
+            assert sim.registers[Command.FREQUENCY_CH1] == before[Command.FREQUENCY_CH1]
+            assert sim.registers[Command.CHANNEL_ENABLE] == before[Command.CHANNEL_ENABLE]
+
+            assert (tmp_path / '1234567890.json').exists()
+            assert calibration_path(1234567890, tmp_path) == str(tmp_path / '1234567890.json')
+            assert load_calibration(1234567890, tmp_path).ratios == cal.ratios
+            assert load_calibration(1, tmp_path) is None
+
+            # Calibrated frequencies come out right on the counter
+            assert dev.use_calibration(directory=tmp_path) is not None
+            dev.set_frequency(1000, Channel.CH1)
+            assert sim.registers[Command.FREQUENCY_CH1] != (100000, 0)
+            assert dev.get_frequency(Channel.CH1) == pytest.approx(1000)
+        finally:
+            dev.close()
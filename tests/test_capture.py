@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from jds6600 import JDS6600, Channel, Command, CaptureWriter, read_capture, replay_capture
+from jds6600.capture import RX, TX
+from jds6600.replay import main
+from jds6600.sim import Simulator
+
+
+def _record_session(sim, path):
+    dev = JDS6600(port=sim.port, capture=path)
+    try:
+        dev.set_frequency(2000, Channel.CH1)
+        with dev.pipeline():
+            for _ in range(5):
+                dev.get_amplitude(Channel.CH1)
+    finally:
+        dev.close()
+
+
+def test_capture_log(tmp_path):
+    path = str(tmp_path / 'raw.jdscap')
+    with CaptureWriter(path) as writer:
+        writer.record(TX, b':r15=0.\r\n')
+        writer.record(RX, b'')
+        writer.record(RX, b':r15=5000.\r\n')
+    assert writer.records == 2
+    assert [(d, data) for _, d, data in read_capture(path)] == [(TX, b':r15=0.\r\n'), (RX, b':r15=5000.\r\n')]
+
+    # A truncated record at the end is dropped
+    with open(path, 'ab') as f:
+        f.write(b'\x01\x02')
+    assert len(list(read_capture(path))) == 2
+
+    (tmp_path / 'other').write_bytes(b'hello')
+    with pytest.raises(ValueError):
+        list(read_capture(str(tmp_path / 'other')))
+
+
+def test_replay_matches_the_capture(tmp_path):
+    path = str(tmp_path / 'run.jdscap')
+    with Simulator() as sim:
+        _record_session(sim, path)
+
+    records = list(read_capture(path))
+    assert b''.join(data for _, d, data in records if d == TX).count(b'\n') == 6
+
+    # In-process and through the pty, both against a fresh device
+    result = replay_capture(path, Simulator(), speed=None)
+    assert result.commands == 6 and result.mismatches() == []
+    with Simulator() as sim:
+        result = replay_capture(path, sim.port, speed=None)
+    assert result.mismatches() == [] and result.timeouts == 0
+
+    # A device with different settings gives different answers
+    sim = Simulator()
+    sim.registers[Command.AMPLITUDE_CH1] = (1000,)
+    result = replay_capture(path, sim, speed=None)
+    assert len(result.mismatches()) == 5
+
+
+def test_replay_cli(tmp_path, capsys):
+    path = str(tmp_path / 'run.jdscap')
+    with Simulator() as sim:
+        _record_session(sim, path)
+
+    main(['replay', path, '--speed', 'max', '--in-process'])
+    summary = json.loads(capsys.readouterr().out)
+    assert summary['commands'] == 6 and summary['mismatches'] == 0
+
+    main(['dump', path])
+    assert capsys.readouterr().out.count(' TX ') >= 2
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from jds6600 import JDS6600, Channel, Command, Waveform
+from jds6600.cli import CommandError, format_result, main, parse_command, run_batch
+from jds6600.sim import Simulator
+
+
+def test_parse_command():
+    assert parse_command('set_frequency 1000 CH1') == ('set_frequency', (1000, Channel.CH1), {})
+    assert parse_command('set_waveform square which=1') == ('set_waveform', (Waveform.SQUARE,), {'which': Channel.CH2})
+    assert parse_command('set_config frequency=2.5 output=ON # comment')[2]['frequency'] == 2.5
+    assert parse_command('  # just a comment') is None
+    for line in ('reboot', 'set_waveform TRIANGLEISH', 'set_frequency 1 CH1 2',
+                 'set_frequency value=1 CH1', 'set_frequency speed=1'):
+        with pytest.raises(CommandError):
+            parse_command(line)
+
+
+def test_format_result():
+    assert format_result(None) is None
+    assert format_result((1000.0, 2000.0)) == '1000.0 2000.0'
+    assert format_result(Waveform.SINE, as_json=True) == '"SINE"'
+    assert format_result([{'a': 1}, {'a': 2}]) == 'a=1\na=2'
+
+
+def test_batch_and_main(tmp_path, capsys):
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            lines = ['set_waveform SQUARE CH1', '# comment', 'set_frequency 2500 CH1', 'get_waveform CH1']
+            assert run_batch(dev, lines) == 3
+            assert capsys.readouterr().out == 'SQUARE\n'
+            assert sim.registers[Command.FREQUENCY_CH1] == (250000, 0)
+
+            with pytest.raises(CommandError, match='line 2'):
+                run_batch(dev, ['get_waveform CH1', 'bogus'])
+            assert capsys.readouterr().out == ''
+        finally:
+            dev.close()
+
+        assert main(['--port', sim.port, '--json', 'get_frequency', 'CH1']) == 0
+        assert json.loads(capsys.readouterr().out) == 2500.0
+
+        batch = tmp_path / 'setup.txt'
+        batch.write_text('set_amplitude 1.5 CH1\nget_amplitude CH1\n')
+        assert main(['--port', sim.port, 'batch', str(batch)]) == 0
+        assert capsys.readouterr().out == '1.5\n'
+
+        assert main(['--port', sim.port, 'set_frequency', 'x']) == 1
+        assert 'error' in capsys.readouterr().err
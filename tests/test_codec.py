@@ -0,0 +1,41 @@
+import pytest
+
+from jds6600 import CommandMismatchError, ProtocolError, ResponseFormatError
+from jds6600.codec import (CommandEncoder, answers, encode_command, is_response, parse_read,
+                           parse_write, resync)
+
+
+def test_encode():
+    enc = CommandEncoder()
+    assert enc.read(23) == b':r23=0.\r\n'
+    assert bytes(enc.write(13, (100000, 0))) == b':w13=100000,0.\r\n'
+    assert bytes(enc.write(20, (123456,))) == b':w20=123456.\r\n'
+    assert encode_command('r', 23, ()) == b':r23=0.\r\n'
+    assert encode_command('w', 13, (100000, 0)) == b':w13=100000,0.\r\n'
+    assert encode_command('r', 5, (1, 2)) == b':r05=1,2.\r\n'
+
+
+def test_parse():
+    cmd = b':r13=0.\r\n'
+    assert parse_read(13, cmd, b':r13=100000,0.') == (100000, 0)
+    assert parse_read(15, cmd, b':r15=5000.') == 5000
+    with pytest.raises(CommandMismatchError):
+        parse_read(13, cmd, b':r14=5000.')
+    with pytest.raises(ResponseFormatError):
+        parse_read(13, cmd, b':r13=abc.')
+    with pytest.raises(ProtocolError):
+        parse_read(13, cmd, b':err')
+    parse_write(13, b':w13=1.\r\n', b':ok')
+    with pytest.raises(ProtocolError):
+        parse_write(13, b':w13=1.\r\n', b':err')
+
+
+def test_resync_and_answers():
+    assert resync(b'\x00\xff:r13=5.') == b':r13=5.'
+    assert resync(b':ok') == b':ok'
+    assert is_response(b':ok') and is_response(b':r13=5.')
+    assert not is_response(b'garbage')
+    assert answers(b':r13=0.\r\n', b':r13=5.')
+    assert not answers(b':r13=0.\r\n', b':r14=5.')
+    assert answers(b':w13=1.\r\n', b':ok')
+    assert answers(b':a01=1,2.\r\n', b':ok')
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from jds6600 import JDS6600, Channel, Command, VerificationError
+from jds6600.daemon import JDS6600Client, JDS6600Server, _error_response
+from jds6600.sim import Simulator
+
+
+@pytest.fixture
+def server(tmp_path):
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        server = JDS6600Server(dev, str(tmp_path / 'jds6600.sock'))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
+            dev.close()
+
+
+def test_running_server_socket_is_not_replaced(server):
+    with pytest.raises(OSError):
+        JDS6600Server(server.dispatcher.dev, server.socket_path)
+    with JDS6600Client(server.socket_path) as client:
+        assert client.get_frequency(Channel.CH1) == 1000.0
+
+
+def test_request_that_is_not_an_object_gets_an_error(server):
+    with JDS6600Client(server.socket_path) as client:
+        client._file.write(b'[1, 2]\n')
+        client._file.flush()
+        assert b'"error"' in client._file.readline()
+        assert client.get_frequency(Channel.CH1) == 1000.0
+
+
+def test_verification_error_keeps_its_mismatches():
+    mismatches = [(Command.FREQUENCY_CH1, (100000, 0), (200000, 0))]
+    error = JDS6600Client._error(_error_response(1, VerificationError(mismatches))['error'])
+    assert isinstance(error, VerificationError)
+    assert error.mismatches == mismatches
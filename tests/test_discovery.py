@@ -0,0 +1,43 @@
+from jds6600 import Command, DiscoveryCache, find_device, find_devices
+from jds6600 import discovery
+from jds6600.sim import Simulator
+
+
+def test_scans_are_cached_until_a_port_goes_away(tmp_path, monkeypatch):
+    path = str(tmp_path / 'devices.json')
+    with Simulator() as a, Simulator() as b:
+        scans = []
+        def scan():
+            scans.append(1)
+            return [a.port, b.port]
+        monkeypatch.setattr(discovery, 'scan_devices', scan)
+
+        assert find_devices(DiscoveryCache(path)) == [a.port, b.port]
+        assert find_devices(DiscoveryCache(path)) == [a.port, b.port]
+        assert len(scans) == 1
+        assert find_devices(False) == [a.port, b.port]
+        assert len(scans) == 2
+
+        # The serial numbers are read once and remembered
+        b.registers[Command.SERIAL_NUMBER] = (7,)
+        assert find_device(7, DiscoveryCache(path)) == b.port
+        sent = a.commands + b.commands
+        cache = DiscoveryCache(path)
+        assert find_device(7, cache) == b.port
+        assert a.commands + b.commands == sent
+        assert cache.serial_number(a.port) == 1234567890
+        assert find_device(12345, cache) is None
+
+    # Both pty nodes are gone
+    cache = DiscoveryCache(path)
+    assert not cache.valid()
+    assert cache.ports() is None and cache.find(7) is None
+
+
+def test_unreadable_cache_file(tmp_path):
+    path = tmp_path / 'devices.json'
+    path.write_text('not json')
+    cache = DiscoveryCache(str(path))
+    assert not cache.valid()
+    cache.update([])
+    assert DiscoveryCache(str(path)).ports() == []
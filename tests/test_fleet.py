@@ -0,0 +1,26 @@
+from jds6600 import Command, DiscoveryCache, Fleet, Output
+from jds6600.sim import Simulator
+
+
+def test_discover_reports_duplicates_and_failures(tmp_path):
+    with Simulator() as a, Simulator() as b, Simulator() as c:
+        c.registers[Command.SERIAL_NUMBER] = (7,)
+        ports = [a.port, b.port, c.port]
+        cache = DiscoveryCache(str(tmp_path / 'devices.json'))
+        cache.update(ports)
+
+        fleet = Fleet.discover(ports + [str(tmp_path / 'missing')], cache=cache)
+        try:
+            assert sorted(fleet.devices) == [7, 1234567890]
+            assert fleet.devices[1234567890]._args['port'] == a.port
+            assert sorted(fleet.errors) == sorted([b.port, str(tmp_path / 'missing')])
+            assert 'Duplicate' in str(fleet.errors[b.port])
+
+            assert cache.serial_number(a.port) == 1234567890
+            assert cache.serial_number(c.port) == 7
+            assert cache.find(7) == c.port
+
+            assert fleet.set_output(Output.ON).ok
+            assert a.registers[Command.CHANNEL_ENABLE] == (1, 1)
+        finally:
+            fleet.close()
@@ -0,0 +1,23 @@
+import numpy as np
+
+from jds6600 import Frequency, FrequencyPlanner, plan_frequency
+
+
+def test_plan_frequency():
+    assert plan_frequency(1000) == (100000, Frequency.Hz)
+    assert plan_frequency(1.1) == (110, Frequency.Hz)
+    assert plan_frequency(1.001) == (100100, Frequency.mHz)
+    # Finer than uHz, rounded
+    assert plan_frequency(0.123456789) == (12345679, Frequency.uHz)
+    # Only the Hz unit above 80 kHz
+    assert plan_frequency(1000000.001) == (100000000, Frequency.Hz)
+
+
+def test_planner_matches_plan_frequency():
+    freqs = np.concatenate([np.linspace(0.001, 100, 997), np.linspace(79000, 81000, 101)])
+    planner = FrequencyPlanner()
+    assert planner.pairs(freqs) == [plan_frequency(f) for f in freqs.tolist()]
+
+    values, units = planner.plan(freqs)
+    assert not values.flags.writeable
+    assert planner.plan(freqs.copy())[0] is values
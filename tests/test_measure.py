@@ -0,0 +1,28 @@
+import numpy as np
+
+from jds6600 import JDS6600, Command, MeasurementRing, MeasurementStream
+from jds6600.sim import Simulator
+
+
+def test_ring_wraps_around_in_order():
+    ring = MeasurementRing([Command.MEASURE_FREQ_1000HZ], capacity=4)
+    for i in range(6):
+        ring.append(float(i), [i * 1000])
+    timestamps, values = ring.arrays()
+    assert list(timestamps) == [2.0, 3.0, 4.0, 5.0]
+    assert list(ring.scaled(Command.MEASURE_FREQ_1000HZ)) == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_stream_skips_failed_samples():
+    with Simulator(drop_rate=0.05, garbage_rate=0.05, seed=2) as sim:
+        dev = JDS6600(port=sim.port, timeout=0.05)
+        try:
+            stream = MeasurementStream(dev, [Command.MEASURE_FREQ_1000HZ, Command.MEASURE_PERIOD], capacity=50)
+            stream.run(count=200)
+        finally:
+            dev.close()
+    assert stream.ring.count == 200
+    assert stream.errors > 0
+    _, values = stream.ring.arrays()
+    assert len(values) == 50
+    assert np.all(values[:, 0] == sim.registers[Command.MEASURE_FREQ_1000HZ][0])
@@ -0,0 +1,52 @@
+from jds6600 import JDS6600, Channel, CommandMetrics, InstrumentationHook, VerboseHook
+from jds6600.sim import Simulator
+
+
+class _Recorder(InstrumentationHook):
+    def __init__(self):
+        self.events = []
+
+    def on_command(self, event):
+        self.events.append(event)
+
+
+def test_events_keep_their_command_bytes():
+    with Simulator() as sim:
+        recorder = _Recorder()
+        dev = JDS6600(port=sim.port, hooks=[recorder])
+        try:
+            dev.set_frequency(2000, Channel.CH1)
+            dev.set_amplitude(2, Channel.CH1)
+        finally:
+            dev.close()
+    assert [e.cmd_bytes for e in recorder.events] == [b':w23=200000,0.\r\n', b':w25=2000.\r\n']
+
+
+def test_verbose_can_be_switched(capsys):
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            dev.verbose = True
+            dev.verbose = True
+            assert sum(isinstance(h, VerboseHook) for h in dev.hooks) == 1
+            dev.get_frequency(Channel.CH1)
+            assert '[cmd] :r23=0.' in capsys.readouterr().out
+
+            dev.verbose = False
+            assert not dev.verbose
+            dev.get_frequency(Channel.CH1)
+            assert capsys.readouterr().out == ''
+        finally:
+            dev.close()
+
+
+def test_metrics_count_commands():
+    with Simulator() as sim:
+        metrics = CommandMetrics()
+        dev = JDS6600(port=sim.port, hooks=[metrics])
+        try:
+            for _ in range(3):
+                dev.get_frequency(Channel.CH1)
+        finally:
+            dev.close()
+    assert metrics.snapshot()['commands']['r23']['count'] == 3
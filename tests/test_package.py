@@ -0,0 +1,18 @@
+import subprocess
+import sys
+import types
+
+
+def test_star_import_exports_no_modules():
+    namespace = {}
+    exec('from jds6600 import *', namespace)
+    assert 'JDS6600' in namespace
+    assert not [name for name, value in namespace.items() if isinstance(value, types.ModuleType)]
+
+
+def test_heavy_modules_are_imported_lazily():
+    code = 'import sys; from jds6600 import *; print(sorted(m for m in ("asyncio", "socketserver", "jds6600.aio") if m in sys.modules))'
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == '[]'
+    from jds6600 import AsyncJDS6600
+    assert AsyncJDS6600.__module__ == 'jds6600.aio'
@@ -0,0 +1,51 @@
+import pytest
+
+from jds6600 import JDS6600, Command, ProtocolError, ResponseLostError
+from jds6600.sim import Simulator
+
+
+def test_results_and_window():
+    with Simulator(latency=0.005) as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            with dev.pipeline(window=4) as p:
+                writes = [p.set(Command.AMPLITUDE_CH1, 1000 + i) for i in range(10)]
+                assert len(p._inflight) <= 4
+                read = p.get(Command.AMPLITUDE_CH1)
+            assert read.result() == 1009
+            assert all(w.done and w.error() is None for w in writes)
+        finally:
+            dev.close()
+
+
+def test_lost_response_only_fails_its_own_command():
+    with Simulator() as sim:
+        handle = sim.handle
+        def drop_offset(line):
+            return None if line.startswith(b':r27=') else handle(line)
+        sim.handle = drop_offset
+
+        dev = JDS6600(port=sim.port)
+        try:
+            with dev.pipeline() as p:
+                before = p.get(Command.AMPLITUDE_CH1)
+                lost = p.get(Command.OFFSET_CH1)
+                after = p.get(Command.FREQUENCY_CH1)
+            assert before.result() == 5000
+            with pytest.raises(ResponseLostError):
+                lost.result()
+            assert after.result() == (100000, 0)
+        finally:
+            dev.close()
+
+
+def test_write_errors_are_raised_on_exit():
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            with pytest.raises(ProtocolError):
+                with dev.pipeline() as p:
+                    p.set(Command.PROFILE_SAVE, 120)
+            assert dev.get_frequency() == (1000.0, 1000.0)
+        finally:
+            dev.close()
@@ -0,0 +1,20 @@
+from jds6600 import JDS6600, Channel, Command, Waveform
+from jds6600.sim import Simulator
+
+
+# Writes queued in a pipeline are seen by the reads and writes queued after
+# them, even before their responses have arrived
+def test_queued_writes_are_seen_by_the_register_cache():
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port, cache=True)
+        try:
+            dev.set_waveform(Waveform.SINE, Channel.CH1)
+            with dev.pipeline():
+                dev.set_waveform(Waveform.SQUARE, Channel.CH1)
+                square = dev.get_waveform(Channel.CH1)
+                dev.set_waveform(Waveform.SINE, Channel.CH1)
+            assert square == Waveform.SQUARE
+            assert sim.registers[Command.WAVEFORM_CH1] == (Waveform.SINE,)
+            assert dev.get_waveform(Channel.CH1) == Waveform.SINE
+        finally:
+            dev.close()
@@ -0,0 +1,55 @@
+from jds6600 import JDS6600, Channel, Command, Output, ProfileLibrary
+from jds6600.sim import Simulator
+
+
+# Restoring leaves the outputs off unless asked for, and slots that already
+# hold the same profile aren't written again
+def test_restore_keeps_outputs_off_and_skips_matching_slots(tmp_path):
+    with Simulator() as src, Simulator() as dst:
+        dst.registers[Command.SERIAL_NUMBER] = (42,)
+        old = JDS6600(port=src.port)
+        new = JDS6600(port=dst.port)
+        try:
+            old.set_config(frequency=2000, output=Output.ON, which=Channel.CH1)
+            old.profile_save(5)
+            lib = ProfileLibrary(tmp_path)
+            lib.dump(old, slots=[0, 5])
+
+            serial = old.get_serial_number()
+            assert lib.restore(new, serial=serial) == 2
+            assert dst.profiles[5][Command.CHANNEL_ENABLE] == (0, 0)
+            assert lib.restore(new, serial=serial) == 0
+
+            assert lib.restore(new, serial=serial, slots=[5], outputs=True) == 1
+            assert dst.profiles[5] == src.profiles[5]
+        finally:
+            old.close()
+            new.close()
+
+
+# Dumping leaves the outputs off between the slot loads, whatever the
+# profiles hold, and puts the live settings back afterwards
+def test_dump_keeps_outputs_off(tmp_path):
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            for slot in (1, 2):
+                dev.set_config(frequency=1000 * slot, output=Output.ON, which=Channel.BOTH)
+                dev.profile_save(slot)
+            live = dev.get_state()
+
+            outputs = []
+            handle = sim.handle
+            def record(line):
+                if line.startswith(b':w%02d=' % Command.PROFILE_LOAD):
+                    outputs.append(sim.registers[Command.CHANNEL_ENABLE])
+                return handle(line)
+            sim.handle = record
+
+            lib = ProfileLibrary(tmp_path)
+            assert lib.dump(dev, slots=[0, 1, 2, 3]) == 4
+            assert outputs == [(0, 0)] * 4
+            assert lib.get(1234567890, 2).channel_enable == (Output.ON, Output.ON)
+            assert dev.get_state() == live
+        finally:
+            dev.close()
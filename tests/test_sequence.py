@@ -0,0 +1,36 @@
+import pytest
+
+from jds6600 import JDS6600, Channel, Command, FrequencyCalibration, Output, Sequence, SequencePlayer, Waveform
+from jds6600.sim import Simulator
+
+
+def test_only_changed_registers_are_written():
+    seq = Sequence([
+        {'waveform': Waveform.SQUARE, 'frequency': 1000, 'output': Output.ON},
+        {'frequency': 1000, 'amplitude': 2.0},
+        {'frequency': 2000, 'output': Output.OFF, 'dwell': 0.5},
+    ], dwell=0.1)
+    assert [cmd for cmd, _ in seq[1].writes] == [Command.AMPLITUDE_CH1, Command.AMPLITUDE_CH2]
+    assert seq[2].writes[0] == (Command.CHANNEL_ENABLE, (Output.OFF, Output.OFF))
+    assert seq[0].writes[-1] == (Command.CHANNEL_ENABLE, (Output.ON, Output.ON))
+    assert [step.dwell for step in seq] == [0.1, 0.1, 0.5]
+
+    with pytest.raises(ValueError):
+        Sequence([{'frequency': 1000, 'bogus': 1}])
+
+
+def test_playback_follows_the_device_calibration():
+    seq = Sequence([{'frequency': 1000}, {'frequency': 2000}], which=Channel.CH1)
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            player = SequencePlayer(dev, seq)
+            assert len(player.play()) == 2
+            assert sim.registers[Command.FREQUENCY_CH1] == (200000, 0)
+
+            dev.use_calibration(FrequencyCalibration([(1000, 1.25)]))
+            player.play()
+            assert sim.registers[Command.FREQUENCY_CH1] == (160000, 0)
+            assert dev.get_frequency(Channel.CH1) == pytest.approx(2000)
+        finally:
+            dev.close()
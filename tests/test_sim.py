@@ -0,0 +1,38 @@
+from jds6600 import JDS6600, Command
+from jds6600.sim import Simulator
+
+
+def test_protocol():
+    sim = Simulator()
+    assert sim.handle(b':r23=0.') == b':r23=100000,0.\r\n'
+    assert sim.handle(b':w23=250000,0.\r\n') == b':ok\r\n'
+    assert sim.registers[Command.FREQUENCY_CH1] == (250000, 0)
+    assert sim.handle(b'junk') == b':err\r\n'
+    assert sim.handle(b'') is None
+
+    assert sim.handle(b':w70=5.') == b':ok\r\n'
+    sim.handle(b':w23=1,0.')
+    assert sim.handle(b':w71=5.') == b':ok\r\n'
+    assert sim.registers[Command.FREQUENCY_CH1] == (250000, 0)
+    assert sim.handle(b':w70=200.') == b':err\r\n'
+
+
+def test_read_bug():
+    sim = Simulator()
+    sim.handle(b':w%02d=1.' % Command.SYSTEM_SYNC)
+    assert sim.handle(b':r%02d=0.' % (Command.SYSTEM_SYNC + 1)) == b':r%02d=1.\r\n' % (Command.SYSTEM_SYNC + 1)
+
+    sim = Simulator(read_bug=False)
+    sim.handle(b':w%02d=1.' % Command.SYSTEM_SYNC)
+    assert sim.handle(b':r%02d=0.' % Command.SYSTEM_SYNC) == b':r%02d=1.\r\n' % Command.SYSTEM_SYNC
+
+
+def test_pty_and_tcp_ports():
+    for kwargs in ({}, {'tcp': True}):
+        with Simulator(**kwargs) as sim:
+            dev = JDS6600(port=sim.port)
+            try:
+                assert dev.get_serial_number() == 1234567890
+                assert dev.get_arb_max_num() == sim.registers[Command.SYSTEM_ARB_MAX_NUM][0]
+            finally:
+                dev.close()
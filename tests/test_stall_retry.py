@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from jds6600 import JDS6600, AsyncJDS6600, JDS6600Error, Channel, Command
+from jds6600.sim import Simulator
+
+
+# A stalled response arrives after the read has timed out and been retried.
+# It must never be taken for the response to a later command.
+@pytest.mark.parametrize('seed', [3, 4])
+def test_stalled_responses_are_not_returned_by_later_reads(seed):
+    with Simulator(stall_rate=0.1, stall_time=0.2, seed=seed) as sim:
+        dev = JDS6600(port=sim.port, timeout=0.1)
+        try:
+            wrong = 0
+            for i in range(200):
+                try:
+                    dev.set_frequency(1000 + i, Channel.CH1)
+                except JDS6600Error:
+                    pass
+                try:
+                    value = dev.get_frequency(Channel.CH1)
+                except JDS6600Error:
+                    continue
+                wrong += value != sim.registers[Command.FREQUENCY_CH1][0] / 100
+        finally:
+            dev.close()
+    assert wrong == 0
+
+
+# The same for the asyncio interface: the late response to a timed out read
+# must not answer (or fail) the commands sent after it.
+def test_async_late_response_is_not_taken_by_later_commands():
+    async def run(sim):
+        dev = await AsyncJDS6600.connect(port=sim.port, timeout=0.1, retries=0)
+        try:
+            await dev.set_frequency(1000, Channel.CH1)
+            sim.stall_rate = 1.0
+            with pytest.raises(JDS6600Error):
+                await dev.get_frequency(Channel.CH1)
+            sim.stall_rate = 0.0
+            return await asyncio.gather(dev.set_frequency(2000, Channel.CH1), dev.get_frequency(Channel.CH1))
+        finally:
+            await dev.close()
+
+    with Simulator(stall_time=0.15) as sim:
+        assert asyncio.run(run(sim)) == [None, 2000.0]
+
+
+# Junk lines in front of a response are skipped, writes (which aren't
+# retried) don't fail because of them
+def test_junk_lines_do_not_fail_writes():
+    with Simulator(garbage_rate=0.2, seed=1) as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            for i in range(100):
+                dev.set_frequency(1000 + i, Channel.CH1)
+        finally:
+            dev.close()
+        assert sim.registers[Command.FREQUENCY_CH1] == (109900, 0)
+
+
+# A response that is really lost costs one extra round trip before the
+# retry, not another timeout
+def test_lost_response_is_not_waited_for():
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port, timeout=0.5)
+        try:
+            sim.drop_rate = 1.0
+            with pytest.raises(JDS6600Error):
+                dev.set_frequency(5, Channel.CH1)
+            sim.drop_rate = 0.0
+            start = time.monotonic()
+            assert dev.get_frequency(Channel.CH1) == 5.0
+            assert time.monotonic() - start < 0.25
+        finally:
+            dev.close()
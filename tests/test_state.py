@@ -0,0 +1,39 @@
+from jds6600 import JDS6600, Command, DeviceState, Output
+from jds6600.sim import Simulator
+
+
+def test_save_load_and_diff(tmp_path):
+    on = (Output.ON, Output.ON)
+    state = DeviceState(channel_enable=on, frequency_ch1=(100000, 0), amplitude_ch1=5000)
+    path = tmp_path / 'state.json'
+    state.save(path)
+    loaded = DeviceState.load(path)
+    assert loaded == state
+    assert loaded[Command.FREQUENCY_CH1] == (100000, 0)
+
+    # Outputs go off before the settings change and back on afterwards
+    current = DeviceState(channel_enable=(Output.ON, Output.OFF), frequency_ch1=(200000, 0),
+                          amplitude_ch1=5000)
+    assert state.diff(current) == [
+        (Command.FREQUENCY_CH1, (100000, 0)),
+        (Command.CHANNEL_ENABLE, on),
+    ]
+    current.channel_enable = on
+    assert state.diff(current) == [(Command.FREQUENCY_CH1, (100000, 0))]
+    assert state.diff(state) == []
+
+
+def test_restore_writes_only_changed_registers():
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            saved = dev.get_state()
+            sim.registers[Command.FREQUENCY_CH1] = (50000, 0)
+            sim.registers[Command.AMPLITUDE_CH1] = (1234,)
+            assert dev.get_state() != saved
+
+            assert dev.restore_state(saved) == 2
+            assert dev.get_state() == saved
+            assert dev.restore_state(saved) == 0
+        finally:
+            dev.close()
@@ -0,0 +1,34 @@
+import pytest
+
+from jds6600 import JDS6600, Channel, Command, SweepConfig, SweepDirection, SweepMode, UIMode
+from jds6600.sim import Simulator
+
+
+def test_sweep_config_registers():
+    config = SweepConfig(100, 2500.5, 12.3, SweepDirection.FALL, SweepMode.LOG)
+    assert config.to_registers() == [
+        (Command.SWEEP_START_FREQ, (10000, 0)),
+        (Command.SWEEP_END_FREQ, (250050, 0)),
+        (Command.SWEEP_TIME, (123,)),
+        (Command.SWEEP_DIRECTION, (SweepDirection.FALL,)),
+        (Command.SWEEP_MODE, (SweepMode.LOG,)),
+    ]
+    with pytest.raises(ValueError):
+        SweepConfig(100, 1000, 0).to_registers()
+
+
+def test_sweep_show_programs_the_sweep_and_restores_the_ui_mode():
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            config = SweepConfig(100, 1000, 2.5, SweepDirection.RISE, SweepMode.LOG)
+            dev.sweep_show(Channel.CH2, config)
+            assert dev.get_sweep() == config
+            assert dev.get_ui_mode() == UIMode.SWEEP_CH2
+            assert sim.registers[Command.ACTION] == (0, 0, 0, 0)
+
+            dev.sweep_show(Channel.CH1)
+            dev.sweep_hide()
+            assert dev.get_ui_mode() == UIMode.WAVE_CH1
+        finally:
+            dev.close()
@@ -0,0 +1,61 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from jds6600 import Channel, Command, Output, Priority, ThreadedJDS6600
+from jds6600.capture import read_capture
+from jds6600.sim import Simulator
+
+
+def test_close_stops_the_worker_and_the_capture(tmp_path):
+    path = str(tmp_path / 'run.jdscap')
+    with Simulator() as sim:
+        dev = ThreadedJDS6600(port=sim.port, capture=path)
+        assert dev.get_frequency(Channel.CH1) == 1000.0
+        worker = dev._worker
+        dev.close()
+        assert not worker.is_alive()
+        assert dev._transport is None and dev._capture is None
+        dev.close()
+    assert len(list(read_capture(path))) == 2
+
+
+def test_jobs_run_in_priority_order():
+    with Simulator() as sim:
+        dev = ThreadedJDS6600(port=sim.port)
+        try:
+            release = threading.Event()
+            blocker = dev.submit(lambda d: release.wait(5))
+            order = []
+            futures = [dev.submit(lambda d, p=p: order.append(p), priority=p)
+                       for p in (Priority.BULK, Priority.NORMAL, Priority.URGENT, Priority.NORMAL)]
+            off = dev.submit('set_output', Output.OFF, Channel.CH1, priority=Priority.URGENT)
+            release.set()
+            for f in futures + [blocker, off]:
+                f.result(5)
+            assert order == [Priority.URGENT, Priority.NORMAL, Priority.NORMAL, Priority.BULK]
+        finally:
+            dev.close()
+
+
+def test_threads_share_the_device():
+    with Simulator() as sim:
+        dev = ThreadedJDS6600(port=sim.port)
+        try:
+            with pytest.raises(Exception):
+                dev.pipeline()
+
+            def job(d):
+                with d.pipeline() as p:
+                    reqs = [p.get(Command.AMPLITUDE_CH1) for _ in range(10)]
+                return [r.result() for r in reqs]
+            assert dev.submit(job).result(5) == [5000] * 10
+
+            with concurrent.futures.ThreadPoolExecutor(8) as pool:
+                results = list(pool.map(lambda _: dev.get_frequency(Channel.CH1), range(40)))
+            assert results == [1000.0] * 40
+        finally:
+            dev.close()
+        with pytest.raises(Exception):
+            dev.submit('get_frequency', Channel.CH1)
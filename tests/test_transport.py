@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from jds6600 import JDS6600, Channel, Command, FdTransport, SerialTransport, TcpTransport, open_transport
+from jds6600.sim import Simulator
+
+
+@pytest.mark.parametrize('tcp,transport,expected', [
+    (False, None, SerialTransport),
+    (False, 'fd', FdTransport),
+    (False, SerialTransport, SerialTransport),
+    (True, None, TcpTransport),
+])
+def test_transports(tcp, transport, expected):
+    with Simulator(tcp=tcp) as sim:
+        dev = JDS6600(port=sim.port, transport=transport)
+        try:
+            assert type(dev._transport) is expected
+            dev.set_frequency(1234.5, Channel.CH1)
+            assert dev.get_frequency(Channel.CH1) == 1234.5
+        finally:
+            dev.close()
+
+
+@pytest.mark.parametrize('transport', ['fd', 'tcp'])
+def test_readline_timeout(transport):
+    with Simulator(tcp=transport == 'tcp') as sim:
+        t = open_transport(sim.port, transport=transport, timeout=0.1)
+        try:
+            t.write(b':r%02d=0.\r\n' % Command.AMPLITUDE_CH1)
+            assert t.readline() == b':r%02d=5000.\r\n' % Command.AMPLITUDE_CH1
+            start = time.monotonic()
+            assert t.readline() == b''
+            assert time.monotonic() - start >= 0.09
+            assert not t.in_waiting
+        finally:
+            t.close()
+        assert not t.is_open
+
+
+def test_unknown_transport():
+    with pytest.raises(ValueError):
+        open_transport('/dev/null', transport='usb')
@@ -0,0 +1,39 @@
+import pytest
+
+from jds6600 import JDS6600, Channel, Command, VerificationError
+from jds6600.sim import Simulator
+
+
+def _ignore_amplitude_writes(sim):
+    handle = sim.handle
+    def wrapper(line):
+        if line.startswith(b':w%02d=' % Command.AMPLITUDE_CH1):
+            return b':ok\r\n'
+        return handle(line)
+    sim.handle = wrapper
+
+
+def test_verify_reads_back_the_last_writes():
+    with Simulator() as sim:
+        dev = JDS6600(port=sim.port)
+        try:
+            with dev.verify() as verifier:
+                dev.set_frequency(2000, Channel.CH1)
+                dev.set_frequency(3000, Channel.CH1)
+                dev.profile_load(0)
+            assert verifier.mismatches == []
+            assert Command.PROFILE_LOAD not in verifier.expected
+
+            _ignore_amplitude_writes(sim)
+            with pytest.raises(VerificationError) as e:
+                with dev.verify():
+                    dev.set_amplitude(2.5, Channel.CH1)
+                    with dev.verify():
+                        dev.set_offset(1.0, Channel.CH1)
+            assert e.value.mismatches == [(Command.AMPLITUDE_CH1, 2500, 5000)]
+
+            with dev.verify(raise_errors=False) as verifier:
+                dev.set_amplitude(2.5, Channel.CH1)
+            assert len(verifier.mismatches) == 1
+        finally:
+            dev.close()